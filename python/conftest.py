@@ -0,0 +1 @@
+# Lets pytest import the variability_analysis package from this folder
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+
+from variability_analysis.bootstrap import (
+    bootstrap_confidence_intervals,
+    bootstrap_replicates,
+)
+
+
+def _data():
+    rng = np.random.default_rng(7)
+    sizes = [1, 2, 5, 30]
+    values = np.concatenate(
+        [rng.normal(i, 1 + i, size) for i, size in enumerate(sizes)]
+    )
+    codes = np.repeat(np.arange(len(sizes)), sizes)
+    # Shuffled, with a NaN ignored by the resampling
+    order = rng.permutation(len(values))
+    values, codes = values[order], codes[order]
+    values[0] = np.nan
+    return values, codes, len(sizes) + 1
+
+
+def _naive_replicates(values, codes, n_groups, n_replicates, seed):
+    """Resamples every group replicate by replicate, with the same draws."""
+    valid = ~np.isnan(values)
+    values, codes = values[valid], codes[valid]
+    order = np.lexsort((values, codes))
+    sorted_values, sorted_codes = values[order], codes[order]
+    sizes = np.bincount(sorted_codes, minlength=n_groups)
+    offsets = np.cumsum(sizes) - sizes
+    low = offsets[sorted_codes]
+    high = low + sizes[sorted_codes]
+    draws = np.random.default_rng(seed).integers(
+        low, high, size=(n_replicates, len(low))
+    )
+
+    results = {s: np.full((n_replicates, n_groups), np.nan) for s in ["mean", "std"]}
+    results.update({s: results["mean"].copy() for s in ["median", "q1", "q3"]})
+    for r in range(n_replicates):
+        resample = pd.Series(sorted_values[draws[r]])
+        grouped = resample.groupby(sorted_codes)
+        for statistic, values_by_group in {
+            "mean": grouped.mean(),
+            "std": grouped.std(),
+            "median": grouped.median(),
+            "q1": grouped.quantile(0.25),
+            "q3": grouped.quantile(0.75),
+        }.items():
+            results[statistic][r, values_by_group.index] = values_by_group
+    return results
+
+
+def test_replicates_match_naive_resampling():
+    values, codes, n_groups = _data()
+    replicates = bootstrap_replicates(values, codes, n_groups, n_replicates=40, seed=3)
+    expected = _naive_replicates(values, codes, n_groups, 40, seed=3)
+    for statistic, result in replicates.items():
+        np.testing.assert_allclose(result, expected[statistic], rtol=1e-10, atol=1e-12)
+    # The group without values stays NaN
+    assert np.isnan(replicates["mean"][:, -1]).all()
+
+
+def test_replicates_do_not_depend_on_chunk_size():
+    values, codes, n_groups = _data()
+    # Enough memory for all replicates at once, then for one at a time
+    whole = bootstrap_replicates(values, codes, n_groups, n_replicates=25, seed=1)
+    chunked = bootstrap_replicates(
+        values, codes, n_groups, n_replicates=25, seed=1, max_memory_mb=1e-6
+    )
+    for statistic in whole:
+        np.testing.assert_array_equal(whole[statistic], chunked[statistic])
+
+
+def test_confidence_intervals_cover_the_statistic():
+    rng = np.random.default_rng(0)
+    data_df = pd.DataFrame(
+        {"group": np.repeat(["a", "b"], 200), "value": rng.normal(0, 1, 400)}
+    )
+    data_df.loc[data_df["group"] == "b", "value"] += 5
+    intervals = bootstrap_confidence_intervals(
+        data_df, "value", ["group"], n_replicates=500
+    )
+    intervals = intervals.reset_index().set_index("group")
+    means = data_df.groupby("group")["value"].mean()
+    for group, mean in means.items():
+        low, high = intervals.loc[group, ["mean_ci_low", "mean_ci_high"]]
+        assert low < mean < high
+        # Close to the normal-theory interval width of 2 * 1.96 / sqrt(200)
+        assert 0.2 < high - low < 0.35
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+from scipy.stats import ks_2samp, wasserstein_distance
+
+from variability_analysis.distribution_distances import (
+    compute_distribution_distances,
+    distance_matrices,
+)
+
+
+def _runs():
+    rng = np.random.default_rng(11)
+    return [
+        rng.normal(0, 1, 50),
+        rng.normal(0.3, 2, 80),
+        # Ties, within and across runs
+        np.round(rng.normal(0, 1, 60), 1),
+        np.array([0.5]),
+    ]
+
+
+def test_distances_match_scipy():
+    runs = _runs()
+    distances = distance_matrices(runs, quantiles=[0.1, 0.5, 0.9])
+    for i, a in enumerate(runs):
+        for j, b in enumerate(runs):
+            assert np.isclose(distances["ks"][i, j], ks_2samp(a, b).statistic)
+            assert np.isclose(
+                distances["wasserstein"][i, j], wasserstein_distance(a, b)
+            )
+        np.testing.assert_allclose(
+            distances["quantiles"][i], np.quantile(a, [0.1, 0.5, 0.9])
+        )
+
+
+def test_distance_table_lists_every_pair_per_category():
+    runs = _runs()
+    data_df = pd.DataFrame(
+        {
+            "run_id": np.repeat(["r0", "r1", "r2", "r3"], [len(v) for v in runs]),
+            "technology": "Gas",
+            "value": np.concatenate(runs),
+        }
+    )
+    data_df.loc[data_df.index[:10], "technology"] = "Coal"
+    params_df = pd.DataFrame({"run_id": ["r0", "r1", "r2", "r3"]})
+
+    table = compute_distribution_distances(data_df, params_df, "value", "technology")
+    assert set(table["category"]) == {"Gas", "Coal", "All"}
+    everything = table[table["category"] == "All"]
+    assert len(everything) == 16
+    pair = everything[
+        (everything["run_id_a"] == "r0") & (everything["run_id_b"] == "r1")
+    ]
+    assert np.isclose(pair["ks"].item(), ks_2samp(runs[0], runs[1]).statistic)
+    assert np.isclose(
+        pair["quantile_delta_50"].item(), np.median(runs[1]) - np.median(runs[0])
+    )
+    same_run = everything["run_id_a"] == everything["run_id_b"]
+    assert (everything.loc[same_run, "ks"] == 0).all()
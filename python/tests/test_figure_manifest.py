@@ -0,0 +1,117 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from variability_analysis.figure_manifest import (
+    FigureManifest,
+    data_digest,
+    set_skip_unchanged,
+)
+from variability_analysis.output_writer import (
+    background_writes,
+    set_background_writes,
+)
+
+
+def _draw(folder, name):
+    path = os.path.join(folder, name)
+    with open(path, "w") as f:
+        f.write(name)
+    return path
+
+
+def test_data_digest_follows_content():
+    df = pd.DataFrame({"x": [1.0, 2.0]})
+    assert data_digest(df, "title") == data_digest(df.copy(), "title")
+    assert data_digest(df, "title") != data_digest(df, "other title")
+    assert data_digest(df, "title") != data_digest(df * 2, "title")
+    assert data_digest(np.arange(3)) == data_digest(np.arange(3))
+
+
+def test_unchanged_figures_are_skipped_and_vanished_ones_removed(tmp_path):
+    folder = str(tmp_path)
+    manifest = FigureManifest(folder)
+    for name in ["a.png", "b.png", "c.png"]:
+        manifest.record(_draw(folder, name), data_digest(name))
+    manifest.close()
+
+    manifest = FigureManifest(folder)
+    # Same inputs: skipped
+    assert manifest.is_current(os.path.join(folder, "a.png"), data_digest("a.png"))
+    # Changed inputs: drawn again
+    b = os.path.join(folder, "b.png")
+    assert not manifest.is_current(b, data_digest("new b"))
+    manifest.record(_draw(folder, "b.png"), data_digest("new b"))
+    # c.png is not produced any more
+    manifest.close()
+
+    assert sorted(os.listdir(folder)) == [".figures.manifest.json", "a.png", "b.png"]
+    manifest = FigureManifest(folder)
+    assert set(manifest.previous) == {"a.png", "b.png"}
+    assert manifest.is_current(b, data_digest("new b"))
+
+
+def test_deleted_or_forced_figures_are_drawn(tmp_path):
+    folder = str(tmp_path)
+    manifest = FigureManifest(folder)
+    path = _draw(folder, "a.png")
+    manifest.record(path, data_digest("a"))
+    manifest.close()
+
+    os.remove(path)
+    assert not FigureManifest(folder).is_current(path, data_digest("a"))
+
+    _draw(folder, "a.png")
+    set_skip_unchanged(False)
+    try:
+        assert not FigureManifest(folder).is_current(path, data_digest("a"))
+    finally:
+        set_skip_unchanged(True)
+
+
+def test_failed_plotting_keeps_previous_manifest(tmp_path):
+    folder = str(tmp_path)
+    manifest = FigureManifest(folder)
+    manifest.record(_draw(folder, "a.png"), data_digest("a"))
+    manifest.close()
+
+    # Not closed, as when a plotting function raises
+    FigureManifest(folder).record(_draw(folder, "b.png"), data_digest("b"))
+    manifest = FigureManifest(folder)
+    assert set(manifest.previous) == {"a.png"}
+    assert os.path.exists(os.path.join(folder, "a.png"))
+
+
+def test_failed_background_writes_are_not_recorded(tmp_path):
+    folder = str(tmp_path)
+    manifest = FigureManifest(folder)
+    for name in ["a.png", "b.png"]:
+        manifest.record(_draw(folder, name), data_digest(name))
+    manifest.close()
+
+    def fail(target):
+        raise OSError("disk full")
+
+    set_background_writes(True)
+    try:
+        with pytest.raises(OSError, match="disk full"):
+            with background_writes() as writer:
+                manifest = FigureManifest(folder)
+                a = os.path.join(folder, "a.png")
+                writer.submit(a, lambda target: _draw(folder, target), 1)
+                manifest.record(a, data_digest("new a"))
+                b = os.path.join(folder, "b.png")
+                writer.submit(b, fail, 1)
+                manifest.record(b, data_digest("new b"))
+                manifest.close()
+                # The manifest waits for the queued images
+                assert FigureManifest(folder).previous["b.png"] == data_digest("b.png")
+    finally:
+        set_background_writes(False)
+
+    manifest = FigureManifest(folder)
+    assert manifest.previous == {"a.png": data_digest("new a")}
+    # The image drawn from the previous inputs is not kept under the new hash
+    assert not os.path.exists(os.path.join(folder, "b.png"))
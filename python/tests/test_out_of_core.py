@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from variability_analysis.extract_distributions_data import (
+    extract_density_data_by_category,
+)
+from variability_analysis.out_of_core import (
+    binned_quantile,
+    reduce_distributions,
+    streamed_technology_stats,
+)
+from variability_analysis.synthetic_data import generate_synthetic_outputs
+from variability_analysis.technology_stats import generate_technology_stats
+from variability_analysis.utils import load_data
+
+
+@pytest.fixture(scope="module")
+def source(tmp_path_factory):
+    folder = tmp_path_factory.mktemp("trisk")
+    generate_synthetic_outputs(str(folder), n_companies=200, n_runs=4, seed=3)
+    return str(folder)
+
+
+@pytest.mark.parametrize("n", [1, 2, 3, 10, 101])
+def test_binned_quantile_within_a_bin_of_pandas(n):
+    rng = np.random.default_rng(n)
+    for _ in range(50):
+        values = rng.normal(size=n)
+        edges = np.linspace(values.min(), values.max() + 1e-9, 257)
+        counts, _ = np.histogram(values, edges)
+        for q in (0.25, 0.5, 0.75):
+            expected = pd.Series(values).quantile(q)
+            error = abs(binned_quantile(counts, edges, q) - expected)
+            assert error <= edges[1] - edges[0]
+
+
+def test_streamed_stats_match_in_memory(source, tmp_path):
+    npv_df, _, params_df, _ = load_data(source)
+    generate_technology_stats(npv_df, params_df, str(tmp_path / "memory.xlsx"))
+    # A tiny memory budget, so that the file is streamed in several chunks
+    reduced = reduce_distributions(source, params_df, "npv", memory_budget_mb=0.01)
+    streamed_technology_stats(reduced, params_df, str(tmp_path / "streamed.xlsx"))
+
+    key = ["Technology", "Target Scenario", "Shock Year"]
+    memory = pd.read_excel(tmp_path / "memory.xlsx").set_index(key).sort_index()
+    streamed = pd.read_excel(tmp_path / "streamed.xlsx").set_index(key).sort_index()
+    assert memory.index.equals(streamed.index)
+
+    exact = [
+        "Mean NPV Change",
+        "Standard Deviation NPV Change",
+        "Minimum NPV Change",
+        "Maximum NPV Change",
+        "Unique Company Count",
+        "Number of Observations",
+    ]
+    pd.testing.assert_frame_equal(memory[exact], streamed[exact], atol=2e-4)
+
+    # Quartiles are off by less than a fine bin of their technology
+    bin_widths = {
+        tech: (high - low) / 2048
+        for tech, (low, high) in npv_df.groupby("technology")[
+            "net_present_value_change"
+        ].agg(["min", "max"]).iterrows()
+    }
+    tolerance = memory.index.get_level_values("Technology").map(bin_widths) + 2e-4
+    for column in [
+        "Median NPV Change",
+        "First Quartile NPV Change (Q1)",
+        "Third Quartile NPV Change (Q3)",
+    ]:
+        assert (np.abs(memory[column] - streamed[column]) <= tolerance).all()
+
+
+def test_streamed_densities_match_in_memory(source):
+    npv_df, _, params_df, _ = load_data(source)
+    value_type = "net_present_value_change"
+    memory = extract_density_data_by_category(
+        npv_df, params_df, value_type, "technology"
+    )
+    reduced = reduce_distributions(source, params_df, "npv", memory_budget_mb=0.01)
+    streamed = reduced["density_by_category"]
+    assert set(memory) == set(streamed)
+    for category, density_df in memory.items():
+        np.testing.assert_allclose(density_df["x"], streamed[category]["x"])
+        for column in density_df.columns[1:]:
+            expected = density_df[column].to_numpy()
+            np.testing.assert_allclose(
+                streamed[category][column], expected, atol=1e-2 * np.nanmax(expected)
+            )
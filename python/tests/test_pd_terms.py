@@ -0,0 +1,20 @@
+import pandas as pd
+
+from variability_analysis.pd_terms import PDTermSet
+
+
+def test_view_matches_filtering_the_term_column():
+    pd_df = pd.DataFrame(
+        {
+            "term": [5, 1, 5, 3, 1, 5],
+            "company_id": ["c", "a", "b", "a", "d", "a"],
+            "pd_difference": [0.1, 0.2, 0.3, 0.4, 0.5, 0.6],
+        }
+    )
+    terms = PDTermSet(pd_df)
+
+    assert terms.terms == [1, 3, 5]
+    for term in terms.terms:
+        pd.testing.assert_frame_equal(
+            terms.view(term), pd_df[pd_df["term"] == term]
+        )
@@ -0,0 +1,129 @@
+import os
+import json
+import time
+
+import pytest
+
+from variability_analysis import pipeline
+from variability_analysis.pipeline import (
+    PIPELINE_STAGES,
+    R_OUTPUT_FILES,
+    PipelineConfig,
+    plan_stages,
+    run_pipeline,
+)
+from variability_analysis.render_profiles import get_render_profile, set_render_profile
+
+
+@pytest.fixture
+def config(tmp_path):
+    for filename in R_OUTPUT_FILES:
+        (tmp_path / filename).write_text("")
+    # Inputs older than the stamps written by the tests
+    for filename in R_OUTPUT_FILES:
+        os.utime(tmp_path / filename, (1000, 1000))
+    return PipelineConfig(str(tmp_path))
+
+
+@pytest.fixture
+def stages(monkeypatch):
+    """Replaces the stage functions by ones recording the stages run."""
+    ran = []
+    for name, spec in PIPELINE_STAGES.items():
+        if name == "r_analysis":
+            continue
+        monkeypatch.setitem(
+            PIPELINE_STAGES, name, {**spec, "run": lambda c, i, n=name: ran.append(n)}
+        )
+    return ran
+
+
+def _complete(config, name):
+    for path in pipeline._output_files(config, name):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"settings": pipeline._settings(config, name)}, f)
+
+
+def test_missing_stamps_plan_the_stage_and_its_in_memory_inputs(config):
+    assert plan_stages(config, ["technology_stats"]) == ["load", "technology_stats"]
+
+
+def test_up_to_date_stages_are_not_planned(config):
+    _complete(config, "technology_stats")
+    assert plan_stages(config, ["technology_stats"]) == []
+    assert plan_stages(config, ["technology_stats"], force=True) == [
+        "load",
+        "technology_stats",
+    ]
+
+
+def test_changed_inputs_or_settings_make_stages_stale(config):
+    _complete(config, "technology_stats")
+    later = time.time() + 60
+    os.utime(config.path("npvs.csv"), (later, later))
+    assert plan_stages(config, ["technology_stats"]) == ["load", "technology_stats"]
+
+    os.utime(config.path("npvs.csv"), (1000, 1000))
+    previous = get_render_profile()
+    set_render_profile("draft" if previous != "draft" else "publication")
+    try:
+        assert "technology_stats" in plan_stages(config, ["technology_stats"])
+    finally:
+        set_render_profile(previous)
+
+
+def test_stage_settings_make_only_that_stage_stale(config):
+    _complete(config, "technology_stats")
+    _complete(config, "density_plots")
+    config.n_bootstrap = 200
+    assert plan_stages(config, ["technology_stats", "density_plots"]) == [
+        "load",
+        "technology_stats",
+    ]
+    _complete(config, "technology_stats")
+    config.seed = 1
+    assert "technology_stats" in plan_stages(config, ["technology_stats"])
+
+
+def test_stale_stages_rerun_their_dependents(config):
+    _complete(config, "individual_plots")
+    assert plan_stages(config, ["individual_plots"]) == [
+        "load",
+        "individual_densities",
+        "individual_plots",
+    ]
+    _complete(config, "individual_densities")
+    _complete(config, "individual_plots")
+    assert plan_stages(config, ["individual_plots"]) == []
+
+
+def test_unknown_stages_are_rejected(config):
+    with pytest.raises(ValueError):
+        plan_stages(config, ["no_such_stage"])
+
+
+def test_run_pipeline_runs_the_plan_and_stamps_stages(config, stages):
+    planned = run_pipeline(config, ["individual_plots"], workers=2)
+    assert planned == ["load", "individual_densities", "individual_plots"]
+    assert sorted(stages) == sorted(planned)
+    assert stages.index("individual_densities") < stages.index("individual_plots")
+    assert plan_stages(config, ["individual_plots"]) == []
+    assert run_pipeline(config, ["individual_plots"]) == []
+
+
+def test_out_of_core_writes_apart_from_the_in_memory_stages(tmp_path):
+    from variability_analysis.synthetic_data import generate_synthetic_outputs
+
+    generate_synthetic_outputs(str(tmp_path), n_companies=40, n_runs=2, seed=3)
+    profile = get_render_profile()
+    set_render_profile("draft")
+    try:
+        run_pipeline(PipelineConfig(str(tmp_path)), ["out_of_core"], workers=1)
+    finally:
+        set_render_profile(profile)
+
+    assert (tmp_path / "out_of_core" / "statdesc.xlsx").exists()
+    assert (tmp_path / "out_of_core" / "plots_distributions" / "npv").is_dir()
+    for output in ["statdesc.xlsx", "plots_distributions", "plots_histograms"]:
+        assert not (tmp_path / output).exists()
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+from variability_analysis.portfolio_aggregation import aggregate_portfolios
+
+
+def _example():
+    """
+    Company A (two assets) changes by -50% in both runs; company B by -10%
+    in r1 and has no shock NPV in r2. P holds 3 of A and 1 of B, Q 1 of B.
+    """
+    params_df = pd.DataFrame(
+        {
+            "run_id": ["r1", "r2"],
+            "baseline_scenario": "NGFS2023GCAM_CP",
+            "target_scenario": "NGFS2023GCAM_NZ2050",
+            "shock_year": [2025, 2030],
+            "scenario_geography": "Global",
+        }
+    )
+    npv_df = pd.DataFrame(
+        {
+            "run_id": ["r1", "r1", "r1", "r2", "r2", "r2"],
+            "company_id": ["A", "A", "B", "A", "A", "B"],
+            "asset_id": ["a1", "a2", "b1", "a1", "a2", "b1"],
+            "net_present_value_baseline": [60.0, 40.0, 200.0, 60.0, 40.0, 200.0],
+            "net_present_value_shock": [20.0, 30.0, 180.0, 20.0, 30.0, np.nan],
+        }
+    )
+    # A has two sectors, with PD differences 0.02 and 0.04: 0.03 on average
+    pd_df = pd.DataFrame(
+        {
+            "run_id": ["r1", "r1", "r1", "r2", "r2", "r2"],
+            "company_id": ["A", "A", "B", "A", "A", "B"],
+            "sector": ["Coal", "Oil&Gas", "Power"] * 2,
+            "pd_difference": [0.02, 0.04, 0.01, 0.02, 0.04, 0.01],
+        }
+    )
+    portfolios_df = pd.DataFrame(
+        {
+            "portfolio_id": ["P", "P", "Q"],
+            "company_id": ["A", "B", "B"],
+            "exposure": [3.0, 1.0, 1.0],
+        }
+    )
+    return portfolios_df, npv_df, pd_df, params_df
+
+
+def test_aggregation_matches_the_hand_computed_example():
+    result = aggregate_portfolios(*_example()).set_index(["portfolio_id", "run_id"])
+
+    # r1: P = (3 * -0.5 + 1 * -0.1) / 4, Q = -0.1
+    assert np.isclose(result.loc[("P", "r1"), "weighted_npv_change"], -0.4)
+    assert np.isclose(result.loc[("Q", "r1"), "weighted_npv_change"], -0.1)
+    # r2: B has no NPV change, so P is A's alone and Q has no value
+    assert np.isclose(result.loc[("P", "r2"), "weighted_npv_change"], -0.5)
+    assert result.loc[("P", "r2"), "npv_covered_exposure"] == 3.0
+    assert np.isnan(result.loc[("Q", "r2"), "weighted_npv_change"])
+    assert result.loc[("Q", "r2"), "npv_covered_exposure"] == 0.0
+    assert (result["exposure"] == [4.0, 4.0, 1.0, 1.0]).all()
+
+    # PD: P = (3 * 0.03 + 1 * 0.01) / 4 in both runs
+    np.testing.assert_allclose(
+        result.loc["P", "weighted_pd_difference"], [0.025, 0.025]
+    )
+    np.testing.assert_allclose(result.loc["Q", "weighted_pd_difference"], [0.01, 0.01])
@@ -0,0 +1,29 @@
+import io
+
+import numpy as np
+
+from variability_analysis.rendering import (
+    FIGURE_FAMILIES,
+    FigureTemplate,
+    figure_template,
+)
+
+
+def _render(template, n_lines):
+    ax = template.start("x", "y")
+    for i in range(n_lines):
+        ax.plot(np.linspace(0, 1, 10), np.arange(10) * i, label=f"run {i}")
+    template.finish("A title", legend_title="Runs")
+    buffer = io.BytesIO()
+    template.figure.savefig(buffer, format="png", **template.savefig_kwargs)
+    return buffer.getvalue()
+
+
+def test_reused_template_renders_as_a_fresh_figure():
+    for family in ["grouped", "density"]:
+        fresh = _render(FigureTemplate(**FIGURE_FAMILIES[family]), 2)
+        template = figure_template(family)
+        # Another plot first, whose layout must not leak into the next one
+        _render(template, 5)
+        assert _render(template, 2) == fresh
+        assert _render(template, 2) == fresh
@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+
+from variability_analysis.result_cube import ResultCube
+
+
+def _params(discount_rates):
+    n_runs = len(discount_rates)
+    return pd.DataFrame(
+        {
+            "run_id": [f"r{i}" for i in range(n_runs)],
+            "baseline_scenario": "NGFS2023GCAM_CP",
+            "target_scenario": "NGFS2023GCAM_NZ2050",
+            "shock_year": 2030,
+            "scenario_geography": "Global",
+            "discount_rate": discount_rates,
+        }
+    )
+
+
+def _npvs(params_df):
+    rows = []
+    for i, run_id in enumerate(params_df["run_id"]):
+        for asset in ["a1", "a2"]:
+            rows.append((run_id, "Coal", asset, float(i) + (asset == "a2")))
+    return pd.DataFrame(
+        rows, columns=["run_id", "technology", "asset_id", "npv_change"]
+    )
+
+
+def test_runs_differing_in_other_parameters_stay_apart():
+    params_df = _params([0.05, 0.07, 0.09])
+    npv_df = _npvs(params_df)
+    cube = ResultCube.from_frame(npv_df, params_df, "npv_change", sparse=False)
+
+    assert "discount_rate" in cube.dims
+    assert cube.nnz == len(npv_df)
+    frame = cube.to_frame()
+    assert len(frame) == len(npv_df)
+    merged = frame.merge(npv_df, on=["run_id", "asset_id"], suffixes=("", "_in"))
+    np.testing.assert_array_equal(merged["npv_change"], merged["npv_change_in"])
+
+
+def test_runs_sharing_every_parameter_are_told_apart_by_run_id():
+    params_df = _params([0.07, 0.07])
+    npv_df = _npvs(params_df)
+    cube = ResultCube.from_frame(npv_df, params_df, "npv_change")
+
+    assert "run_id" in cube.dims
+    frame = cube.to_frame().sort_values(["run_id", "asset_id"])
+    np.testing.assert_array_equal(frame["npv_change"], [0.0, 1.0, 1.0, 2.0])
+    one_run = cube.sel(run_id="r1").to_frame()
+    assert set(one_run["run_id"]) == {"r1"}
+
+
+def _cube_pair():
+    """The same results as a sparse and a dense cube, with missing cells."""
+    params_df = _params([0.05, 0.07, 0.09])
+    npv_df = _npvs(params_df)
+    npv_df.loc[npv_df["asset_id"] == "a2", "technology"] = "Gas"
+    npv_df = npv_df.drop(index=[1])
+    sparse = ResultCube.from_frame(npv_df, params_df, "npv_change", sparse=True)
+    dense = ResultCube.from_frame(npv_df, params_df, "npv_change", sparse=False)
+    assert sparse.is_sparse and not dense.is_sparse
+    return sparse, dense
+
+
+def _sorted(frame):
+    frame = frame[sorted(frame.columns)]
+    return frame.sort_values(list(frame.columns)).reset_index(drop=True)
+
+
+def _assert_same(sparse, dense):
+    assert sparse.dims == dense.dims
+    np.testing.assert_allclose(sparse.to_dense().dense, dense.dense)
+    pd.testing.assert_frame_equal(
+        _sorted(sparse.to_frame()), _sorted(dense.to_frame())
+    )
+
+
+def test_sparse_and_dense_cubes_select_alike():
+    sparse, dense = _cube_pair()
+    selections = [
+        {"discount_rate": 0.07},
+        {"discount_rate": [0.09, 0.05], "technology": "Gas"},
+        {"asset_id": ["a2"], "technology": ["Gas", "Coal"]},
+        # Every dimension, down to a single cell
+        {dim: sparse.coords[dim][0] for dim in sparse.dims},
+    ]
+    for labels in selections:
+        _assert_same(sparse.sel(**labels), dense.sel(**labels))
+
+    cell = sparse.sel(**{dim: sparse.coords[dim][0] for dim in sparse.dims})
+    frame = cell.to_frame()
+    assert len(frame) == 1
+    assert frame["run_id"].tolist() == ["r0"]
+    assert frame["npv_change"].tolist() == [0.0]
+
+
+def test_sparse_and_dense_cubes_reduce_alike():
+    sparse, dense = _cube_pair()
+    for how in ["sum", "mean", "median", "min", "max", "std", "count"]:
+        for dims in ["asset_id", ["technology", "asset_id"], sparse.dims]:
+            reduced_sparse = sparse.reduce(how, dims)
+            reduced_dense = dense.reduce(how, dims)
+            np.testing.assert_allclose(
+                reduced_sparse.dense, reduced_dense.dense, equal_nan=True
+            )
+            _assert_same(reduced_sparse.to_sparse(), reduced_dense)
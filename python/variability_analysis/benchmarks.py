@@ -0,0 +1,342 @@
+import os
+import io
+import json
+import argparse
+import time
+import shutil
+import platform
+import tracemalloc
+import contextlib
+import pandas as pd
+
+from .synthetic_data import generate_synthetic_outputs
+from .figure_manifest import get_skip_unchanged, set_skip_unchanged
+from .render_profiles import get_render_profile, set_render_profile
+from .run_catalog import PARAMETER_COLUMNS
+
+
+# Dataset sizes of the benchmark, as arguments of generate_synthetic_outputs
+BENCHMARK_SCALES = {
+    "small": {"n_companies": 100, "n_runs": 4},
+    "medium": {"n_companies": 1000, "n_runs": 12},
+    "large": {"n_companies": 10000, "n_runs": 24},
+}
+
+
+def measure(func, *args, trace_memory=True, **kwargs):
+    """
+    Calls a function and measures its wall time, CPU time and peak memory.
+
+    The function's prints are discarded. Peak memory is the largest amount
+    of memory allocated through Python and numpy during the call, traced
+    with tracemalloc, which slows the call down.
+
+    Parameters:
+    func (callable): The function to measure.
+    trace_memory (bool): Whether to trace the peak memory.
+    args, kwargs: The arguments of the function.
+
+    Returns:
+    tuple: The function's result and a dict with 'wall_s', 'cpu_s' and
+    'peak_mb' (None when memory is not traced).
+    """
+    if trace_memory:
+        tracemalloc.start()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = func(*args, **kwargs)
+    finally:
+        cpu = time.process_time() - cpu_start
+        wall = time.perf_counter() - wall_start
+        peak = None
+        if trace_memory:
+            peak = tracemalloc.get_traced_memory()[1] / 2**20
+            tracemalloc.stop()
+    return result, {"wall_s": wall, "cpu_s": cpu, "peak_mb": peak}
+
+
+def benchmark_stages(source, output_folder, trace_memory=True):
+    """
+    Measures each public stage of the package on the TRISK outputs of a folder.
+
+    Parameters:
+    source (str): The directory containing the CSV files.
+    output_folder (str): Scratch directory for the stage outputs.
+    trace_memory (bool): Whether to trace the peak memory of each stage.
+
+    Returns:
+    list: One dict per stage with its name and measurements.
+    """
+    from .utils import load_data
+    from .technology_stats import generate_technology_stats
+    from .extract_distributions_data import (
+        extract_density_data_by_category,
+        extract_density_data_by_run,
+    )
+    from .extract_histogram_data import (
+        extract_histogram_data_by_category,
+        extract_histogram_data_by_run,
+    )
+    from .extract_individual_distributions_data import (
+        extract_comparison_density,
+        extract_density_individual_distributions,
+    )
+    from .distribution_plots import (
+        plot_barplot_distributions,
+        plot_density_distributions,
+    )
+    from .grouped_distrib_plots import plot_grouped_distributions
+    from .individual_distribution_plots import (
+        plot_comparison_between_shock_years,
+        plot_comparison_between_shock_years_barplot,
+        plot_individual_distributions_by_technology,
+    )
+    from .quadrant_plots import (
+        filter_and_merge_data,
+        plot_bivariate_scenarios_quadrants,
+    )
+
+    results = []
+
+    def run(stage, func, *args, **kwargs):
+        result, measures = measure(func, *args, trace_memory=trace_memory, **kwargs)
+        results.append({"stage": stage, **measures})
+        print(f"  {stage}: {measures['wall_s']:.2f}s")
+        return result
+
+    npv_df, pd_df, params_df, _ = run("load_data", load_data, source)
+    datasets = [
+        (npv_df, "net_present_value_change", "technology"),
+        (pd_df, "pd_difference", "sector"),
+    ]
+    npv_value, npv_category = datasets[0][1:]
+    # Quadrant plots compare the first and last runs
+    criteria = params_df[PARAMETER_COLUMNS].iloc[[0, -1]].to_dict("records")
+
+    run(
+        "generate_technology_stats",
+        generate_technology_stats,
+        npv_df,
+        params_df,
+        os.path.join(output_folder, "statdesc.xlsx"),
+    )
+    for data_df, value_type, category_column in datasets:
+        for extract in [
+            extract_density_data_by_category,
+            extract_density_data_by_run,
+            extract_histogram_data_by_category,
+            extract_histogram_data_by_run,
+        ]:
+            run(
+                f"{extract.__name__}[{value_type}]",
+                extract,
+                data_df,
+                params_df,
+                value_type,
+                category_column,
+            )
+    for extract, subfolder in [
+        (extract_density_individual_distributions, "individual_density_data"),
+        (extract_comparison_density, "comparison_density_data"),
+    ]:
+        run(
+            extract.__name__,
+            extract,
+            npv_df,
+            params_df,
+            npv_value,
+            npv_category,
+            os.path.join(output_folder, subfolder),
+        )
+    run(
+        "filter_and_merge_data",
+        filter_and_merge_data,
+        npv_df,
+        pd_df,
+        params_df,
+        *criteria,
+    )
+
+    for plot, subfolder in [
+        (plot_density_distributions, "plots_distributions"),
+        (plot_barplot_distributions, "plots_histograms"),
+    ]:
+        run(
+            plot.__name__,
+            plot,
+            npv_df,
+            pd_df,
+            params_df,
+            os.path.join(output_folder, subfolder),
+        )
+    for plot, subfolder in [
+        (plot_grouped_distributions, "plots_grouped"),
+        (plot_individual_distributions_by_technology, "plots_individual"),
+        (plot_comparison_between_shock_years, "plots_individual"),
+        (plot_comparison_between_shock_years_barplot, "plots_individual_bar"),
+    ]:
+        run(
+            plot.__name__,
+            plot,
+            npv_df,
+            params_df,
+            os.path.join(output_folder, subfolder),
+            npv_value,
+            npv_category,
+        )
+    quadrant_folder = os.path.join(output_folder, "plots_quadrants")
+    os.makedirs(quadrant_folder, exist_ok=True)
+    run(
+        "plot_bivariate_scenarios_quadrants",
+        plot_bivariate_scenarios_quadrants,
+        npv_df,
+        pd_df,
+        params_df,
+        *criteria,
+        quadrant_folder,
+    )
+    return results
+
+
+def run_benchmarks(
+    work_folder,
+    report_path,
+    scales=None,
+    profile="draft",
+    trace_memory=True,
+    keep_outputs=False,
+):
+    """
+    Generates synthetic TRISK outputs at several scales and benchmarks every
+    stage of the package on them.
+
+    Figures are always rendered (unchanged figures are not skipped), with the
+    given rendering profile. The report is written as `<report_path>.json`,
+    with the machine and scale descriptions, and as `<report_path>.csv`, one
+    row per scale and stage.
+
+    Parameters:
+    work_folder (str): Scratch directory for the synthetic data and outputs.
+    report_path (str): Path of the reports, without extension.
+    scales (dict): Scale name -> arguments of generate_synthetic_outputs,
+        BENCHMARK_SCALES by default.
+    profile (str): Rendering profile of the plotting stages.
+    trace_memory (bool): Whether to trace the peak memory of each stage.
+    keep_outputs (bool): Whether to keep the generated data and outputs.
+
+    Returns:
+    pd.DataFrame: The measurements, one row per scale and stage.
+    """
+    scales = scales or BENCHMARK_SCALES
+    previous_profile = get_render_profile()
+    previous_skip_unchanged = get_skip_unchanged()
+    set_render_profile(profile)
+    set_skip_unchanged(False)
+
+    rows = []
+    scale_rows = {}
+    try:
+        for scale, scale_args in scales.items():
+            print(f"Benchmarking scale '{scale}' {scale_args}")
+            scale_folder = os.path.join(work_folder, scale)
+            data_folder = os.path.join(scale_folder, "data")
+            with contextlib.redirect_stdout(io.StringIO()):
+                scale_rows[scale] = generate_synthetic_outputs(
+                    data_folder, **scale_args
+                )
+            for result in benchmark_stages(
+                data_folder, os.path.join(scale_folder, "outputs"), trace_memory
+            ):
+                rows.append({"scale": scale, **scale_args, **result})
+            if not keep_outputs:
+                shutil.rmtree(scale_folder)
+    finally:
+        set_render_profile(previous_profile)
+        set_skip_unchanged(previous_skip_unchanged)
+
+    report = pd.DataFrame(rows)
+    os.makedirs(os.path.dirname(report_path) or ".", exist_ok=True)
+    report.to_csv(f"{report_path}.csv", index=False)
+    with open(f"{report_path}.json", "w") as f:
+        json.dump(
+            {
+                "machine": {
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "processor": platform.processor(),
+                    "cpu_count": os.cpu_count(),
+                    "pandas": pd.__version__,
+                },
+                "render_profile": profile,
+                "trace_memory": trace_memory,
+                "scales": {
+                    scale: {"parameters": scales[scale], "rows": scale_rows[scale]}
+                    for scale in scales
+                },
+                "results": rows,
+            },
+            f,
+            indent=2,
+        )
+    print(f"Benchmark report written to {report_path}.json and {report_path}.csv")
+    return report
+
+
+def main(argv=None):
+    """
+    Command-line entry point of the benchmarks
+    (`python -m variability_analysis.benchmarks`).
+
+    Parameters:
+    argv (list): Command-line arguments, sys.argv by default.
+    """
+    parser = argparse.ArgumentParser(
+        prog="variability_analysis.benchmarks",
+        description="Benchmarks every stage on synthetic TRISK outputs.",
+    )
+    parser.add_argument(
+        "--scales",
+        nargs="+",
+        choices=list(BENCHMARK_SCALES),
+        default=["small", "medium"],
+        help="Dataset sizes to benchmark.",
+    )
+    parser.add_argument(
+        "--work-folder",
+        default=os.path.join("workspace", "benchmarks"),
+        help="Scratch folder of the synthetic data and stage outputs.",
+    )
+    parser.add_argument(
+        "--report",
+        help="Path of the reports, without extension "
+        "(default: <work folder>/benchmark_report).",
+    )
+    parser.add_argument(
+        "--profile", default="draft", help="Rendering profile of the plots."
+    )
+    parser.add_argument(
+        "--no-memory-trace",
+        action="store_true",
+        help="Do not trace the peak memory, which slows the stages down.",
+    )
+    parser.add_argument(
+        "--keep-outputs",
+        action="store_true",
+        help="Keep the synthetic data and stage outputs.",
+    )
+    args = parser.parse_args(argv)
+
+    run_benchmarks(
+        args.work_folder,
+        args.report or os.path.join(args.work_folder, "benchmark_report"),
+        scales={scale: BENCHMARK_SCALES[scale] for scale in args.scales},
+        profile=args.profile,
+        trace_memory=not args.no_memory_trace,
+        keep_outputs=args.keep_outputs,
+    )
+
+
+if __name__ == "__main__":
+    main()
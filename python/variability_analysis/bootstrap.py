@@ -0,0 +1,210 @@
+import numpy as np
+import pandas as pd
+
+from .tracing import span
+
+
+# Quantile of each order statistic supported by `bootstrap_replicates`
+_QUANTILES = {"median": 0.5, "q1": 0.25, "q3": 0.75}
+
+BOOTSTRAP_STATISTICS = ["median", "mean", "std", "q1", "q3"]
+
+
+def replicate_chunk_size(n_values, max_memory_mb):
+    """
+    Returns the number of replicates drawn at once so that their index and
+    value matrices fit in the memory cap.
+
+    Parameters:
+    n_values (int): Number of values resampled by one replicate (all groups).
+    max_memory_mb (float): Memory cap of the resampling matrices.
+    """
+    # An int64 index, count and cumulative count per resampled value
+    bytes_per_replicate = max(1, n_values) * 8 * 3
+    return max(1, int(max_memory_mb * 2**20 // bytes_per_replicate))
+
+
+def _order_statistics(cumulative_counts, positions):
+    """
+    Returns, for each row of resampling counts, the index of the value at
+    each sorted position: the first index whose cumulative count exceeds it.
+
+    The cumulative counts of each row are offset by the row number times the
+    row length, so that the flattened array is sorted and a single search
+    serves all rows.
+    """
+    n_rows, n_values = cumulative_counts.shape
+    row_offsets = np.arange(n_rows)[:, None] * n_values
+    targets = (positions[None, :] + row_offsets).ravel()
+    found = np.searchsorted(cumulative_counts.ravel(), targets, side="right")
+    return found.reshape(n_rows, len(positions)) - row_offsets
+
+
+def _segment_quantile(sorted_values, cumulative_counts, offsets, sizes, q):
+    """
+    Linearly interpolated quantile of each group of resamples of values
+    sorted within contiguous groups, as pandas computes it.
+    """
+    position = q * (sizes - 1)
+    low = np.floor(position).astype(np.int64)
+    high = np.minimum(low + 1, sizes - 1)
+    fraction = position - low
+    below = sorted_values[_order_statistics(cumulative_counts, offsets + low)]
+    above = sorted_values[_order_statistics(cumulative_counts, offsets + high)]
+    return below + (above - below) * fraction
+
+
+def bootstrap_replicates(
+    values,
+    group_codes,
+    n_groups,
+    statistics=BOOTSTRAP_STATISTICS,
+    n_replicates=1000,
+    seed=0,
+    max_memory_mb=256,
+):
+    """
+    Computes bootstrap replicates of statistics of several groups of values.
+
+    Every replicate resamples each group with replacement. The replicates of
+    all groups are drawn together, as a (replicates, values) index matrix whose
+    row segments point into the values of one group. The groups are laid out
+    in contiguous segments sorted by value, so counting how often each value
+    is drawn gives every resample in sorted order without sorting it: sums
+    weight the values by their counts, and order statistics are searched in
+    the cumulative counts. Replicates are drawn in chunks bounded by
+    `max_memory_mb`; the results do not depend on the chunk size.
+
+    Parameters:
+    values (np.ndarray): The values; NaN values are ignored.
+    group_codes (np.ndarray): Group of each value, in [0, n_groups).
+    n_groups (int): Number of groups.
+    statistics (list): Statistics among 'median', 'mean', 'std', 'q1', 'q3'.
+    n_replicates (int): Number of bootstrap replicates.
+    seed (int): Seed of the random generator.
+    max_memory_mb (float): Memory cap of the resampling matrices.
+
+    Returns:
+    dict: Statistic -> array of shape (n_replicates, n_groups). Groups without
+    values get NaN (and groups with one value a NaN standard deviation).
+    """
+    unknown = set(statistics) - set(BOOTSTRAP_STATISTICS)
+    if unknown:
+        raise ValueError(f"Unknown statistics: {', '.join(sorted(unknown))}")
+
+    values = np.asarray(values, dtype=np.float64)
+    group_codes = np.asarray(group_codes, dtype=np.int64)
+    valid = ~np.isnan(values)
+    values, group_codes = values[valid], group_codes[valid]
+
+    # Lay the groups out in contiguous segments, sorted within each group
+    order = np.lexsort((values, group_codes))
+    sorted_values = values[order]
+    sizes = np.bincount(group_codes, minlength=n_groups)
+    offsets = np.cumsum(sizes) - sizes
+    filled = np.flatnonzero(sizes)
+    segment_sizes = sizes[filled]
+    segment_offsets = offsets[filled]
+    low = np.repeat(segment_offsets, segment_sizes)
+    high = low + np.repeat(segment_sizes, segment_sizes)
+
+    results = {
+        statistic: np.full((n_replicates, n_groups), np.nan)
+        for statistic in statistics
+    }
+    if len(sorted_values) == 0:
+        return results
+
+    rng = np.random.default_rng(seed)
+    chunk_size = replicate_chunk_size(len(sorted_values), max_memory_mb)
+    for start in range(0, n_replicates, chunk_size):
+        stop = min(start + chunk_size, n_replicates)
+        with span("bootstrap", replicates=stop - start, rows=len(sorted_values)):
+            n_rows = stop - start
+            row_offsets = np.arange(n_rows)[:, None] * len(low)
+            indices = rng.integers(low, high, size=(n_rows, len(low)))
+            indices += row_offsets
+            counts = np.bincount(indices.ravel(), minlength=indices.size)
+            counts = counts.reshape(n_rows, len(low))
+            del indices
+
+            if "mean" in statistics or "std" in statistics:
+                sums = np.add.reduceat(counts * sorted_values, segment_offsets, axis=1)
+                means = sums / segment_sizes
+            if set(statistics) & set(_QUANTILES):
+                cumulative_counts = np.cumsum(counts, axis=1)
+                cumulative_counts += row_offsets
+            for statistic in statistics:
+                if statistic == "mean":
+                    result = means
+                elif statistic == "std":
+                    squares = np.add.reduceat(
+                        counts * sorted_values**2, segment_offsets, axis=1
+                    )
+                    with np.errstate(invalid="ignore", divide="ignore"):
+                        variance = (squares - sums * means) / (segment_sizes - 1)
+                    result = np.sqrt(np.maximum(variance, 0.0))
+                else:
+                    result = _segment_quantile(
+                        sorted_values,
+                        cumulative_counts,
+                        segment_offsets,
+                        segment_sizes,
+                        _QUANTILES[statistic],
+                    )
+                results[statistic][start:stop, filled] = result
+    return results
+
+
+def bootstrap_confidence_intervals(
+    data_df,
+    value_column,
+    by,
+    statistics=BOOTSTRAP_STATISTICS,
+    n_replicates=1000,
+    confidence=0.95,
+    seed=0,
+    max_memory_mb=256,
+):
+    """
+    Computes percentile bootstrap confidence intervals of statistics of a
+    value for each group of a DataFrame.
+
+    Parameters:
+    data_df (pd.DataFrame): The data.
+    value_column (str): The column of the values.
+    by (list): The columns defining the groups.
+    statistics (list): Statistics among 'median', 'mean', 'std', 'q1', 'q3'.
+    n_replicates (int): Number of bootstrap replicates.
+    confidence (float): Confidence level of the intervals.
+    seed (int): Seed of the random generator.
+    max_memory_mb (float): Memory cap of the resampling matrices.
+
+    Returns:
+    pd.DataFrame: Indexed by the `by` columns, with columns
+    '<statistic>_ci_low' and '<statistic>_ci_high'.
+    """
+    group_codes, groups = pd.MultiIndex.from_frame(data_df[by]).factorize(sort=True)
+    replicates = bootstrap_replicates(
+        data_df[value_column].to_numpy(),
+        group_codes,
+        len(groups),
+        statistics=statistics,
+        n_replicates=n_replicates,
+        seed=seed,
+        max_memory_mb=max_memory_mb,
+    )
+
+    alpha = 1 - confidence
+    intervals = pd.DataFrame(index=pd.MultiIndex.from_tuples(groups, names=by))
+    for statistic, values in replicates.items():
+        # Groups whose replicates are all NaN (too few values) keep NaN bounds
+        with np.errstate(invalid="ignore"):
+            bounds = np.full((2, values.shape[1]), np.nan)
+            computed = ~np.isnan(values).all(axis=0)
+            bounds[:, computed] = np.nanquantile(
+                values[:, computed], [alpha / 2, 1 - alpha / 2], axis=0
+            )
+        intervals[f"{statistic}_ci_low"] = bounds[0]
+        intervals[f"{statistic}_ci_high"] = bounds[1]
+    return intervals
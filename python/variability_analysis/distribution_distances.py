@@ -0,0 +1,175 @@
+import os
+import numpy as np
+import pandas as pd
+
+from .instrumentation import add_rows, iter_stages, record_output
+from .output_writer import write_csv
+from .result_cube import as_frame
+from .run_catalog import run_catalog
+from .tracing import span
+
+
+# Quantiles whose differences between runs are reported
+DISTANCE_QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+
+
+def _sorted_quantiles(sorted_values, quantiles):
+    """Linearly interpolated quantiles of sorted values, as np.quantile."""
+    position = np.asarray(quantiles) * (len(sorted_values) - 1)
+    low = np.floor(position).astype(np.int64)
+    high = np.minimum(low + 1, len(sorted_values) - 1)
+    fraction = position - low
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * fraction
+
+
+def distance_matrices(run_values, quantiles=DISTANCE_QUANTILES):
+    """
+    Computes the distances between the value distributions of every pair of
+    runs.
+
+    Each run's values are sorted once. For each pair of runs, both empirical
+    CDFs are evaluated on the merged sorted values of the two runs, between
+    which both CDFs are constant, so the Kolmogorov-Smirnov statistic is the
+    largest CDF gap over the merged values and the 1-Wasserstein distance the
+    sum of the CDF gaps times the merged value spacings, both exact. Memory
+    stays proportional to the values of two runs, whatever the number of runs.
+
+    Parameters:
+    run_values (list): One array of values per run, without NaN and not empty.
+    quantiles (list): Quantiles whose differences are computed.
+
+    Returns:
+    dict: 'ks' and 'wasserstein' -> (runs, runs) arrays, and 'quantiles' ->
+    (runs, quantiles) array of the quantiles of each run, whose differences
+    give the quantile deltas.
+    """
+    sorted_runs = [np.sort(np.asarray(values, np.float64)) for values in run_values]
+
+    ks = np.zeros((len(sorted_runs), len(sorted_runs)))
+    wasserstein = np.zeros((len(sorted_runs), len(sorted_runs)))
+    for i, a in enumerate(sorted_runs):
+        for j in range(i + 1, len(sorted_runs)):
+            b = sorted_runs[j]
+            # Merging two sorted runs: the stable sort is linear on them
+            merged = np.sort(np.concatenate([a, b]), kind="stable")
+            gaps = np.abs(
+                np.searchsorted(a, merged, side="right") / len(a)
+                - np.searchsorted(b, merged, side="right") / len(b)
+            )
+            ks[i, j] = gaps.max()
+            wasserstein[i, j] = gaps[:-1] @ np.diff(merged)
+    ks += ks.T
+    wasserstein += wasserstein.T
+
+    return {
+        "ks": ks,
+        "wasserstein": wasserstein,
+        "quantiles": np.array(
+            [_sorted_quantiles(values, quantiles) for values in sorted_runs]
+        ),
+    }
+
+
+def compute_distribution_distances(
+    data_df, params_df, value_type, category_column, quantiles=DISTANCE_QUANTILES
+):
+    """
+    Computes, for each category and for all categories together ("All"), the
+    distances between the distributions of every ordered pair of runs.
+
+    Parameters:
+    data_df (pd.DataFrame): The dataframe containing the data.
+    params_df (pd.DataFrame): The dataframe with run parameters.
+    value_type (str): The type of value to compare.
+    category_column (str): The category column (e.g., 'technology').
+    quantiles (list): Quantiles whose differences are reported.
+
+    Returns:
+    pd.DataFrame: One row per category and pair of runs (including a run with
+    itself), with columns category, run_id_a, run_id_b, label_a, label_b, ks,
+    wasserstein, n_a, n_b and 'quantile_delta_<q>' = quantile of run b minus
+    quantile of run a.
+    """
+    data_df = as_frame(data_df)
+    catalog = run_catalog(params_df)
+    categories = np.append(data_df[category_column].unique(), "All")
+    quantile_columns = [f"quantile_delta_{round(q * 100):g}" for q in quantiles]
+
+    tables = []
+    for cat in iter_stages(categories, category_column):
+        if cat == "All":
+            cat_data = data_df
+        else:
+            cat_data = data_df[data_df[category_column] == cat]
+        add_rows(len(cat_data))
+        values = cat_data[["run_id", value_type]].dropna()
+        runs = [
+            (run_id, run_values.to_numpy())
+            for run_id, run_values in values.groupby("run_id", sort=False)[value_type]
+        ]
+        if not runs:
+            print(f"No data found for {category_column} {cat}. Skipping.")
+            continue
+
+        with span("distances", category=cat, runs=len(runs)):
+            distances = distance_matrices([v for _, v in runs], quantiles)
+
+        a, b = np.meshgrid(np.arange(len(runs)), np.arange(len(runs)), indexing="ij")
+        a, b = a.ravel(), b.ravel()
+        run_ids = np.array([run_id for run_id, _ in runs], dtype=object)
+        labels = np.array([catalog.label(run_id) for run_id in run_ids], dtype=object)
+        sizes = np.array([len(run_values) for _, run_values in runs])
+        table = pd.DataFrame(
+            {
+                "category": cat,
+                "run_id_a": run_ids[a],
+                "run_id_b": run_ids[b],
+                "label_a": labels[a],
+                "label_b": labels[b],
+                "ks": distances["ks"][a, b],
+                "wasserstein": distances["wasserstein"][a, b],
+                "n_a": sizes[a],
+                "n_b": sizes[b],
+            }
+        )
+        deltas = distances["quantiles"][b] - distances["quantiles"][a]
+        for column, delta in zip(quantile_columns, deltas.T):
+            table[column] = delta
+        tables.append(table)
+
+    if not tables:
+        return pd.DataFrame()
+    return pd.concat(tables, ignore_index=True)
+
+
+def extract_distribution_distances(
+    data_df,
+    params_df,
+    value_type,
+    category_column,
+    output_file,
+    quantiles=DISTANCE_QUANTILES,
+):
+    """
+    Computes the run by run distribution distances of
+    `compute_distribution_distances` and saves them as a CSV table.
+
+    Parameters:
+    data_df (pd.DataFrame): The dataframe containing the data.
+    params_df (pd.DataFrame): The dataframe with run parameters.
+    value_type (str): The type of value to compare.
+    category_column (str): The category column (e.g., 'technology').
+    output_file (str): Path of the CSV file.
+    quantiles (list): Quantiles whose differences are reported.
+
+    Returns:
+    pd.DataFrame: The distance table.
+    """
+    distances = compute_distribution_distances(
+        data_df, params_df, value_type, category_column, quantiles
+    )
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    write_csv(distances, output_file, index=False)
+    record_output(output_file)
+    print(f"Saved {len(distances)} run pair distances to {output_file}")
+    return distances
@@ -1,11 +1,22 @@
 import os
 import numpy as np
-import matplotlib as mpl
-import matplotlib.pyplot as plt
-from matplotlib.ticker import FuncFormatter
-
 import pandas as pd
 
+from .extract_distributions_data import (
+    extract_density_data_by_category,
+    extract_density_data_by_run,
+)
+from .extract_histogram_data import (
+    extract_histogram_data_by_category,
+    extract_histogram_data_by_run,
+)
+from .figure_manifest import FigureManifest, data_digest
+from .instrumentation import iter_stages
+from .rendering import figure_template
+from .result_cube import as_frame
+from .run_catalog import COLORS, run_catalog
+from .tracing import span
+
 
 # Function to load and return the dataset
 def load_data(source):
@@ -90,427 +101,533 @@ def plot_density(data, column, ax, label, color):
 
 
 def plot_distributions_by_category(
-    data_df, params_df, plots_folder, value_type, category_column
+    data_df,
+    params_df,
+    plots_folder,
+    value_type,
+    category_column,
+    num_points=1000,
+    profile=None,
+    density_data=None,
 ):
     """
     Plots distributions for each category (technology or sector), with a line for each run_id.
     Creates two sets of graphs: one with free x-axis and one with aligned x-axis.
-    """
-    plots_folder_free = os.path.join(
-        plots_folder, f"{value_type}_by_{category_column}_free_x"
-    )
-    plots_folder_aligned = os.path.join(
-        plots_folder, f"{value_type}_by_{category_column}_aligned_x"
-    )
-    os.makedirs(plots_folder_free, exist_ok=True)
-    os.makedirs(plots_folder_aligned, exist_ok=True)
 
+    The densities come from `extract_density_data_by_category`, computed once
+    on a grid of `num_points` points spanning the global range, unless
+    precomputed `density_data` is given (for instance loaded with
+    `load_density_data`), in which case data_df is not used.
+    `profile` names a rendering profile of `rendering.RENDER_PROFILES`; None uses
+    the default profile.
+    """
     print(f"Creating distribution graphs by {category_column} for {value_type}")
 
-    categories = data_df[category_column].unique()
-    categories = np.append(categories, "All")  # Add "All" for the special case
-
-    # Calculate global limits for the aligned x-axis
-    global_min = data_df[value_type].min()
-    global_max = data_df[value_type].max()
-    global_margin = (global_max - global_min) * 0.1
-    global_xlim = (global_min - global_margin, global_max + global_margin)
-
-    colors = [
-        "blue",
-        "orange",
-        "red",
-        "magenta",
-        "gray",
-        "cyan",
-        "#8B4513",
-        "#006400",
-        "#4B0082",
-        "#FF1493",
-        "#00CED1",
-        "#FF4500",
-        "#2F4F4F",
-        "#9ACD32",
-        "#FF69B4",
-    ]
-
-    for cat in categories:
-        print(f"\nProcessing {category_column}: {cat}")
-
-        if cat == "All":
-            cat_data = data_df
-            title = f"Distribution of {value_type} - All {category_column}s"
-        else:
-            cat_data = data_df[data_df[category_column] == cat]
-            title = f"Distribution of {value_type} - {cat}"
-
-        print(f"  Number of rows for this {category_column}: {len(cat_data)}")
-
-        for aligned in [False, True]:
-            plt.figure(figsize=(10, 6), dpi=250)
-            ax = plt.gca()
-
-            max_density = 0
-            min_x, max_x = float("inf"), float("-inf")
-
-            for idx, (run_id, run_params) in enumerate(params_df.iterrows()):
-                run_data = cat_data[cat_data["run_id"] == run_params["run_id"]]
-                print(f"  Processing run_id: {run_id} ({len(run_data)} rows)")
-
-                if not run_data.empty:
-                    values = run_data[value_type].values
-                    min_x = min(min_x, values.min())
-                    max_x = max(max_x, values.max())
-
-                    label = f"{run_params['target_scenario']} ({run_params['shock_year']}, {run_params['scenario_geography']})"
-                    if len(values) > 1:
-                        try:
-                            density = run_data[value_type].plot.density(
-                                label=label, color=colors[idx % len(colors)], ax=ax
-                            )
-                            current_max_density = ax.get_ylim()[1]
-                            max_density = min(
-                                max(max_density, current_max_density), 100
-                            )
-                            print(f"    Density curve plotted for {label}")
-                        except Exception as e:
-                            print(f"    Error plotting density for {label}: {str(e)}")
-                            ax.axvline(
-                                values.mean(),
-                                color=colors[idx % len(colors)],
-                                label=label,
-                            )
-                            print(
-                                f"    Vertical line plotted for {label} at mean value"
-                            )
-                    else:
-                        ax.axvline(
-                            values[0], color=colors[idx % len(colors)], label=label
-                        )
-                        print(f"    Single vertical line plotted for {label}")
-
-            if min_x == float("inf") or max_x == float("-inf"):
-                print(f"  No valid data for {category_column} {cat}")
-                plt.close()
-                continue
-
-            if aligned:
-                plt.xlim(global_xlim)
-            else:
-                margin = (max_x - min_x) * 0.1
-                plt.xlim(min_x - margin, max_x + margin)
-
-            plt.ylim(0, max_density * 1.1)  # Add a 10% margin at the top
-            plt.title(title, fontsize=18)
-            plt.xlabel(f"{value_type.replace('_', ' ').title()}", fontsize=14)
-            plt.ylabel("Density", fontsize=14)
-            plt.legend(fontsize=10)
-            ax.xaxis.set_major_formatter(FuncFormatter(lambda x, _: f"{x:.0%}"))
-            plt.tight_layout()
-
-            folder = plots_folder_aligned if aligned else plots_folder_free
-            imgpath = os.path.join(folder, f"{title.replace(' ', '_')}.png")
-            plt.savefig(imgpath)
-            plt.close()
-            print(f"  {'Aligned' if aligned else 'Free'} graph saved in {imgpath}")
-
-        print(f"  X-axis limits: [{min_x:.4f}, {max_x:.4f}]")
-        print(f"  Maximum density: {max_density:.4f}")
+    if density_data is None:
+        density_data = extract_density_data_by_category(
+            data_df, params_df, value_type, category_column, num_points=num_points
+        )
+    plot_density_data_by_category(
+        density_data, plots_folder, value_type, category_column, profile=profile
+    )
 
 
 def plot_distributions_by_run(
-    data_df, params_df, plots_folder, value_type, category_column
+    data_df,
+    params_df,
+    plots_folder,
+    value_type,
+    category_column,
+    profile=None,
+    density_data=None,
 ):
     """
     Plots distributions for each run_id, with a line for each technology or sector.
-    """
-    plots_folder = os.path.join(plots_folder, f"{value_type}_by_run_{category_column}")
-    os.makedirs(plots_folder, exist_ok=True)
 
+    The densities come from `extract_density_data_by_run` unless precomputed
+    `density_data` is given, in which case data_df is not used.
+    `profile` names a rendering profile of `rendering.RENDER_PROFILES`; None uses
+    the default profile.
+    """
     print(
-        f"Creating distribution graphs by run for {value_type} based on {category_column} in {plots_folder}"
+        f"Creating distribution graphs by run for {value_type} based on {category_column}"
     )
 
-    colors = [
-        "blue",
-        "orange",
-        "red",
-        "magenta",
-        "gray",
-        "cyan",
-        "#8B4513",
-        "#006400",
-        "#4B0082",
-        "#FF1493",
-        "#00CED1",
-        "#FF4500",
-        "#2F4F4F",
-        "#9ACD32",
-        "#FF69B4",
-    ]
-
-    for run_id, run_params in params_df.iterrows():
-        print(f"\nProcessing run_id: {run_id}")
-        plt.figure(figsize=(10, 6), dpi=250)
-        ax = plt.gca()
-
-        run_data = data_df[data_df["run_id"] == run_params["run_id"]]
-        print(f"  Number of rows for this run: {len(run_data)}")
-
-        title = f"Distribution of {value_type} - {run_params['target_scenario']} ({run_params['shock_year']}, {run_params['scenario_geography']})"
-
-        max_density = 0
-        min_x, max_x = float("inf"), float("-inf")
-
-        for idx, category in enumerate(run_data[category_column].unique()):
-            cat_data = run_data[run_data[category_column] == category]
-            print(f"  Processing {category_column}: {category} ({len(cat_data)} rows)")
-
-            if not cat_data.empty:
-                values = cat_data[value_type].values
-                min_x = min(min_x, values.min())
-                max_x = max(max_x, values.max())
-
-                if len(values) > 1:
-                    try:
-                        density = cat_data[value_type].plot.density(
-                            label=category, color=colors[idx % len(colors)], ax=ax
-                        )
-                        current_max_density = ax.get_ylim()[1]
-                        max_density = min(max(max_density, current_max_density), 100)
-                        print(f"    Density curve plotted for {category}")
-                    except Exception as e:
-                        print(f"    Error plotting density for {category}: {str(e)}")
-                        ax.axvline(
-                            values.mean(),
-                            color=colors[idx % len(colors)],
-                            label=category,
-                        )
-                        print(f"    Vertical line plotted for {category} at mean value")
-                else:
-                    ax.axvline(
-                        values[0], color=colors[idx % len(colors)], label=category
-                    )
-                    print(f"    Single vertical line plotted for {category}")
-
-        if min_x == float("inf") or max_x == float("-inf"):
-            print(f"  No valid data for run_id {run_id}")
-            plt.close()
-            continue
-
-        print(f"  X-axis limits: [{min_x:.4f}, {max_x:.4f}]")
-        print(f"  Maximum density: {max_density:.4f}")
-
-        margin = (max_x - min_x) * 0.1
-        plt.xlim(min_x - margin, max_x + margin)
-        plt.ylim(0, max_density * 1.1)  # Add a 10% margin at the top
-        plt.title(title, fontsize=18)
-        plt.xlabel(f"{value_type.replace('_', ' ').title()}", fontsize=14)
-        plt.ylabel("Density", fontsize=14)
-        plt.legend(fontsize=10)
-        ax.xaxis.set_major_formatter(FuncFormatter(lambda x, _: f"{x:.0%}"))
-        plt.tight_layout()
-
-        imgpath = os.path.join(plots_folder, f"{title.replace(' ', '_')}.png")
-        plt.savefig(imgpath)
-        plt.close()
-        print(f"  Graph saved in {imgpath}")
+    if density_data is None:
+        density_data = extract_density_data_by_run(
+            data_df, params_df, value_type, category_column
+        )
+    plot_density_data_by_run(
+        density_data,
+        params_df,
+        plots_folder,
+        value_type,
+        category_column,
+        profile=profile,
+    )
 
 
-def plot_density_distributions(npv_df, pd_df, params_df, plots_folder):
+def plot_density_distributions(npv_df, pd_df, params_df, plots_folder, profile=None):
     """
     Main function to plot all density distributions.
+    `profile` names a rendering profile of `rendering.RENDER_PROFILES`; None uses
+    the default profile.
     """
-    mpl.rcParams["font.family"] = "Times New Roman"
-    plt.style.use("default")
-
+    npv_df = as_frame(npv_df)
+    pd_df = as_frame(pd_df)
     # Plot for NPV
     npv_folder = os.path.join(plots_folder, "npv")
     os.makedirs(npv_folder, exist_ok=True)
     plot_distributions_by_category(
-        npv_df, params_df, npv_folder, "net_present_value_change", "technology"
+        npv_df,
+        params_df,
+        npv_folder,
+        "net_present_value_change",
+        "technology",
+        profile=profile,
     )
     plot_distributions_by_run(
-        npv_df, params_df, npv_folder, "net_present_value_change", "technology"
+        npv_df,
+        params_df,
+        npv_folder,
+        "net_present_value_change",
+        "technology",
+        profile=profile,
     )
 
     # Plot for PD
     pd_folder = os.path.join(plots_folder, "pd")
     os.makedirs(pd_folder, exist_ok=True)
     plot_distributions_by_category(
-        pd_df, params_df, pd_folder, "pd_difference", "sector"
+        pd_df, params_df, pd_folder, "pd_difference", "sector", profile=profile
+    )
+    plot_distributions_by_run(
+        pd_df, params_df, pd_folder, "pd_difference", "sector", profile=profile
     )
-    plot_distributions_by_run(pd_df, params_df, pd_folder, "pd_difference", "sector")
 
 
-def plot_barplot_distributions(npv_df, pd_df, params_df, plots_folder):
+def plot_barplot_distributions(npv_df, pd_df, params_df, plots_folder, profile=None):
     """
     Main function to plot all bar plot distributions.
+    `profile` names a rendering profile of `rendering.RENDER_PROFILES`; None uses
+    the default profile.
     """
-    mpl.rcParams["font.family"] = "Times New Roman"
-    plt.style.use("default")
-
+    npv_df = as_frame(npv_df)
+    pd_df = as_frame(pd_df)
     # Plot for NPV
     npv_folder = os.path.join(plots_folder, "npv_barplot")
     os.makedirs(npv_folder, exist_ok=True)
     plot_barplot_by_category(
-        npv_df, params_df, npv_folder, "net_present_value_change", "technology"
+        npv_df,
+        params_df,
+        npv_folder,
+        "net_present_value_change",
+        "technology",
+        profile=profile,
     )
     plot_barplot_by_run(
-        npv_df, params_df, npv_folder, "net_present_value_change", "technology"
+        npv_df,
+        params_df,
+        npv_folder,
+        "net_present_value_change",
+        "technology",
+        profile=profile,
     )
 
     # Plot for PD
     pd_folder = os.path.join(plots_folder, "pd_barplot")
     os.makedirs(pd_folder, exist_ok=True)
-    plot_barplot_by_category(pd_df, params_df, pd_folder, "pd_difference", "sector")
-    plot_barplot_by_run(pd_df, params_df, pd_folder, "pd_difference", "sector")
+    plot_barplot_by_category(
+        pd_df, params_df, pd_folder, "pd_difference", "sector", profile=profile
+    )
+    plot_barplot_by_run(
+        pd_df, params_df, pd_folder, "pd_difference", "sector", profile=profile
+    )
 
 
 def plot_barplot_by_category(
-    data_df, params_df, plots_folder, value_type, category_column
+    data_df,
+    params_df,
+    plots_folder,
+    value_type,
+    category_column,
+    profile=None,
+    histogram_data=None,
 ):
     """
     Plots grouped bar plots for each category (technology or sector), showing distributions per run_id.
-    """
-    plots_folder = os.path.join(plots_folder, f"{value_type}_by_{category_column}")
-    os.makedirs(plots_folder, exist_ok=True)
 
+    The counts come from `extract_histogram_data_by_category` unless
+    precomputed `histogram_data` is given (for instance loaded with
+    `load_histogram_data`), in which case data_df is not used.
+    `profile` names a rendering profile of `rendering.RENDER_PROFILES`; None uses
+    the default profile.
+    """
     print(f"Creating grouped bar plots by {category_column} for {value_type}")
 
-    categories = data_df[category_column].unique()
-    categories = np.append(categories, "All")  # Add "All" for the special case
+    if histogram_data is None:
+        histogram_data = extract_histogram_data_by_category(
+            data_df, params_df, value_type, category_column
+        )
+    titles = {
+        cat: f"All {category_column}s" if cat == "All" else cat
+        for cat in histogram_data
+    }
+    plot_histogram_data(
+        histogram_data,
+        os.path.join(plots_folder, f"{value_type}_by_{category_column}"),
+        titles,
+        value_type,
+        profile=profile,
+    )
 
-    for cat in categories:
-        print(f"\nProcessing {category_column}: {cat}")
 
+def plot_barplot_by_run(
+    data_df,
+    params_df,
+    plots_folder,
+    value_type,
+    category_column,
+    profile=None,
+    histogram_data=None,
+):
+    """
+    Plots grouped bar plots for each run_id, showing the distribution for each technology or sector.
+
+    The counts come from `extract_histogram_data_by_run` unless precomputed
+    `histogram_data` is given, in which case data_df is not used.
+    `profile` names a rendering profile of `rendering.RENDER_PROFILES`; None uses
+    the default profile.
+    """
+    print(
+        f"Creating grouped bar plots by run for {value_type} based on {category_column}"
+    )
+
+    if histogram_data is None:
+        histogram_data = extract_histogram_data_by_run(
+            data_df, params_df, value_type, category_column
+        )
+    catalog = run_catalog(params_df)
+    titles = {run_id: catalog.label(run_id) for run_id in histogram_data}
+    plot_histogram_data(
+        histogram_data,
+        os.path.join(plots_folder, f"{value_type}_by_run_{category_column}"),
+        titles,
+        value_type,
+        profile=profile,
+    )
+
+
+def _density_support(density_df):
+    """
+    Returns the x range where any density reaches 1% of the highest peak, used as the
+    free x limits of densities loaded without their limits.
+    """
+    density = density_df.filter(like="density_").to_numpy()
+    if density.size == 0 or np.all(np.isnan(density)):
+        return (density_df["x"].min(), density_df["x"].max())
+    visible = (density >= 0.01 * np.nanmax(density)).any(axis=1)
+    x = density_df["x"].to_numpy()[visible]
+    return (x.min(), x.max())
+
+
+def plot_density_data_by_category(
+    density_data,
+    plots_folder,
+    value_type,
+    category_column,
+    global_xlim=None,
+    xlim_by_category=None,
+    profile=None,
+):
+    """
+    Plots precomputed densities for each category, with a line for each run.
+    Creates the same free and aligned x-axis graphs as `plot_distributions_by_category`.
+
+    Args:
+    density_data (dict): Category -> DataFrame with an 'x' column and one 'density_<label>' column per run.
+    plots_folder (str): The directory where plots will be saved.
+    value_type (str): The name of the plotted value.
+    category_column (str): The category column (e.g., 'technology').
+    global_xlim (tuple): The x limits shared by the aligned graphs. Defaults
+        to the widest density grid.
+    xlim_by_category (dict): Category -> x limits of the free graphs. Defaults
+        to the limits stored in the DataFrame attrs, else to the range where
+        the densities are visible.
+    profile (str): Rendering profile name, or None for the default profile.
+    """
+    plots_folder_free = os.path.join(
+        plots_folder, f"{value_type}_by_{category_column}_free_x"
+    )
+    plots_folder_aligned = os.path.join(
+        plots_folder, f"{value_type}_by_{category_column}_aligned_x"
+    )
+    os.makedirs(plots_folder_free, exist_ok=True)
+    os.makedirs(plots_folder_aligned, exist_ok=True)
+
+    template = figure_template("density", profile)
+    xlabel = f"{value_type.replace('_', ' ').title()}"
+
+    if global_xlim is None and density_data:
+        global_xlim = (
+            min(df["x"].min() for df in density_data.values()),
+            max(df["x"].max() for df in density_data.values()),
+        )
+
+    manifest = FigureManifest(plots_folder, f"{value_type}_by_{category_column}")
+    for cat, density_df in iter_stages(density_data.items(), category_column):
+        print(f"\nProcessing {category_column}: {cat}")
         if cat == "All":
-            cat_data = data_df
-            title = f"Grouped Bar Plot of {value_type} - All {category_column}s"
+            title = f"Distribution of {value_type} - All {category_column}s"
         else:
-            cat_data = data_df[data_df[category_column] == cat]
-            title = f"Grouped Bar Plot of {value_type} - {cat}"
-
-        print(f"  Number of rows for this {category_column}: {len(cat_data)}")
-
-        plt.figure(figsize=(14, 8), dpi=250)
-        ax = plt.gca()
-
-        # Bin calculation based on overall min and max values
-        values = cat_data[value_type].values
-        min_val = values.min()
-        max_val = values.max()
-        num_bins = 10
-        bin_edges = np.linspace(min_val, max_val, num_bins + 1)
-        bar_width = (bin_edges[1] - bin_edges[0]) / (
-            len(params_df) + 1
-        )  # Width per bar
-
-        for idx, (run_id, run_params) in enumerate(params_df.iterrows()):
-            run_data = cat_data[cat_data["run_id"] == run_params["run_id"]]
-
-            if not run_data.empty:
-                values = run_data[value_type].values
-                counts, _ = np.histogram(values, bins=bin_edges)
-
-                # Calculate positions for the bars
-                bar_positions = bin_edges[:-1] + idx * bar_width
-
-                ax.bar(
-                    bar_positions,
-                    counts,
-                    width=bar_width,
-                    edgecolor="black",
-                    label=f"{run_params['target_scenario']} ({run_params['shock_year']}, {run_params['scenario_geography']})",
-                    alpha=0.7,
-                )
-                print(f"    Grouped bar plot distribution plotted for run_id {run_id}")
-
-        plt.title(title, fontsize=18)
-        plt.xlabel(f"{value_type.replace('_', ' ').title()}", fontsize=14)
-        plt.ylabel(
-            "Count", fontsize=14
-        )  # Changed from "Density" to "Count" for accuracy
-        plt.legend(fontsize=10)
-
-        # **Add the percentage formatter for the x-axis**
-        ax.xaxis.set_major_formatter(FuncFormatter(lambda x, _: f"{x:.0%}"))
-
-        plt.tight_layout()
-
-        imgpath = os.path.join(plots_folder, f"{title.replace(' ', '_')}.png")
-        plt.savefig(imgpath)
-        plt.close()
-        print(f"  Grouped bar plot saved in {imgpath}")
+            title = f"Distribution of {value_type} - {cat}"
 
+        if xlim_by_category is not None:
+            xlim = xlim_by_category[cat]
+        else:
+            xlim = density_df.attrs.get("xlim") or _density_support(density_df)
+        vlines = density_df.attrs.get("vlines", {})
+
+        imgpaths = [
+            template.output_path(os.path.join(folder, f"{title.replace(' ', '_')}.png"))
+            for folder in [plots_folder_free, plots_folder_aligned]
+        ]
+        digest = data_digest(
+            density_df,
+            sorted(vlines.items()),
+            global_xlim,
+            xlim,
+            title,
+            template.signature,
+        )
+        if manifest.is_current(imgpaths, digest):
+            print(f"  Unchanged, skipped {category_column} {cat}")
+            continue
+
+        for aligned, imgpath in zip([False, True], imgpaths):
+            with span("draw", category=cat, aligned=aligned):
+                ax = template.start(xlabel, "Density")
+                max_density = _plot_density_columns(ax, density_df, vlines)
+            if max_density is None:
+                print(f"  No valid data for {category_column} {cat}")
+                break
 
-def plot_barplot_by_run(data_df, params_df, plots_folder, value_type, category_column):
+            ax.set_xlim(global_xlim if aligned else xlim)
+            if max_density > 0:
+                ax.set_ylim(0, max_density * 1.1)  # Add a 10% margin at the top
+
+            imgpath = template.save(imgpath, title)
+            manifest.record(imgpath, digest)
+            print(f"  {'Aligned' if aligned else 'Free'} graph saved in {imgpath}")
+    manifest.close()
+
+
+def plot_density_data_by_run(
+    density_data,
+    params_df,
+    plots_folder,
+    value_type,
+    category_column,
+    xlim_by_run=None,
+    profile=None,
+):
     """
-    Plots grouped bar plots for each run_id, showing the distribution for each technology or sector.
+    Plots precomputed densities for each run, with a line for each technology or sector.
+
+    Args:
+    density_data (dict): run_id -> DataFrame with an 'x' column and one 'density_<category>' column per category.
+    params_df (pd.DataFrame): The dataframe with run parameters.
+    plots_folder (str): The directory where plots will be saved.
+    value_type (str): The name of the plotted value.
+    category_column (str): The category column (e.g., 'technology').
+    xlim_by_run (dict): run_id -> x limits of the graph. Defaults to the
+        range of each density grid.
+    profile (str): Rendering profile name, or None for the default profile.
     """
     plots_folder = os.path.join(plots_folder, f"{value_type}_by_run_{category_column}")
     os.makedirs(plots_folder, exist_ok=True)
 
-    print(
-        f"Creating grouped bar plots by run for {value_type} based on {category_column} in {plots_folder}"
-    )
+    template = figure_template("density", profile)
+    xlabel = f"{value_type.replace('_', ' ').title()}"
+
+    manifest = FigureManifest(plots_folder)
+    for run in iter_stages(run_catalog(params_df), "run", key=lambda run: run.run_id):
+        print(f"\nProcessing run_id: {run.run_id}")
+        density_df = density_data.get(run.run_id)
+        if density_df is None:
+            print(f"  No valid data for run_id {run.run_id}")
+            continue
+
+        title = f"Distribution of {value_type} - {run.label}"
+        if xlim_by_run is not None:
+            xlim = xlim_by_run[run.run_id]
+        else:
+            xlim = (density_df["x"].min(), density_df["x"].max())
+        vlines = density_df.attrs.get("vlines", {})
+
+        imgpath = template.output_path(
+            os.path.join(plots_folder, f"{title.replace(' ', '_')}.png")
+        )
+        digest = data_digest(
+            density_df, sorted(vlines.items()), xlim, title, template.signature
+        )
+        if manifest.is_current(imgpath, digest):
+            print(f"  Unchanged, skipped run_id {run.run_id}")
+            continue
+
+        ax = template.start(xlabel, "Density")
+        max_density = _plot_density_columns(ax, density_df, vlines)
+        if max_density is None:
+            print(f"  No valid data for run_id {run.run_id}")
+            continue
+
+        ax.set_xlim(xlim)
+        if max_density > 0:
+            ax.set_ylim(0, max_density * 1.1)  # Add a 10% margin at the top
+
+        imgpath = template.save(imgpath, title)
+        manifest.record(imgpath, digest)
+        print(f"  Graph saved in {imgpath}")
+    manifest.close()
+
+
+def _plot_density_columns(ax, density_df, vlines=None):
+    """
+    Draws every 'density_<label>' column of a density DataFrame against its 'x' column.
+    Labels without a density but listed in `vlines` are drawn as a vertical line.
 
-    for run_id, run_params in params_df.iterrows():
-        print(f"\nProcessing run_id: {run_id}")
-        plt.figure(figsize=(14, 8), dpi=250)
-        ax = plt.gca()
+    Returns:
+    float: The maximum density value, capped at 100 like the live density plots,
+    or None if nothing was drawn.
+    """
+    vlines = vlines or {}
+    max_density = None
+    density_columns = [c for c in density_df.columns if c.startswith("density_")]
+    for idx, column in enumerate(density_columns):
+        label = column[len("density_") :]
+        color = COLORS[idx % len(COLORS)]
+        density = density_df[column].to_numpy()
+        if np.all(np.isnan(density)):
+            if label in vlines:
+                ax.axvline(vlines[label], color=color, label=label)
+                max_density = max_density or 0
+            continue
+        ax.plot(density_df["x"], density, label=label, color=color)
+        max_density = min(max(max_density or 0, np.nanmax(density)), 100)
+    return max_density
 
-        run_data = data_df[data_df["run_id"] == run_params["run_id"]]
-        print(f"  Number of rows for this run: {len(run_data)}")
 
-        title = f"Grouped Bar Plot of {value_type} - {run_params['target_scenario']} ({run_params['shock_year']}, {run_params['scenario_geography']})"
+def plot_histogram_data(
+    histogram_data, plots_folder, title_prefix, value_type, profile=None
+):
+    """
+    Plots precomputed grouped bar plots, one per key of `histogram_data`.
+
+    Args:
+    histogram_data (dict): Key -> DataFrame with 'bin_start', 'bin_end' and one 'count_<label>' column per bar group.
+    plots_folder (str): The directory where plots will be saved.
+    title_prefix (dict): Key -> text appended to the plot title.
+    value_type (str): The name of the plotted value.
+    profile (str): Rendering profile name, or None for the default profile.
+    """
+    os.makedirs(plots_folder, exist_ok=True)
 
-        # Bin calculation based on overall min and max values
-        values = run_data[value_type].values
-        min_val = values.min()
-        max_val = values.max()
-        num_bins = 10
-        bin_edges = np.linspace(min_val, max_val, num_bins + 1)
-        bar_width = (bin_edges[1] - bin_edges[0]) / (
-            len(run_data[category_column].unique()) + 1
+    template = figure_template("barplot", profile)
+    xlabel = f"{value_type.replace('_', ' ').title()}"
+
+    manifest = FigureManifest(plots_folder)
+    for key, histogram_df in iter_stages(histogram_data.items(), "histogram"):
+        print(f"\nProcessing {key}")
+        title = f"Grouped Bar Plot of {value_type} - {title_prefix[key]}"
+        imgpath = template.output_path(
+            os.path.join(plots_folder, f"{title.replace(' ', '_')}.png")
         )
+        digest = data_digest(histogram_df, title, template.signature)
+        if manifest.is_current(imgpath, digest):
+            print(f"  Unchanged, skipped {key}")
+            continue
+
+        ax = template.start(xlabel, "Count")
 
-        for idx, category in enumerate(run_data[category_column].unique()):
-            cat_data = run_data[run_data[category_column] == category]
-
-            if not cat_data.empty:
-                values = cat_data[value_type].values
-                counts, _ = np.histogram(values, bins=bin_edges)
-
-                # Calculate positions for the bars
-                bar_positions = bin_edges[:-1] + idx * bar_width
-
-                ax.bar(
-                    bar_positions,
-                    counts,
-                    width=bar_width,
-                    edgecolor="black",
-                    label=category,
-                    alpha=0.7,
-                )
-                print(f"    Grouped bar plot distribution plotted for {category}")
-
-        plt.title(title, fontsize=18)
-        plt.xlabel(f"{value_type.replace('_', ' ').title()}", fontsize=14)
-        plt.ylabel(
-            "Count", fontsize=14
-        )  # Changed from "Density" to "Count" for accuracy
-        plt.legend(fontsize=10)
-
-        # **Add the percentage formatter for the x-axis**
-        ax.xaxis.set_major_formatter(FuncFormatter(lambda x, _: f"{x:.0%}"))
-
-        plt.tight_layout()
-
-        imgpath = os.path.join(plots_folder, f"{title.replace(' ', '_')}.png")
-        plt.savefig(imgpath)
-        plt.close()
+        count_columns = [c for c in histogram_df.columns if c.startswith("count_")]
+        bin_starts = histogram_df["bin_start"].to_numpy()
+        bin_width = histogram_df["bin_end"].iloc[0] - histogram_df["bin_start"].iloc[0]
+        bar_width = bin_width / (len(count_columns) + 1)  # Width per bar
+
+        for idx, column in enumerate(count_columns):
+            counts = histogram_df[column].to_numpy()
+            if np.all(np.isnan(counts)):
+                continue
+            ax.bar(
+                bin_starts + idx * bar_width,
+                counts,
+                width=bar_width,
+                edgecolor="black",
+                label=column[len("count_") :],
+                alpha=0.7,
+            )
+
+        imgpath = template.save(imgpath, title)
+        manifest.record(imgpath, digest)
         print(f"  Grouped bar plot saved in {imgpath}")
+    manifest.close()
+
+
+def plot_reduced_distributions(
+    reduced, params_df, density_folder, histogram_folder, profile=None
+):
+    """
+    Plots the density and bar plot families from the output of
+    `out_of_core.reduce_distributions`, without touching the raw data.
+
+    Args:
+    reduced (dict): Reduced results of one dataset.
+    params_df (pd.DataFrame): The dataframe with run parameters.
+    density_folder (str): Folder of the density graphs ("npv" or "pd" subfolder included).
+    histogram_folder (str): Folder of the bar plots ("npv_barplot" or "pd_barplot" subfolder included).
+    profile (str): Rendering profile name, or None for the default profile.
+    """
+    value_type = reduced["value_type"]
+    category_column = reduced["category_column"]
+
+    plot_density_data_by_category(
+        reduced["density_by_category"],
+        density_folder,
+        value_type,
+        category_column,
+        reduced["global_xlim"],
+        reduced["xlim_by_category"],
+        profile=profile,
+    )
+    plot_density_data_by_run(
+        reduced["density_by_run"],
+        params_df,
+        density_folder,
+        value_type,
+        category_column,
+        reduced["xlim_by_run"],
+        profile=profile,
+    )
+
+    category_titles = {
+        cat: f"All {category_column}s" if cat == "All" else cat
+        for cat in reduced["histogram_by_category"]
+    }
+    plot_histogram_data(
+        reduced["histogram_by_category"],
+        os.path.join(histogram_folder, f"{value_type}_by_{category_column}"),
+        category_titles,
+        value_type,
+        profile=profile,
+    )
+    run_titles = {run.run_id: run.label for run in run_catalog(params_df)}
+    plot_histogram_data(
+        reduced["histogram_by_run"],
+        os.path.join(histogram_folder, f"{value_type}_by_run_{category_column}"),
+        run_titles,
+        value_type,
+        profile=profile,
+    )
 
 
 if __name__ == "__main__":
@@ -1,7 +1,14 @@
 import os
 import numpy as np
 import pandas as pd
-from scipy.stats import gaussian_kde
+
+from .instrumentation import add_rows, iter_stages, record_output
+from .output_writer import write_csv
+from .pd_terms import map_terms, needs_term_selection
+from .precision import density_grid, gaussian_density
+from .result_cube import as_frame
+from .run_catalog import run_catalog
+from .tracing import span
 
 
 def load_data(source):
@@ -40,16 +47,57 @@ def extract_density_for_plot(data, value_type, x_grid=None):
     if x_grid is None:
         x_min, x_max = values.min(), values.max()
         margin = (x_max - x_min) * 0.1
-        x_grid = np.linspace(x_min - margin, x_max + margin, 500)
+        x_grid = density_grid(x_min - margin, x_max + margin, 500)
 
     # Compute density using Gaussian Kernel Density Estimation
-    kde = gaussian_kde(values)
-    density = kde.evaluate(x_grid)
+    density = gaussian_density(values, x_grid)
 
     return density
 
 
-def extract_density_data_by_category(data_df, params_df, value_type, category_column):
+def _density_columns(data, value_type, x_grid):
+    """
+    Computes one density column per labelled subset, on a shared grid.
+
+    Parameters:
+    data (list): (label, subset DataFrame) pairs; an empty subset gives NaNs.
+    value_type (str): The column whose density is computed.
+    x_grid (np.ndarray): The grid over which densities are evaluated.
+
+    Returns:
+    tuple: DataFrame with an 'x' column and one 'density_<label>' column per
+    label, and a dict label -> x position of the vertical line drawn instead of
+    a curve for subsets with a single value or zero spread.
+    """
+    columns = {"x": x_grid}
+    vlines = {}
+    for label, subset in data:
+        density_values = np.full(len(x_grid), np.nan)
+        values = subset[value_type].dropna().values
+        if len(values) > 0:
+            try:
+                with span("kde", label=label, rows=len(values)):
+                    density_values = extract_density_for_plot(
+                        subset, value_type, x_grid=x_grid
+                    )
+            except (np.linalg.LinAlgError, ValueError) as e:
+                print(f"Error computing density for {label}: {str(e)}")
+            if np.all(np.isnan(density_values)):
+                vlines[label] = values.mean()
+        columns[f"density_{label}"] = density_values
+    return pd.DataFrame(columns), vlines
+
+
+def _padded_limits(values):
+    """Returns the range of the values with a 10% margin on each side."""
+    x_min, x_max = values.min(), values.max()
+    margin = (x_max - x_min) * 0.1
+    return (x_min - margin, x_max + margin)
+
+
+def extract_density_data_by_category(
+    data_df, params_df, value_type, category_column, num_points=500, term=None
+):
     """
     Extracts density data for each category as a concatenated DataFrame.
     Returns a dictionary structured as:
@@ -58,54 +106,143 @@ def extract_density_data_by_category(data_df, params_df, value_type, category_co
         category2: DataFrame with the same structure,
         ...
     }
+
+    All categories share one grid spanning the global range. Each DataFrame
+    also carries, in `attrs`, the free x limits of its category ("xlim") and
+    the runs drawn as vertical lines ("vlines", label -> x), which the
+    density plots use; these are not kept when saved to CSV.
+
+    For PD results holding several terms (a PDTermSet), `term` selects the
+    term (by default DEFAULT_PD_TERM); a list of terms returns a dictionary
+    term -> the dictionary above.
     """
+    if needs_term_selection(data_df, term):
+        return map_terms(
+            data_df,
+            term,
+            lambda pd_df: extract_density_data_by_category(
+                pd_df, params_df, value_type, category_column, num_points
+            ),
+        )
+    data_df = as_frame(data_df)
     density_data = {}
+    catalog = run_catalog(params_df)
     categories = data_df[category_column].unique()
     categories = np.append(categories, "All")
 
-    global_min = data_df[value_type].min()
-    global_max = data_df[value_type].max()
-    global_margin = (global_max - global_min) * 0.1
-    global_xlim = (global_min - global_margin, global_max + global_margin)
-    x_grid = np.linspace(global_xlim[0], global_xlim[1], 500)
+    global_xlim = _padded_limits(data_df[value_type])
+    x_grid = density_grid(global_xlim[0], global_xlim[1], num_points)
 
-    for cat in categories:
-        if cat == "All":
-            cat_data = data_df
-        else:
-            cat_data = data_df[data_df[category_column] == cat]
+    for cat in iter_stages(categories, category_column):
+        with span("slice", category=cat):
+            if cat == "All":
+                cat_data = data_df
+            else:
+                cat_data = data_df[data_df[category_column] == cat]
 
-        density_dfs = []
+            # Split by run once; label text identical to the legend text
+            run_groups = dict(list(cat_data.groupby("run_id", sort=False)))
+            run_subsets = [
+                (run.label, run_groups.get(run.run_id, cat_data.iloc[:0]))
+                for run in catalog
+            ]
+        combined_df, vlines = _density_columns(run_subsets, value_type, x_grid)
+        combined_df.attrs["xlim"] = _padded_limits(cat_data[value_type].dropna())
+        combined_df.attrs["vlines"] = vlines
+        density_data[cat] = combined_df
 
-        for _, run_params in params_df.iterrows():
-            # Construct label text similar to legend text
-            label = f"{run_params['target_scenario']} ({run_params['shock_year']}, {run_params['scenario_geography']})"
+    return density_data
 
-            run_subset = cat_data[cat_data["run_id"] == run_params["run_id"]]
 
-            if not run_subset.empty:
-                density_values = extract_density_for_plot(
-                    run_subset, value_type, x_grid=x_grid
-                )
-                density_dfs.append(
-                    pd.DataFrame({"x": x_grid, f"density_{label}": density_values})
-                )
-            else:
-                # No data for this run; store NaNs
-                density_dfs.append(
-                    pd.DataFrame({"x": x_grid, f"density_{label}": np.nan})
-                )
-
-        # Concatenate all density columns into one DataFrame for this category
-        if density_dfs:
-            combined_df = pd.concat(density_dfs, axis=1)
-            combined_df = combined_df.loc[
-                :, ~combined_df.columns.duplicated()
-            ]  # Remove duplicate 'x' columns
-            density_data[cat] = combined_df
+def extract_density_data_by_run(
+    data_df, params_df, value_type, category_column, num_points=500, term=None
+):
+    """
+    Extracts density data for each run, with one density column per category.
+    Returns a dictionary structured as:
+    {
+        run_id1: DataFrame with columns ['x', 'density_<category1>', 'density_<category2>', ...],
+        run_id2: DataFrame with the same structure,
+        ...
+    }
+
+    Each run has its own grid spanning its values with a 10% margin, also
+    stored in `attrs["xlim"]`; `attrs["vlines"]` lists the categories drawn as
+    vertical lines.
+
+    For PD results holding several terms, `term` selects the term or terms as
+    in `extract_density_data_by_category`.
+    """
+    if needs_term_selection(data_df, term):
+        return map_terms(
+            data_df,
+            term,
+            lambda pd_df: extract_density_data_by_run(
+                pd_df, params_df, value_type, category_column, num_points
+            ),
+        )
+    data_df = as_frame(data_df)
+    density_data = {}
+    for run in iter_stages(run_catalog(params_df), "run", key=lambda run: run.run_id):
+        run_data = data_df[data_df["run_id"] == run.run_id]
+        values = run_data[value_type].dropna()
+        add_rows(len(run_data))
+        if values.empty:
+            print(f"No data found for run_id {run.run_id}. Skipping.")
+            continue
+
+        xlim = _padded_limits(values)
+        x_grid = density_grid(xlim[0], xlim[1], num_points)
+        category_subsets = list(run_data.groupby(category_column, sort=False))
+        combined_df, vlines = _density_columns(category_subsets, value_type, x_grid)
+        combined_df.attrs["xlim"] = xlim
+        combined_df.attrs["vlines"] = vlines
+        density_data[run.run_id] = combined_df
+
+    return density_data
+
+
+def save_density_data(density_data, output_base_folder, data_type="category"):
+    """
+    Saves the extracted density data to CSV files.
+
+    Parameters:
+    density_data (dict): Dictionary containing density DataFrames.
+    output_base_folder (str): Base folder to save the CSV files.
+    data_type (str): Type of data ('category' or 'run') to name the files.
+    """
+    os.makedirs(output_base_folder, exist_ok=True)
+    for key, df in density_data.items():
+        if data_type == "run":
+            filename = f"density_run_{key}.csv"
         else:
-            density_data[cat] = pd.DataFrame({"x": x_grid})
+            filename = f"density_{key}.csv"
+        output_file = os.path.join(output_base_folder, filename)
+        write_csv(df, output_file, index=False)
+        record_output(output_file)
+        print(f"Density data for '{key}' saved to {output_file}")
+
 
+def load_density_data(output_base_folder, data_type="category"):
+    """
+    Loads density data saved by `save_density_data`.
+
+    Parameters:
+    output_base_folder (str): Folder containing the CSV files.
+    data_type (str): Type of data ('category' or 'run') the files were saved as.
+
+    Returns:
+    dict: Category or run_id -> density DataFrame, in file name order.
+    """
+    prefix = "density_run_" if data_type == "run" else "density_"
+    density_data = {}
+    for filename in sorted(os.listdir(output_base_folder)):
+        if not filename.startswith(prefix) or not filename.endswith(".csv"):
+            continue
+        if data_type != "run" and filename.startswith("density_run_"):
+            continue
+        key = filename[len(prefix) : -len(".csv")]
+        density_data[key] = pd.read_csv(os.path.join(output_base_folder, filename))
     return density_data
 
 
@@ -123,11 +260,6 @@ if __name__ == "__main__":
             npv_df, params_df, "net_present_value_change", "technology"
         )
 
-        # Example: Save all density data to Excel files for inspection
+        # Example: Save all density data to CSV files for inspection
         output_base = os.path.join("workspace", "plots_data", "density_data")
-        os.makedirs(output_base, exist_ok=True)
-        for category, df in density_by_category.items():
-            # Use category in file name
-            output_file = os.path.join(output_base, f"density_{category}.csv")
-            df.to_csv(output_file, index=False)
-            print(f"Density data for category '{category}' saved to {output_file}")
+        save_density_data(density_by_category, output_base)
@@ -1,7 +1,13 @@
 import os
 import numpy as np
 import pandas as pd
-from scipy.stats import gaussian_kde
+
+from .instrumentation import iter_stages, record_output
+from .output_writer import write_csv
+from .pd_terms import map_terms, needs_term_selection
+from .precision import get_compute_dtype
+from .result_cube import as_frame
+from .run_catalog import run_catalog
 
 
 def load_data(source):
@@ -53,7 +59,7 @@ def extract_histogram_for_plot(data, value_type, bin_edges):
 
 
 def extract_histogram_data_by_category(
-    data_df, params_df, value_type, category_column, num_bins=10
+    data_df, params_df, value_type, category_column, num_bins=10, term=None
 ):
     """
     Extracts histogram data for each category as a concatenated DataFrame.
@@ -64,12 +70,26 @@ def extract_histogram_data_by_category(
         category2: DataFrame with the same structure,
         ...
     }
+
+    For PD results holding several terms (a PDTermSet), `term` selects the
+    term (by default DEFAULT_PD_TERM); a list of terms returns a dictionary
+    term -> the dictionary above.
     """
+    if needs_term_selection(data_df, term):
+        return map_terms(
+            data_df,
+            term,
+            lambda pd_df: extract_histogram_data_by_category(
+                pd_df, params_df, value_type, category_column, num_bins
+            ),
+        )
+    data_df = as_frame(data_df)
     histogram_data = {}
+    catalog = run_catalog(params_df)
     categories = data_df[category_column].unique()
     categories = np.append(categories, "All")  # Add "All" for the special case
 
-    for cat in categories:
+    for cat in iter_stages(categories, category_column):
         print(f"\nProcessing {category_column}: {cat}")
 
         if cat == "All":
@@ -86,15 +106,17 @@ def extract_histogram_data_by_category(
             continue
         min_val = values_all.min()
         max_val = values_all.max()
-        bin_edges = np.linspace(min_val, max_val, num_bins + 1)
+        bin_edges = np.linspace(
+            min_val, max_val, num_bins + 1, dtype=get_compute_dtype()
+        )
 
         bin_centers = (bin_edges[:-1] + bin_edges[1:]) / 2  # Optional: for reference
 
-        for _, run_params in params_df.iterrows():
-            # Construct label text similar to legend text
-            label = f"{run_params['target_scenario']} ({run_params['shock_year']}, {run_params['scenario_geography']})"
+        for run in catalog:
+            # Label text identical to the legend text
+            label = run.label
 
-            run_subset = cat_data[cat_data["run_id"] == run_params["run_id"]]
+            run_subset = cat_data[cat_data["run_id"] == run.run_id]
 
             if not run_subset.empty:
                 counts = extract_histogram_for_plot(run_subset, value_type, bin_edges)
@@ -108,7 +130,7 @@ def extract_histogram_data_by_category(
                     )
                 )
                 print(
-                    f"  - Histogram counts extracted for run_id {run_params['run_id']} with label '{label}'"
+                    f"  - Histogram counts extracted for run_id {run.run_id} with label '{label}'"
                 )
             else:
                 # No data for this run; store NaNs
@@ -122,7 +144,7 @@ def extract_histogram_data_by_category(
                     )
                 )
                 print(
-                    f"  - No data for run_id {run_params['run_id']} with label '{label}'. Filled with NaNs."
+                    f"  - No data for run_id {run.run_id} with label '{label}'. Filled with NaNs."
                 )
 
         # Concatenate all count columns into one DataFrame for this category
@@ -142,7 +164,7 @@ def extract_histogram_data_by_category(
 
 
 def extract_histogram_data_by_run(
-    data_df, params_df, value_type, category_column, num_bins=10
+    data_df, params_df, value_type, category_column, num_bins=10, term=None
 ):
     """
     Extracts histogram data grouped by run_id as concatenated DataFrames.
@@ -153,10 +175,22 @@ def extract_histogram_data_by_run(
         run_id2: DataFrame with the same structure,
         ...
     }
+
+    For PD results holding several terms, `term` selects the term or terms as
+    in `extract_histogram_data_by_category`.
     """
+    if needs_term_selection(data_df, term):
+        return map_terms(
+            data_df,
+            term,
+            lambda pd_df: extract_histogram_data_by_run(
+                pd_df, params_df, value_type, category_column, num_bins
+            ),
+        )
+    data_df = as_frame(data_df)
     histogram_data = {}
-    for _, run_params in params_df.iterrows():
-        run_id = run_params["run_id"]
+    for run in iter_stages(run_catalog(params_df), "run", key=lambda run: run.run_id):
+        run_id = run.run_id
         print(f"\nProcessing run_id: {run_id}")
 
         run_data = data_df[data_df["run_id"] == run_id]
@@ -174,7 +208,9 @@ def extract_histogram_data_by_run(
             continue
         min_val = values_all.min()
         max_val = values_all.max()
-        bin_edges = np.linspace(min_val, max_val, num_bins + 1)
+        bin_edges = np.linspace(
+            min_val, max_val, num_bins + 1, dtype=get_compute_dtype()
+        )
 
         bin_centers = (bin_edges[:-1] + bin_edges[1:]) / 2  # Optional: for reference
 
@@ -244,10 +280,37 @@ def save_histogram_data(histogram_data, output_base_folder, data_type="category"
             filename = f"histogram_{key}.csv"
 
         output_path = os.path.join(output_base_folder, filename)
-        df.to_csv(output_path, index=False)
+        write_csv(df, output_path, index=False)
+        record_output(output_path)
         print(f"  - Histogram data for '{key}' saved to {output_path}")
 
 
+def load_histogram_data(output_base_folder, data_type="category"):
+    """
+    Loads histogram data saved by `save_histogram_data`.
+
+    Category names are read back from the file names, with underscores in
+    place of the spaces they may have contained.
+
+    Parameters:
+    output_base_folder (str): Folder containing the CSV files.
+    data_type (str): Type of data ('category' or 'run') the files were saved as.
+
+    Returns:
+    dict: Category or run_id -> histogram DataFrame, in file name order.
+    """
+    prefix = "histogram_run_" if data_type == "run" else "histogram_"
+    histogram_data = {}
+    for filename in sorted(os.listdir(output_base_folder)):
+        if not filename.startswith(prefix) or not filename.endswith(".csv"):
+            continue
+        if data_type != "run" and filename.startswith("histogram_run_"):
+            continue
+        key = filename[len(prefix) : -len(".csv")]
+        histogram_data[key] = pd.read_csv(os.path.join(output_base_folder, filename))
+    return histogram_data
+
+
 if __name__ == "__main__":
     # Constants
     DATA_SOURCE_FOLDER = os.path.join(
@@ -1,7 +1,13 @@
 import os
 import numpy as np
 import pandas as pd
-from scipy.stats import gaussian_kde
+
+from .instrumentation import add_rows, iter_stages, record_output
+from .output_writer import write_csv
+from .precision import density_grid, gaussian_density
+from .result_cube import as_frame
+from .run_catalog import run_catalog, sanitize_label
+from .tracing import span
 
 
 def load_data(source):
@@ -46,120 +52,161 @@ def compute_density(values, x_grid):
     Returns:
     np.ndarray: Density values corresponding to x_grid.
     """
-    kde = gaussian_kde(values)
-    return kde.evaluate(x_grid)
+    return gaussian_density(values, x_grid)
 
 
-def extract_density_individual_distributions(
-    data_df, params_df, value_type, category_column, output_base_folder, num_points=500
+def compute_individual_densities(
+    data_df, value_type, category_column, num_points=500
 ):
     """
-    Extracts density data for each technology and run_id and saves them as Excel files.
+    Computes the density of each run for each technology.
 
     Parameters:
     data_df (pd.DataFrame): The dataframe containing the data.
-    params_df (pd.DataFrame): The dataframe with run parameters.
     value_type (str): The type of value to compute density for.
     category_column (str): The category column (e.g., 'technology').
-    output_base_folder (str): The base directory to save density data.
     num_points (int): Number of points in the x_grid for density computation.
+
+    Returns:
+    dict: Technology -> {run_id: DataFrame with 'x' and 'density' columns}.
+    Runs with a single value or zero spread get a one-row DataFrame with the
+    mean value in 'x' and a NaN density, drawn as a vertical line.
     """
-    # Create the base folder for individual distributions
-    individual_folder = os.path.join(
-        output_base_folder, "individual_distributions_data"
-    )
-    os.makedirs(individual_folder, exist_ok=True)
+    data_df = as_frame(data_df)
+    density_data = {}
 
     # Get unique technologies
     technologies = data_df[category_column].unique()
     print(f"Found {len(technologies)} technologies.")
 
-    for tech in technologies:
+    for tech in iter_stages(technologies, category_column):
         print(f"\nProcessing Technology: {tech}")
-        tech_folder = os.path.join(individual_folder, tech)
-        os.makedirs(tech_folder, exist_ok=True)
-
         tech_data = data_df[data_df[category_column] == tech]
-        unique_run_ids = tech_data["run_id"].unique()
-        print(f"  Found {len(unique_run_ids)} runs for Technology '{tech}'.")
+        add_rows(len(tech_data))
+        run_groups = tech_data.groupby("run_id", sort=False)
+        print(f"  Found {run_groups.ngroups} runs for Technology '{tech}'.")
 
-        for run_id in unique_run_ids:
-            run_data = tech_data[tech_data["run_id"] == run_id]
-            if run_data.empty:
+        density_data[tech] = {}
+        for run_id, run_data in run_groups:
+            values = run_data[value_type].dropna().values
+            if len(values) == 0:
                 print(f"    - No data for Run ID: {run_id}. Skipping.")
                 continue
 
-            values = run_data[value_type].dropna().values
-            if len(values) < 2:
+            density_df = None
+            if len(values) >= 2:
+                # Define x_grid based on the data range with 10% margin
+                x_min, x_max = values.min(), values.max()
+                margin = (x_max - x_min) * 0.1
+                x_grid = density_grid(x_min - margin, x_max + margin, num_points)
+                try:
+                    with span("kde", technology=tech, run_id=run_id, rows=len(values)):
+                        density = compute_density(values, x_grid)
+                    density_df = pd.DataFrame({"x": x_grid, "density": density})
+                except (np.linalg.LinAlgError, ValueError) as e:
+                    print(f"    - Error computing density for Run ID: {run_id}: {e}")
+            else:
                 print(
                     f"    - Insufficient data for Run ID: {run_id}. Skipping density computation."
                 )
-                continue
+            if density_df is None:
+                density_df = pd.DataFrame({"x": [values.mean()], "density": [np.nan]})
+            density_data[tech][run_id] = density_df
 
-            # Define x_grid based on the data range with 10% margin
-            x_min, x_max = values.min(), values.max()
-            margin = (x_max - x_min) * 0.1
-            x_grid = np.linspace(x_min - margin, x_max + margin, num_points)
+    return density_data
+
+
+def extract_density_individual_distributions(
+    data_df, params_df, value_type, category_column, output_base_folder, num_points=500
+):
+    """
+    Extracts density data for each technology and run_id and saves them as Excel files.
+
+    Parameters:
+    data_df (pd.DataFrame): The dataframe containing the data.
+    params_df (pd.DataFrame): The dataframe with run parameters.
+    value_type (str): The type of value to compute density for.
+    category_column (str): The category column (e.g., 'technology').
+    output_base_folder (str): The base directory to save density data.
+    num_points (int): Number of points in the x_grid for density computation.
 
-            # Compute density
-            density = compute_density(values, x_grid)
+    Returns:
+    dict: The densities, as returned by `compute_individual_densities`.
+    """
+    # Create the base folder for individual distributions
+    individual_folder = os.path.join(
+        output_base_folder, "individual_distributions_data"
+    )
+    os.makedirs(individual_folder, exist_ok=True)
+
+    catalog = run_catalog(params_df)
+    density_data = compute_individual_densities(
+        data_df, value_type, category_column, num_points
+    )
+
+    for tech, run_densities in density_data.items():
+        tech_folder = os.path.join(individual_folder, tech)
+        os.makedirs(tech_folder, exist_ok=True)
 
-            # Construct descriptive label
-            run_params = params_df[params_df["run_id"] == run_id]
-            if run_params.empty:
-                label = f"Run_{run_id}"
+        for run_id, density_df in run_densities.items():
+            if density_df["density"].isna().all():
+                continue
+
+            # Descriptive label and file stem from the run catalog
+            run = catalog.get(run_id)
+            if run is None:
+                sanitized_label = sanitize_label(catalog.label(run_id))
                 print(
-                    f"    - No parameters found for Run ID: {run_id}. Using default label '{label}'."
+                    f"    - No parameters found for Run ID: {run_id}. Using default label '{catalog.label(run_id)}'."
                 )
             else:
-                run_params = run_params.iloc[0]
-                label = f"{run_params['target_scenario']} ({run_params['shock_year']}, {run_params['scenario_geography']})"
-
-            # Create DataFrame for density data
-            density_df = pd.DataFrame({"x": x_grid, "density": density})
+                sanitized_label = run.stem
 
             # Define output file path
-            sanitized_label = (
-                label.replace(" ", "_")
-                .replace("(", "")
-                .replace(")", "")
-                .replace(",", "_")
-            )
             output_file = os.path.join(
                 tech_folder, f"density_run_{run_id}_{sanitized_label}.csv"
             )
 
             # Save to Excel
-            density_df.to_csv(output_file, index=False)
+            write_csv(density_df, output_file, index=False)
+            record_output(output_file)
             print(f"    - Density data saved to {output_file}")
 
+    return density_data
 
-def extract_comparison_density(
-    data_df, params_df, value_type, category_column, output_base_folder, num_points=500
+
+def compute_comparison_densities(
+    data_df, params_df, value_type, category_column, num_points=500
 ):
     """
-    Extracts density data for comparisons between shock years and saves them as Excel files.
+    Computes, for each target scenario and technology, the densities of the
+    first two shock years of the scenario on a common grid.
 
     Parameters:
     data_df (pd.DataFrame): The dataframe containing the data.
     params_df (pd.DataFrame): The dataframe with run parameters.
     value_type (str): The type of value to compute density for.
     category_column (str): The category column (e.g., 'technology').
-    output_base_folder (str): The base directory to save comparison density data.
     num_points (int): Number of points in the x_grid for density computation.
+
+    Returns:
+    dict: (target_scenario, technology) -> DataFrame with columns
+    ['x', 'density_<shock_year_1>', 'density_<shock_year_2>']. A shock year
+    with fewer than two values has a NaN density.
     """
-    comparison_folder = os.path.join(output_base_folder, "comparison_shock_years_data")
-    os.makedirs(comparison_folder, exist_ok=True)
+    data_df = as_frame(data_df)
+    density_data = {}
 
     # Get all unique target scenarios
-    target_scenarios = params_df["target_scenario"].unique()
+    catalog = run_catalog(params_df)
+    target_scenarios = catalog.unique("target_scenario")
     technologies = data_df[category_column].unique()
     print(f"Found {len(target_scenarios)} target scenarios.")
 
-    for target_scenario in target_scenarios:
+    for target_scenario in iter_stages(target_scenarios, "target_scenario"):
         print(f"\nProcessing Target Scenario: {target_scenario}")
-        scenario_runs = params_df[params_df["target_scenario"] == target_scenario]
-        shock_years = scenario_runs["shock_year"].unique()
+        scenario_runs = catalog.select(target_scenario=target_scenario)
+        shock_years = pd.unique(np.array([run.shock_year for run in scenario_runs]))
 
         if len(shock_years) < 2:
             print(
@@ -169,60 +216,113 @@ def extract_comparison_density(
 
         # Select first two shock years for comparison
         shock_year_1, shock_year_2 = shock_years[:2]
-        run_ids_1 = scenario_runs[scenario_runs["shock_year"] == shock_year_1][
-            "run_id"
-        ].values
-        run_ids_2 = scenario_runs[scenario_runs["shock_year"] == shock_year_2][
-            "run_id"
-        ].values
+        run_ids_1 = catalog.run_ids_where(
+            target_scenario=target_scenario, shock_year=shock_year_1
+        )
+        run_ids_2 = catalog.run_ids_where(
+            target_scenario=target_scenario, shock_year=shock_year_2
+        )
         print(f"  - Comparing Shock Years: {shock_year_1} vs {shock_year_2}")
 
         for tech in technologies:
             print(f"  Processing Technology: {tech}")
-            data_tech = data_df[data_df[category_column] == tech]
-
-            # Aggregate data for shock_year_1
-            data_1 = data_tech[data_tech["run_id"].isin(run_ids_1)]
-            values_1 = data_1[value_type].dropna().values
-
-            # Aggregate data for shock_year_2
-            data_2 = data_tech[data_tech["run_id"].isin(run_ids_2)]
-            values_2 = data_2[value_type].dropna().values
+            with span("slice", target_scenario=target_scenario, technology=tech):
+                data_tech = data_df[data_df[category_column] == tech]
+
+                # Aggregate data for each shock year
+                values_by_year = {
+                    shock_year_1: data_tech.loc[
+                        data_tech["run_id"].isin(run_ids_1), value_type
+                    ]
+                    .dropna()
+                    .values,
+                    shock_year_2: data_tech.loc[
+                        data_tech["run_id"].isin(run_ids_2), value_type
+                    ]
+                    .dropna()
+                    .values,
+                }
 
-            if len(values_1) < 2 or len(values_2) < 2:
+            if all(len(values) < 2 for values in values_by_year.values()):
                 print(
-                    f"    - Insufficient data for Technology '{tech}' in one of the shock years. Skipping."
+                    f"    - Insufficient data for Technology '{tech}' in both shock years. Skipping."
                 )
                 continue
 
             # Define common x_grid based on combined data
-            combined_values = np.concatenate([values_1, values_2])
+            combined_values = np.concatenate(list(values_by_year.values()))
             x_min, x_max = combined_values.min(), combined_values.max()
             margin = (x_max - x_min) * 0.1
-            x_grid = np.linspace(x_min - margin, x_max + margin, num_points)
+            x_grid = density_grid(x_min - margin, x_max + margin, num_points)
 
             # Compute densities
-            density_1 = compute_density(values_1, x_grid)
-            density_2 = compute_density(values_2, x_grid)
-
-            # Create DataFrame for comparison
-            comparison_df = pd.DataFrame(
-                {
-                    "x": x_grid,
-                    f"density_{shock_year_1}": density_1,
-                    f"density_{shock_year_2}": density_2,
-                }
-            )
+            comparison_df = pd.DataFrame({"x": x_grid})
+            for shock_year, values in values_by_year.items():
+                density = np.full(len(x_grid), np.nan)
+                if len(values) >= 2:
+                    try:
+                        with span(
+                            "kde",
+                            target_scenario=target_scenario,
+                            technology=tech,
+                            shock_year=shock_year,
+                            rows=len(values),
+                        ):
+                            density = compute_density(values, x_grid)
+                    except (np.linalg.LinAlgError, ValueError) as e:
+                        print(f"    - Error computing density for {shock_year}: {e}")
+                comparison_df[f"density_{shock_year}"] = density
+            density_data[(target_scenario, tech)] = comparison_df
+
+    return density_data
 
-            # Define output file path
-            output_file = os.path.join(
-                comparison_folder,
-                f"comparison_{target_scenario}_{tech}_shock_years_{shock_year_1}_vs_{shock_year_2}.csv",
+
+def extract_comparison_density(
+    data_df, params_df, value_type, category_column, output_base_folder, num_points=500
+):
+    """
+    Extracts density data for comparisons between shock years and saves them as Excel files.
+
+    Parameters:
+    data_df (pd.DataFrame): The dataframe containing the data.
+    params_df (pd.DataFrame): The dataframe with run parameters.
+    value_type (str): The type of value to compute density for.
+    category_column (str): The category column (e.g., 'technology').
+    output_base_folder (str): The base directory to save comparison density data.
+    num_points (int): Number of points in the x_grid for density computation.
+
+    Returns:
+    dict: The densities, as returned by `compute_comparison_densities`.
+    """
+    comparison_folder = os.path.join(output_base_folder, "comparison_shock_years_data")
+    os.makedirs(comparison_folder, exist_ok=True)
+
+    density_data = compute_comparison_densities(
+        data_df, params_df, value_type, category_column, num_points
+    )
+
+    for (target_scenario, tech), comparison_df in density_data.items():
+        density_columns = comparison_df.columns[1:]
+        if comparison_df[density_columns].isna().all().any():
+            print(
+                f"    - Insufficient data for Technology '{tech}' in one of the shock years. Skipping."
             )
+            continue
+        shock_year_1, shock_year_2 = [c[len("density_") :] for c in density_columns]
 
-            # Save to Excel
-            comparison_df.to_csv(output_file, index=False)
-            print(f"    - Comparison density data saved to {output_file}")
+        # Define output file path
+        output_file = os.path.join(
+            comparison_folder,
+            f"comparison_{target_scenario}_{tech}_shock_years_{shock_year_1}_vs_{shock_year_2}.csv",
+        )
+
+        # Save to Excel
+        with span("write_csv", path=output_file):
+            write_csv(comparison_df, output_file, index=False)
+        record_output(output_file)
+        print(f"    - Comparison density data saved to {output_file}")
+
+    return density_data
 
 
 def plot_individual_distributions_by_technology(
@@ -0,0 +1,145 @@
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+
+from .output_writer import after_writes
+
+
+_SKIP_UNCHANGED = True
+
+
+def set_skip_unchanged(enabled):
+    """
+    Enables or disables skipping figures whose inputs did not change.
+
+    When disabled every figure is rendered again, and the manifests are still
+    updated so that the next incremental run starts from a correct state.
+
+    Parameters:
+    enabled (bool): Whether unchanged figures are skipped (default True).
+    """
+    global _SKIP_UNCHANGED
+    _SKIP_UNCHANGED = bool(enabled)
+
+
+def get_skip_unchanged():
+    """Returns whether unchanged figures are skipped."""
+    return _SKIP_UNCHANGED
+
+
+def data_digest(*parts):
+    """
+    Returns a hash of the inputs of one figure.
+
+    Dataframes, series and arrays are hashed by content with
+    `pd.util.hash_pandas_object`, other values by their repr.
+
+    Parameters:
+    parts: The data slice and render parameters of the figure.
+
+    Returns:
+    str: A hexadecimal digest.
+    """
+    digest = hashlib.sha1()
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            part = pd.Series(part)
+        if isinstance(part, (pd.DataFrame, pd.Series)):
+            names = part.columns if isinstance(part, pd.DataFrame) else [part.name]
+            digest.update(repr(list(names)).encode())
+            digest.update(
+                pd.util.hash_pandas_object(part, index=False).to_numpy().tobytes()
+            )
+        else:
+            digest.update(repr(part).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class FigureManifest:
+    """
+    Records the input hash of every figure written by one plotting function.
+
+    The manifest is a JSON file in the output folder mapping each image path
+    (relative to the folder) to the hash of the data and parameters it was
+    drawn from. Images whose hash is unchanged are skipped. On close, images
+    recorded by a previous run but not produced by this one (their run or
+    category vanished) are removed, then the manifest is rewritten.
+
+    If a plotting function fails before `close`, the previous manifest is left
+    untouched and nothing is removed. With background writes, `close` waits
+    for the images to be written: an image whose write failed is dropped from
+    the manifest (and its previous version removed), so that the next run
+    draws it again.
+    """
+
+    def __init__(self, folder, name="figures"):
+        """
+        Parameters:
+        folder (str): The folder containing the images.
+        name (str): Manifest name, for plotting functions sharing a folder.
+        """
+        self.folder = folder
+        self.path = os.path.join(folder, f".{name}.manifest.json")
+        self.previous = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    self.previous = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable figure manifest {self.path}: {e}")
+        self.entries = {}
+
+    def _key(self, path):
+        return os.path.relpath(path, self.folder)
+
+    def is_current(self, paths, digest):
+        """
+        Tells whether the images were already drawn from the same inputs.
+
+        Current images are kept in the manifest without being rendered again.
+
+        Parameters:
+        paths (str or list): The image path(s) of one figure job.
+        digest (str): The hash returned by `data_digest`.
+
+        Returns:
+        bool: True if every image exists with the same hash.
+        """
+        if isinstance(paths, str):
+            paths = [paths]
+        keys = [self._key(path) for path in paths]
+        current = _SKIP_UNCHANGED and all(
+            self.previous.get(key) == digest and os.path.exists(path)
+            for key, path in zip(keys, paths)
+        )
+        if current:
+            for key in keys:
+                self.entries[key] = digest
+        return current
+
+    def record(self, path, digest):
+        """Records an image written from inputs with the given hash."""
+        self.entries[self._key(path)] = digest
+
+    def close(self):
+        """
+        Removes the stale images and writes the manifest, once the queued
+        images are written.
+        """
+        after_writes(self._close)
+
+    def _close(self, failed_paths):
+        for path in failed_paths:
+            self.entries.pop(self._key(path), None)
+        for key in self.previous.keys() - self.entries.keys():
+            stale_path = os.path.join(self.folder, key)
+            if os.path.exists(stale_path):
+                os.remove(stale_path)
+                print(f"Removed stale figure {stale_path}")
+        os.makedirs(self.folder, exist_ok=True)
+        with open(self.path, "w") as f:
+            json.dump(self.entries, f, indent=0, sort_keys=True)
+
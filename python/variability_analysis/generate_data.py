@@ -1,48 +1,426 @@
 import os
-from rpy2 import robjects
-from rpy2.robjects import r, pandas2ri
-from rpy2.robjects.packages import importr
-from rpy2.robjects.vectors import StrVector, ListVector
+import json
+import time
+import shutil
+import hashlib
+import pandas as pd
 
-# Enable the conversion between Pandas DataFrame and R DataFrame
-pandas2ri.activate()
 
+# TRISK input tables read by `run_analysis` in country_specific_analysis.R
+TRISK_INPUT_FILES = [
+    "assets.csv",
+    "scenarios.csv",
+    "financial_features.csv",
+    "ngfs_carbon_price.csv",
+]
 
-def run_r_analysis(input_path, project_output_path, run_params, country_iso2, sector):
+# Input tables sliced for one country, sector and set of scenarios, saved as
+# uncompressed RDS files by `slice_trisk_inputs`
+SLICED_INPUT_FILES = [
+    "assets.rds",
+    "scenarios.rds",
+    "financial_features.rds",
+    "ngfs_carbon_price.rds",
+]
+
+# Sliced inputs, relative to the output folder of the sweep by default
+SLICED_INPUT_FOLDER = "sliced_inputs"
+
+# Tables written by `run_analysis`, for each run and once merged
+SWEEP_OUTPUT_FILES = ["npvs.csv", "pds.csv", "params.csv", "trajectories.csv"]
+
+# Checkpoints of a sweep, relative to its output folder
+CHECKPOINT_FOLDER = "checkpoints"
+LEDGER_FILE = os.path.join(CHECKPOINT_FOLDER, "sweep_ledger.json")
+
+
+def _input_stats(input_path, filenames=TRISK_INPUT_FILES):
+    """Returns the name, size and modification time of the TRISK input tables."""
+    stats = []
+    for filename in filenames:
+        path = os.path.join(input_path, filename)
+        if os.path.exists(path):
+            stat = os.stat(path)
+            stats.append([filename, stat.st_size, stat.st_mtime_ns])
+    return stats
+
+
+def sweep_fingerprint(input_path, run_params, country_iso2, sector):
+    """
+    Returns a hash of the inputs of a sweep: the size and modification time of
+    the TRISK input tables, the run parameters, the country and the sector.
+
+    Returns:
+    str: A hexadecimal digest.
+    """
+    description = {
+        "inputs": _input_stats(input_path),
+        "run_params": run_params,
+        "country_iso2": country_iso2,
+        "sector": sector,
+    }
+    return hashlib.sha1(
+        json.dumps(description, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def slice_spec(run_params, country_iso2, sector):
+    """
+    Returns what the analysis of a set of runs uses from the TRISK inputs:
+    the country, the sector, and the scenarios and geographies of the runs.
+    """
+    return {
+        "country_iso2": country_iso2,
+        "sector": sector,
+        "scenarios": sorted(
+            {params["baseline_scenario"] for params in run_params}
+            | {params["target_scenario"] for params in run_params}
+        ),
+        "scenario_geographies": sorted(
+            {params["scenario_geography"] for params in run_params}
+        ),
+    }
+
+
+def _read_ledger(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable sweep ledger {path}: {e}")
+        return None
+
+
+def _write_ledger(path, ledger):
+    # Write then rename, so that a crash never leaves a truncated ledger
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(ledger, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def _run_complete(project_output_path, run):
+    folder = os.path.join(project_output_path, CHECKPOINT_FOLDER, run["folder"])
+    return run["status"] == "complete" and all(
+        os.path.exists(os.path.join(folder, filename))
+        for filename in SWEEP_OUTPUT_FILES
+    )
+
+
+class RSession:
+    """
+    Long-lived R session running TRISK analyses.
+
+    The R script and its packages are loaded once, when the session is
+    created, and the input tables of each input folder are read once and kept
+    in the R session until their files change, so that repeated analyses (one
+    per run, country or sector) only pay for the computation. The time spent
+    in setup, input loading and computation is accumulated in `timings`.
+    """
+
+    def __init__(self):
+        start = time.perf_counter()
+        # rpy2 starts an embedded R when imported, so only sessions import it
+        from rpy2 import robjects
+        from rpy2.robjects import pandas2ri
+
+        # Enable the conversion between Pandas DataFrame and R DataFrame
+        pandas2ri.activate()
+        self._r = robjects.r
+        # Get the current directory of this Python script
+        current_directory = os.path.dirname(os.path.abspath(__file__))
+        # Import the R script, and the packages it loads, using the full path
+        self._r.source(os.path.join(current_directory, "country_specific_analysis.R"))
+        self._load_inputs_r = self._r["load_trisk_inputs"]
+        self._load_sliced_inputs_r = self._r["load_sliced_inputs"]
+        self._slice_inputs_r = self._r["slice_trisk_inputs"]
+        self._run_analysis_r = self._r["run_analysis_on_inputs"]
+        # Input folder -> (file stats, R list of input tables)
+        self._inputs = {}
+        self.timings = {
+            "setup_s": time.perf_counter() - start,
+            "slice_s": 0.0,
+            "load_s": 0.0,
+            "compute_s": 0.0,
+            "slices": 0,
+            "loads": 0,
+            "analyses": 0,
+        }
+
+    def sliced_inputs(self, input_path, run_params, country_iso2, sector, cache_folder):
+        """
+        Returns the folder of the TRISK inputs sliced for the analysis of some
+        runs (see `slice_spec`), slicing them first if the folder is missing
+        or the source tables changed since it was written.
+
+        Sliced inputs are kept in `<cache_folder>/<country>_<sector>_<hash>`
+        with a source.json recording the slice and the source tables it was
+        made from. The input folder itself is never written to, as it is
+        often shared or read-only.
+
+        Parameters:
+        input_path (str): Path to the input directory for trisk analysis.
+        run_params (list of dicts): List of run parameters.
+        country_iso2 (str): Country ISO code.
+        sector (str): Sector to analyze.
+        cache_folder (str): Folder of the sliced inputs.
+        """
+        spec = slice_spec(run_params, country_iso2, sector)
+        spec_hash = hashlib.sha1(json.dumps(spec, sort_keys=True).encode())
+        cache_path = os.path.join(
+            cache_folder,
+            f"{country_iso2}_{sector}_{spec_hash.hexdigest()[:10]}".replace(" ", "_"),
+        )
+        source = {"slice": spec, "source_inputs": _input_stats(input_path)}
+        source_file = os.path.join(cache_path, "source.json")
+        if os.path.exists(source_file) and all(
+            os.path.exists(os.path.join(cache_path, filename))
+            for filename in SLICED_INPUT_FILES
+        ):
+            with open(source_file) as f:
+                if json.load(f) == source:
+                    return cache_path
+
+        from rpy2.robjects.vectors import StrVector
+
+        print(f"Slicing TRISK inputs into {cache_path}")
+        start = time.perf_counter()
+        self._slice_inputs_r(
+            input_path,
+            cache_path,
+            country_iso2,
+            sector,
+            StrVector(spec["scenarios"]),
+            StrVector(spec["scenario_geographies"]),
+        )
+        self.timings["slice_s"] += time.perf_counter() - start
+        self.timings["slices"] += 1
+        # Written last, so that an interrupted slice is redone
+        with open(source_file, "w") as f:
+            json.dump(source, f, indent=2)
+        return cache_path
+
+    def load_inputs(self, input_path):
+        """
+        Returns the TRISK input tables of a folder as an R list, reading them
+        only if they are not resident or their files changed. Folders of
+        sliced inputs (see `sliced_inputs`) are read from their RDS files.
+
+        Parameters:
+        input_path (str): Path to the input directory for trisk analysis.
+        """
+        key = os.path.abspath(input_path)
+        sliced = os.path.exists(os.path.join(input_path, SLICED_INPUT_FILES[0]))
+        if sliced:
+            stats = _input_stats(input_path, SLICED_INPUT_FILES)
+        else:
+            stats = _input_stats(input_path)
+        cached = self._inputs.get(key)
+        if cached is not None and cached[0] == stats:
+            return cached[1]
+        start = time.perf_counter()
+        if sliced:
+            inputs = self._load_sliced_inputs_r(input_path)
+        else:
+            inputs = self._load_inputs_r(input_path)
+        self.timings["load_s"] += time.perf_counter() - start
+        self.timings["loads"] += 1
+        self._inputs[key] = (stats, inputs)
+        return inputs
+
+    def run_analysis(
+        self, input_path, project_output_path, run_params, country_iso2, sector
+    ):
+        """
+        Runs the TRISK sensitivity analysis of the given runs and writes its
+        npvs.csv, pds.csv, params.csv and trajectories.csv.
+
+        Parameters:
+        input_path (str): Path to the input directory for trisk analysis.
+        project_output_path (str): Path where output files will be saved.
+        run_params (list of dicts): List of run parameters.
+        country_iso2 (str): Country ISO code.
+        sector (str): Sector to analyze.
+        """
+        from rpy2.robjects.vectors import ListVector
+
+        inputs = self.load_inputs(input_path)
+        # Convert each dictionary in the list to an R ListVector
+        run_params_r = ListVector(
+            {str(i): ListVector(params) for i, params in enumerate(run_params)}
+        )
+        start = time.perf_counter()
+        try:
+            self._run_analysis_r(
+                inputs,
+                project_output_path=project_output_path,
+                run_params=run_params_r,
+                country_iso2=country_iso2,
+                sector=sector,
+            )
+        finally:
+            self.timings["compute_s"] += time.perf_counter() - start
+            self.timings["analyses"] += 1
+
+    def timing_report(self):
+        """Prints and returns the setup, loading and computation times."""
+        timings = self.timings
+        print(
+            f"R session: setup {timings['setup_s']:.1f}s, "
+            f"{timings['slices']} input slices {timings['slice_s']:.1f}s, "
+            f"{timings['loads']} input loads {timings['load_s']:.1f}s, "
+            f"{timings['analyses']} analyses {timings['compute_s']:.1f}s"
+        )
+        return dict(timings)
+
+    def release_inputs(self):
+        """Frees the resident input tables."""
+        self._inputs.clear()
+        self._r("gc()")
+
+
+def assemble_checkpoints(project_output_path):
+    """
+    Merges the per-run checkpoints of a sweep into npvs.csv, pds.csv,
+    params.csv and trajectories.csv in the output folder.
+
+    Parameters:
+    project_output_path (str): The output folder of the sweep.
+
+    Returns:
+    dict: Number of rows written to each file.
+    """
+    ledger = _read_ledger(os.path.join(project_output_path, LEDGER_FILE))
+    if ledger is None:
+        raise FileNotFoundError(f"No sweep ledger in {project_output_path}")
+    incomplete = [
+        run["folder"]
+        for run in ledger["runs"]
+        if not _run_complete(project_output_path, run)
+    ]
+    if incomplete:
+        raise RuntimeError(f"Incomplete runs: {', '.join(incomplete)}")
+
+    written = {}
+    for filename in SWEEP_OUTPUT_FILES:
+        merged_df = pd.concat(
+            [
+                pd.read_csv(
+                    os.path.join(
+                        project_output_path, CHECKPOINT_FOLDER, run["folder"], filename
+                    )
+                )
+                for run in ledger["runs"]
+            ],
+            ignore_index=True,
+        )
+        output_file = os.path.join(project_output_path, filename)
+        merged_df.to_csv(output_file, index=False)
+        written[filename] = len(merged_df)
+        print(f"Assembled {len(merged_df)} rows into {output_file}")
+    return written
+
+
+def run_r_analysis(
+    input_path,
+    project_output_path,
+    run_params,
+    country_iso2,
+    sector,
+    resume=True,
+    session=None,
+    slice_inputs=True,
+    slice_cache_path=None,
+):
     """
     Runs the R analysis by calling the R function from the provided script.
 
+    Each run is analysed on its own and its npv, pd, params and trajectory
+    tables are checkpointed in `checkpoints/run_<index>` as soon as it
+    completes, with its status in `checkpoints/sweep_ledger.json`. When the
+    sweep is invoked again with the same inputs (see `sweep_fingerprint`),
+    completed runs are skipped and the sweep resumes from the first
+    incomplete one. Once every run is complete, the merged tables are
+    assembled from the checkpoints (see `assemble_checkpoints`).
+
     Parameters:
     - input_path (str): Path to the input directory for trisk analysis.
     - project_output_path (str): Path where output files will be saved.
     - run_params (list of dicts): List of run parameters.
     - country (str): Country ISO code.
     - sector (str): Sector to analyze.
+    - resume (bool): Whether to keep the checkpoints of a previous sweep with
+      the same inputs; when False, every run is analysed again.
+    - session (RSession): A warm R session to run the analyses in, for
+      repeated sweeps; a new session is started when None. Either way the
+      input tables are read once for all the runs of the sweep.
+    - slice_inputs (bool): Whether to analyse the runs on inputs pre-sliced
+      for the country, sector and scenarios of the sweep (see
+      `RSession.sliced_inputs`), instead of the full input tables.
+    - slice_cache_path (str): Folder of the sliced inputs, by default
+      `<project_output_path>/sliced_inputs`.
     """
+    ledger_path = os.path.join(project_output_path, LEDGER_FILE)
+    fingerprint = sweep_fingerprint(input_path, run_params, country_iso2, sector)
+    ledger = _read_ledger(ledger_path) if resume else None
+    if ledger is None or ledger.get("fingerprint") != fingerprint:
+        if ledger is not None:
+            print("Sweep inputs changed, discarding the previous checkpoints.")
+        shutil.rmtree(
+            os.path.join(project_output_path, CHECKPOINT_FOLDER), ignore_errors=True
+        )
+        ledger = {
+            "fingerprint": fingerprint,
+            "runs": [
+                {"folder": f"run_{i:03d}", "params": params, "status": "pending"}
+                for i, params in enumerate(run_params)
+            ],
+        }
+        _write_ledger(ledger_path, ledger)
 
-    # Get the current directory of this Python script
-    current_directory = os.path.dirname(os.path.abspath(__file__))
-    # Construct the full path to the R script
-    r_script_path = os.path.join(current_directory, "country_specific_analysis.R")
-    # Import the R script using the full path
-    r.source(r_script_path)
-
-    # Convert each dictionary in the list to an R ListVector
-    run_params_r = ListVector(
-        {str(i): ListVector(params) for i, params in enumerate(run_params)}
+    pending_runs = [
+        run for run in ledger["runs"] if not _run_complete(project_output_path, run)
+    ]
+    print(
+        f"{len(ledger['runs']) - len(pending_runs)} of {len(ledger['runs'])} runs "
+        f"already complete."
     )
 
-    # Define the R function to run
-    run_analysis_r = robjects.r["run_analysis"]
+    if pending_runs and session is None:
+        session = RSession()
+    analysis_input_path = input_path
+    if pending_runs and slice_inputs:
+        analysis_input_path = session.sliced_inputs(
+            input_path,
+            run_params,
+            country_iso2,
+            sector,
+            slice_cache_path or os.path.join(project_output_path, SLICED_INPUT_FOLDER),
+        )
 
-    # Call the R function with parameters
-    run_analysis_r(
-        input_path=input_path,
-        project_output_path=project_output_path,
-        run_params=run_params_r,
-        country_iso2=country_iso2,
-        sector=sector,
-    )
+    for run in pending_runs:
+        print(f"Running {run['folder']}: {run['params']}")
+        run_folder = os.path.join(project_output_path, CHECKPOINT_FOLDER, run["folder"])
+        try:
+            # Analyse this run only
+            session.run_analysis(
+                analysis_input_path, run_folder, [run["params"]], country_iso2, sector
+            )
+        except Exception as e:
+            run["status"] = "failed"
+            run["error"] = str(e)
+            _write_ledger(ledger_path, ledger)
+            raise
+        run["status"] = "complete"
+        run["completed_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        run.pop("error", None)
+        _write_ledger(ledger_path, ledger)
+
+    if pending_runs:
+        session.timing_report()
+    assemble_checkpoints(project_output_path)
 
 
 if __name__ == "__main__":
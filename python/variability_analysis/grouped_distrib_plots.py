@@ -1,9 +1,14 @@
 import os
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.ticker import FuncFormatter
 import pandas as pd
-from scipy import stats
+
+from .figure_manifest import FigureManifest, data_digest
+from .instrumentation import iter_stages
+from .pd_terms import DEFAULT_PD_TERM, needs_term_selection, pd_term_set
+from .precision import density_grid, gaussian_density
+from .rendering import figure_template
+from .result_cube import as_frame
+from .run_catalog import COLORS, run_catalog
 
 
 # Function to load and return the dataset
@@ -39,14 +44,42 @@ def load_data(source):
 
 
 def plot_grouped_distributions(
-    data_df, params_df, plots_folder, value_type, category_column
+    data_df,
+    params_df,
+    plots_folder,
+    value_type,
+    category_column,
+    profile=None,
+    term=None,
 ):
     """
     Trace des distributions groupées pour chaque scénario cible, avec une ligne pour chaque catégorie.
     La couleur de la ligne est déterminée par la catégorie (technologie ou secteur).
     Le type de ligne est déterminée par l'année de choc.
     Utilise une échelle linéaire pour les axes x et y, avec chaque distribution normalisée à un maximum de 1.
+    `profile` désigne un profil de rendu de `rendering.RENDER_PROFILES`
+    (None pour le profil par défaut).
+    Pour des PD de plusieurs termes (un PDTermSet), `term` choisit le terme
+    (DEFAULT_PD_TERM par défaut) ou une liste de termes ; les graphiques d'un
+    terme choisi sont placés dans un sous-dossier `term_<terme>`.
     """
+    if needs_term_selection(data_df, term):
+        terms = pd_term_set(data_df)
+        selected = [DEFAULT_PD_TERM] if term is None else np.atleast_1d(term)
+        for single_term in selected:
+            term_folder = plots_folder
+            if term is not None:
+                term_folder = os.path.join(plots_folder, f"term_{single_term}")
+            plot_grouped_distributions(
+                terms.view(single_term),
+                params_df,
+                term_folder,
+                value_type,
+                category_column,
+                profile=profile,
+            )
+        return
+    data_df = as_frame(data_df)
     plots_folder = os.path.join(plots_folder, f"{value_type}_grouped_by_scenario")
     os.makedirs(plots_folder, exist_ok=True)
 
@@ -54,58 +87,57 @@ def plot_grouped_distributions(
         f"Création de graphiques de distribution groupés pour {value_type} basés sur les scénarios dans {plots_folder}"
     )
 
-    plt.style.use("default")
-
-    colors = [
-        "blue",
-        "orange",
-        "red",
-        "magenta",
-        "gray",
-        "cyan",
-        "#8B4513",
-        "#006400",
-        "#4B0082",
-        "#FF1493",
-        "#00CED1",
-        "#FF4500",
-        "#2F4F4F",
-        "#9ACD32",
-        "#FF69B4",
-    ]
+    template = figure_template("grouped", profile)
 
     # Sort categories and create a color dictionary
     categories = sorted(data_df[category_column].unique())
-    color_dict = dict(zip(categories, colors[: len(categories)]))
+    color_dict = dict(zip(categories, COLORS[: len(categories)]))
 
     line_styles = ["-", "--", ":", "-."]
 
-    target_scenarios = params_df["target_scenario"].unique()
-    shock_years = params_df["shock_year"].unique()
-
-    for target_scenario in target_scenarios:
-        plt.figure(figsize=(12, 8), dpi=250)
-        ax = plt.gca()
+    catalog = run_catalog(params_df)
+    target_scenarios = catalog.unique("target_scenario")
+    shock_years = catalog.unique("shock_year")
 
+    manifest = FigureManifest(plots_folder)
+    for target_scenario in iter_stages(target_scenarios, "target_scenario"):
         scenario_data = data_df[
             data_df["run_id"].isin(
-                params_df[params_df["target_scenario"] == target_scenario]["run_id"]
+                catalog.run_ids_where(target_scenario=target_scenario)
             )
         ]
         print(
             f"\nTraitement du scénario cible: {target_scenario} ({len(scenario_data)} lignes)"
         )
 
+        title = f"Distribution de {value_type} - Scénario {target_scenario}"
+        imgpath = template.output_path(
+            os.path.join(plots_folder, f"{title.replace(' ', '_')}.png")
+        )
+        digest = data_digest(
+            scenario_data[["run_id", category_column, value_type]],
+            catalog.params_df,
+            categories,
+            title,
+            template.signature,
+        )
+        if manifest.is_current(imgpath, digest):
+            print(f"  Inchangé, graphique ignoré pour {target_scenario}")
+            continue
+
+        ax = template.start(
+            f"{value_type.replace('_', ' ').title()}", "Densité normalisée"
+        )
+
         for category in categories:
             for jdx, shock_year in enumerate(shock_years):
                 cat_data = scenario_data[
                     (scenario_data[category_column] == category)
                     & (
                         scenario_data["run_id"].isin(
-                            params_df[
-                                (params_df["target_scenario"] == target_scenario)
-                                & (params_df["shock_year"] == shock_year)
-                            ]["run_id"]
+                            catalog.run_ids_where(
+                                target_scenario=target_scenario, shock_year=shock_year
+                            )
                         )
                     )
                 ]
@@ -118,9 +150,8 @@ def plot_grouped_distributions(
                     try:
                         data = cat_data[value_type].dropna().values
                         if len(data) > 1:
-                            kde = stats.gaussian_kde(data)
-                            x_range = np.linspace(data.min(), data.max(), 500)
-                            density = kde(x_range)
+                            x_range = density_grid(data.min(), data.max(), 500)
+                            density = gaussian_density(data, x_range)
                             # Normalize the density to have a maximum of 1
                             normalized_density = density / np.max(density)
                             ax.plot(
@@ -152,26 +183,14 @@ def plot_grouped_distributions(
         # Set y-axis limits from 0 to 1.1 for a bit of headroom
         ax.set_ylim(0, 1.1)
 
-        title = f"Distribution de {value_type} - Scénario {target_scenario}"
-        plt.title(title, fontsize=18)
-        plt.xlabel(f"{value_type.replace('_', ' ').title()}", fontsize=14)
-        plt.ylabel("Densité normalisée", fontsize=14)
-        plt.legend(
-            fontsize=10,
-            title=f"{category_column.capitalize()} (Année de choc)",
-            bbox_to_anchor=(1.05, 1),
-            loc="upper left",
+        imgpath = template.save(
+            imgpath,
+            title,
+            legend_title=f"{category_column.capitalize()} (Année de choc)",
         )
-
-        # Format x-axis labels as percentages
-        ax.xaxis.set_major_formatter(FuncFormatter(lambda x, _: f"{x:.0%}"))
-
-        plt.tight_layout()
-
-        imgpath = os.path.join(plots_folder, f"{title.replace(' ', '_')}.png")
-        plt.savefig(imgpath, bbox_inches="tight")
-        plt.close()
+        manifest.record(imgpath, digest)
         print(f"  Graphique sauvegardé dans {imgpath}")
+    manifest.close()
 
 
 # Vous devrez ajouter cette fonction à votre flux de travail principal, par exemple :
@@ -1,9 +1,18 @@
 import os
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.ticker import FuncFormatter
 import pandas as pd
 
+from .extract_individual_distributions_data import (
+    compute_comparison_densities,
+    compute_individual_densities,
+)
+from .figure_manifest import FigureManifest, data_digest
+from .instrumentation import iter_stages
+from .rendering import facet_figure, figure_template
+from .result_cube import as_frame
+from .run_catalog import COLORS, run_catalog
+from .tracing import span
+
 
 # Function to load and return the dataset
 def load_data(source):
@@ -35,159 +44,304 @@ def load_data(source):
         return None, None, None
 
 
+def _plot_density_curve(ax, density_df, column, label, color):
+    """
+    Draws one precomputed density curve, or a vertical line at the mean value
+    when the density could not be computed.
+    """
+    if density_df[column].isna().all():
+        ax.axvline(density_df["x"].mean(), color=color, label=label)
+    else:
+        ax.plot(density_df["x"], density_df[column], label=label, color=color)
+
+
 def plot_individual_distributions_by_technology(
-    data_df, params_df, plots_folder, value_type, category_column
+    data_df,
+    params_df,
+    plots_folder,
+    value_type,
+    category_column,
+    profile=None,
+    density_data=None,
+    facet=False,
 ):
     """
     Plots individual distributions for each technology, with each run plotted in its respective subfolder.
+    With `facet`, draws all of them instead as small multiples in a single
+    figure, one row per technology and one column per run.
 
     Args:
-    data_df (pd.DataFrame): The dataframe containing the data.
+    data_df (pd.DataFrame): The dataframe containing the data, unused when
+        density_data is given.
     params_df (pd.DataFrame): The dataframe with run parameters.
     plots_folder (str): The directory where plots will be saved.
     value_type (str): The type of value to plot.
     category_column (str): The category column (e.g., 'technology').
+    profile (str): Rendering profile name, or None for the default profile.
+    density_data (dict): Precomputed densities, as returned by
+        `compute_individual_densities`.
+        Computed from data_df when None.
+    facet (bool): Whether to draw a single small-multiples figure.
     """
+    data_df = as_frame(data_df)
     individual_folder = os.path.join(plots_folder, "individual_distributions")
     os.makedirs(individual_folder, exist_ok=True)
 
-    colors = [
-        "blue",
-        "orange",
-        "red",
-        "magenta",
-        "gray",
-        "cyan",
-        "#8B4513",
-        "#006400",
-        "#4B0082",
-        "#FF1493",
-        "#00CED1",
-        "#FF4500",
-        "#2F4F4F",
-        "#9ACD32",
-        "#FF69B4",
-    ]
+    if density_data is None:
+        density_data = compute_individual_densities(
+            data_df, value_type, category_column
+        )
 
-    technologies = data_df[category_column].unique()
-    for tech in technologies:
+    catalog = run_catalog(params_df)
+    if facet:
+        _plot_individual_distributions_grid(
+            density_data, catalog, individual_folder, value_type, profile
+        )
+        return
+
+    template = figure_template("density", profile)
+    xlabel = f"{value_type.replace('_', ' ').title()}"
+
+    manifest = FigureManifest(individual_folder)
+    for tech, run_densities in iter_stages(density_data.items(), category_column):
         tech_folder = os.path.join(individual_folder, tech)
         os.makedirs(tech_folder, exist_ok=True)
 
-        tech_data = data_df[data_df[category_column] == tech]
-        for run_id in tech_data["run_id"].unique():
-            run_data = tech_data[tech_data["run_id"] == run_id]
-            if run_data.empty:
+        for run_id, density_df in run_densities.items():
+            label = f"Run ID: {run_id}"
+            run = catalog.get(run_id)
+            color = run.color if run is not None else COLORS[0]
+
+            title = f"Distribution of {value_type} - Technology: {tech} - Run: {run_id}"
+            imgpath = template.output_path(
+                os.path.join(tech_folder, f"{tech}_run_{run_id}.png")
+            )
+            digest = data_digest(density_df, color, title, template.signature)
+            if manifest.is_current(imgpath, digest):
+                print(f"Unchanged, skipped {imgpath}")
                 continue
 
-            plt.figure(figsize=(10, 6), dpi=250)
-            ax = plt.gca()
+            with span("draw", technology=tech, run_id=run_id):
+                ax = template.start(xlabel, "Density")
+                _plot_density_curve(ax, density_df, "density", label, color)
 
-            values = run_data[value_type].values
-            label = f"Run ID: {run_id}"
-            color = colors[hash(run_id) % len(colors)]
-
-            if len(values) > 1:
-                try:
-                    run_data[value_type].plot.density(label=label, color=color, ax=ax)
-                    print(f"Density curve plotted for {label}")
-                except Exception as e:
-                    print(f"Error plotting density for {label}: {str(e)}")
-                    ax.axvline(values.mean(), color=color, label=label)
-            else:
-                ax.axvline(values[0], color=color, label=label)
-
-            plt.title(
-                f"Distribution of {value_type} - Technology: {tech} - Run: {run_id}",
-                fontsize=18,
-            )
-            plt.xlabel(f"{value_type.replace('_', ' ').title()}", fontsize=14)
-            plt.ylabel("Density", fontsize=14)
-            plt.legend(fontsize=10)
-            ax.xaxis.set_major_formatter(FuncFormatter(lambda x, _: f"{x:.0%}"))
-            plt.tight_layout()
-
-            imgpath = os.path.join(tech_folder, f"{tech}_run_{run_id}.png")
-            plt.savefig(imgpath)
-            plt.close()
+            imgpath = template.save(imgpath, title)
+            manifest.record(imgpath, digest)
             print(f"Graph saved in {imgpath}")
+    manifest.close()
 
 
 def plot_comparison_between_shock_years(
-    data_df, params_df, plots_folder, value_type, category_column
+    data_df,
+    params_df,
+    plots_folder,
+    value_type,
+    category_column,
+    profile=None,
+    density_data=None,
+    facet=False,
 ):
     """
     Plots the distribution for two runs of the same target scenario but different shock years,
     for each technology.
+    With `facet`, draws all of them instead as small multiples in a single
+    figure, one row per target scenario and one column per technology.
 
     Args:
-    data_df (pd.DataFrame): The dataframe containing the data.
+    data_df (pd.DataFrame): The dataframe containing the data, unused when
+        density_data is given.
     params_df (pd.DataFrame): The dataframe with run parameters.
     plots_folder (str): The directory where plots will be saved.
     value_type (str): The type of value to plot.
     category_column (str): The category column (e.g., 'technology').
+    profile (str): Rendering profile name, or None for the default profile.
+    density_data (dict): Precomputed densities, as returned by
+        `compute_comparison_densities`.
+        Computed from data_df when None.
+    facet (bool): Whether to draw a single small-multiples figure.
     """
+    data_df = as_frame(data_df)
     comparison_folder = os.path.join(plots_folder, "comparison_shock_years")
     os.makedirs(comparison_folder, exist_ok=True)
 
-    # Get all unique target scenarios from the params_df
-    target_scenarios = params_df["target_scenario"].unique()
-    technologies = data_df[category_column].unique()
-
-    for target_scenario in target_scenarios:
-        scenario_runs = params_df[params_df["target_scenario"] == target_scenario]
-        shock_years = scenario_runs["shock_year"].unique()
+    if density_data is None:
+        density_data = compute_comparison_densities(
+            data_df, params_df, value_type, category_column
+        )
 
-        if len(shock_years) < 2:
-            print(
-                f"Not enough shock years for target scenario: {target_scenario} to compare."
-            )
+    if facet:
+        _plot_comparison_between_shock_years_grid(
+            density_data, comparison_folder, value_type, profile
+        )
+        return
+
+    template = figure_template("density", profile)
+    xlabel = f"{value_type.replace('_', ' ').title()}"
+
+    manifest = FigureManifest(comparison_folder)
+    for (target_scenario, tech), comparison_df in iter_stages(
+        density_data.items(), "comparison", key=lambda item: " ".join(item[0])
+    ):
+        title = f"Comparison of {value_type} - Target Scenario: {target_scenario} - Technology: {tech}"
+        imgpath = template.output_path(
+            os.path.join(comparison_folder, f"comparison_{target_scenario}_{tech}.png")
+        )
+        digest = data_digest(comparison_df, title, template.signature)
+        if manifest.is_current(imgpath, digest):
+            print(f"Unchanged, skipped {imgpath}")
             continue
 
-        # Select two shock years for comparison
-        shock_year_1, shock_year_2 = shock_years[:2]
-        run_ids_1 = scenario_runs[scenario_runs["shock_year"] == shock_year_1]["run_id"]
-        run_ids_2 = scenario_runs[scenario_runs["shock_year"] == shock_year_2]["run_id"]
+        with span("draw", target_scenario=target_scenario, technology=tech):
+            ax = template.start(xlabel, "Density")
+            for column, color in zip(comparison_df.columns[1:], COLORS):
+                if comparison_df[column].isna().all():
+                    continue
+                shock_year = column[len("density_") :]
+                ax.plot(
+                    comparison_df["x"],
+                    comparison_df[column],
+                    label=f"Shock Year: {shock_year}",
+                    color=color,
+                )
 
-        for tech in technologies:
-            data_tech = data_df[data_df[category_column] == tech]
-            data_1 = data_tech[data_tech["run_id"].isin(run_ids_1)]
-            data_2 = data_tech[data_tech["run_id"].isin(run_ids_2)]
+        imgpath = template.save(imgpath, title)
+        manifest.record(imgpath, digest)
+        print(f"Comparison graph for {tech} saved in {imgpath}")
+    manifest.close()
 
-            plt.figure(figsize=(10, 6), dpi=250)
-            ax = plt.gca()
 
-            colors = ["blue", "orange"]
+def _save_facet_grid(template, manifest, imgpath, digest, title):
+    """Hides the unused panels, then writes and records a small-multiples figure."""
+    for ax in template.axes.flat:
+        if not ax.has_data():
+            ax.set_axis_off()
+    imgpath = template.save(imgpath, title)
+    manifest.record(imgpath, digest)
+    manifest.close()
+    print(f"Small-multiples graph saved in {imgpath}")
 
-            if not data_1.empty:
-                data_1[value_type].plot.density(
-                    label=f"Shock Year: {shock_year_1}", color=colors[0], ax=ax
-                )
-            if not data_2.empty:
-                data_2[value_type].plot.density(
-                    label=f"Shock Year: {shock_year_2}", color=colors[1], ax=ax
-                )
 
-            plt.title(
-                f"Comparison of {value_type} - Target Scenario: {target_scenario} - Technology: {tech}",
-                fontsize=18,
-            )
-            plt.xlabel(f"{value_type.replace('_', ' ').title()}", fontsize=14)
-            plt.ylabel("Density", fontsize=14)
-            plt.legend(fontsize=10)
-            ax.xaxis.set_major_formatter(FuncFormatter(lambda x, _: f"{x:.0%}"))
-            plt.tight_layout()
-
-            imgpath = os.path.join(
-                comparison_folder, f"comparison_{target_scenario}_{tech}.png"
-            )
-            plt.savefig(imgpath)
-            plt.close()
-            print(f"Comparison graph for {tech} saved in {imgpath}")
+def _plot_individual_distributions_grid(
+    density_data, catalog, individual_folder, value_type, profile=None
+):
+    """
+    Draws the individual distributions as one figure of small multiples, with
+    a shared x-axis and one density axis per technology row.
+    """
+    technologies = list(density_data)
+    present = {run_id for runs in density_data.values() for run_id in runs}
+    run_ids = [run.run_id for run in catalog if run.run_id in present]
+    run_ids += sorted(present - set(run_ids))
+    if not technologies or not run_ids:
+        print("No densities to plot.")
+        return
+
+    title = f"Distribution of {value_type} by technology and run"
+    imgpath = os.path.join(individual_folder, f"{title.replace(' ', '_')}.png")
+    manifest = FigureManifest(individual_folder, "grid")
+    template = facet_figure(
+        "density",
+        len(technologies),
+        len(run_ids),
+        profile,
+        sharex=True,
+        sharey="row",
+    )
+    imgpath = template.output_path(imgpath)
+    digest = data_digest(
+        *[
+            density_data[tech][run_id]
+            for tech in technologies
+            for run_id in run_ids
+            if run_id in density_data[tech]
+        ],
+        [(tech, list(density_data[tech])) for tech in technologies],
+        run_ids,
+        catalog.params_df,
+        title,
+        template.signature,
+    )
+    if manifest.is_current(imgpath, digest):
+        print(f"Unchanged, skipped {imgpath}")
+        manifest.close()
+        return
+
+    template.start(f"{value_type.replace('_', ' ').title()}", "")
+    for row, tech in enumerate(technologies):
+        for col, run_id in enumerate(run_ids):
+            ax = template.axes[row, col]
+            if row == 0:
+                ax.set_title(catalog.label(run_id), fontsize=8)
+            if col == 0:
+                ax.set_ylabel(f"{tech}\nDensity", fontsize=10)
+            density_df = density_data[tech].get(run_id)
+            if density_df is None:
+                continue
+            run = catalog.get(run_id)
+            color = run.color if run is not None else COLORS[0]
+            _plot_density_curve(ax, density_df, "density", None, color)
+    _save_facet_grid(template, manifest, imgpath, digest, title)
+
+
+def _plot_comparison_between_shock_years_grid(
+    density_data, comparison_folder, value_type, profile=None
+):
+    """
+    Draws the shock year comparisons as one figure of small multiples, with a
+    shared x-axis and one density axis per target scenario row.
+    """
+    target_scenarios = list(dict.fromkeys(key[0] for key in density_data))
+    technologies = list(dict.fromkeys(key[1] for key in density_data))
+    if not density_data:
+        print("No densities to plot.")
+        return
+
+    title = f"Comparison of {value_type} between shock years"
+    imgpath = os.path.join(comparison_folder, f"{title.replace(' ', '_')}.png")
+    manifest = FigureManifest(comparison_folder, "grid")
+    template = facet_figure(
+        "density",
+        len(target_scenarios),
+        len(technologies),
+        profile,
+        sharex=True,
+        sharey="row",
+    )
+    imgpath = template.output_path(imgpath)
+    digest = data_digest(
+        *density_data.values(), list(density_data), title, template.signature
+    )
+    if manifest.is_current(imgpath, digest):
+        print(f"Unchanged, skipped {imgpath}")
+        manifest.close()
+        return
+
+    template.start(f"{value_type.replace('_', ' ').title()}", "")
+    for row, target_scenario in enumerate(target_scenarios):
+        for col, tech in enumerate(technologies):
+            ax = template.axes[row, col]
+            if row == 0:
+                ax.set_title(tech, fontsize=10)
+            if col == 0:
+                ax.set_ylabel(f"{target_scenario}\nDensity", fontsize=8)
+            comparison_df = density_data.get((target_scenario, tech))
+            if comparison_df is None:
+                continue
+            for column, color in zip(comparison_df.columns[1:], COLORS):
+                if comparison_df[column].isna().all():
+                    continue
+                ax.plot(
+                    comparison_df["x"],
+                    comparison_df[column],
+                    label=column[len("density_") :],
+                    color=color,
+                )
+            ax.legend(title="Shock Year", fontsize=7, title_fontsize=7)
+    _save_facet_grid(template, manifest, imgpath, digest, title)
 
 
 def plot_comparison_between_shock_years_barplot(
-    data_df, params_df, plots_folder, value_type, category_column
+    data_df, params_df, plots_folder, value_type, category_column, profile=None
 ):
     """
     Plots grouped bar plots for two runs of the same target scenario but different shock years,
@@ -199,16 +353,22 @@ def plot_comparison_between_shock_years_barplot(
     plots_folder (str): The directory where plots will be saved.
     value_type (str): The type of value to plot.
     category_column (str): The category column (e.g., 'technology').
+    profile (str): Rendering profile name, or None for the default profile.
     """
+    data_df = as_frame(data_df)
     comparison_folder = os.path.join(plots_folder, "comparison_shock_years_barplot")
     os.makedirs(comparison_folder, exist_ok=True)
 
-    target_scenarios = params_df["target_scenario"].unique()
+    catalog = run_catalog(params_df)
+    target_scenarios = catalog.unique("target_scenario")
     technologies = data_df[category_column].unique()
+    template = figure_template("comparison_barplot", profile)
+    xlabel = f"{value_type.replace('_', ' ').title()}"
 
-    for target_scenario in target_scenarios:
-        scenario_runs = params_df[params_df["target_scenario"] == target_scenario]
-        shock_years = scenario_runs["shock_year"].unique()
+    manifest = FigureManifest(comparison_folder)
+    for target_scenario in iter_stages(target_scenarios, "target_scenario"):
+        scenario_runs = catalog.select(target_scenario=target_scenario)
+        shock_years = pd.unique(np.array([run.shock_year for run in scenario_runs]))
 
         if len(shock_years) < 2:
             print(
@@ -218,8 +378,12 @@ def plot_comparison_between_shock_years_barplot(
 
         # Select two shock years for comparison
         shock_year_1, shock_year_2 = shock_years[:2]
-        run_ids_1 = scenario_runs[scenario_runs["shock_year"] == shock_year_1]["run_id"]
-        run_ids_2 = scenario_runs[scenario_runs["shock_year"] == shock_year_2]["run_id"]
+        run_ids_1 = catalog.run_ids_where(
+            target_scenario=target_scenario, shock_year=shock_year_1
+        )
+        run_ids_2 = catalog.run_ids_where(
+            target_scenario=target_scenario, shock_year=shock_year_2
+        )
 
         for tech in technologies:
             data_tech = data_df[data_df[category_column] == tech]
@@ -232,8 +396,20 @@ def plot_comparison_between_shock_years_barplot(
                 )
                 continue
 
-            plt.figure(figsize=(14, 8), dpi=250)
-            ax = plt.gca()
+            title = f"Comparison of {value_type} - Target Scenario: {target_scenario} - Technology: {tech}"
+            imgpath = template.output_path(
+                os.path.join(
+                    comparison_folder, f"comparison_{target_scenario}_{tech}.png"
+                )
+            )
+            digest = data_digest(
+                data_1[value_type], data_2[value_type], title, template.signature
+            )
+            if manifest.is_current(imgpath, digest):
+                print(f"Unchanged, skipped {imgpath}")
+                continue
+
+            ax = template.start(xlabel, "Density")
 
             # Bin calculation based on overall min and max values for both datasets
             values = np.concatenate(
@@ -273,21 +449,10 @@ def plot_comparison_between_shock_years_barplot(
                 alpha=0.7,
             )
 
-            plt.title(
-                f"Comparison of {value_type} - Target Scenario: {target_scenario} - Technology: {tech}",
-                fontsize=18,
-            )
-            plt.xlabel(f"{value_type.replace('_', ' ').title()}", fontsize=14)
-            plt.ylabel("Density", fontsize=14)
-            plt.legend(fontsize=10)
-            plt.tight_layout()
-
-            imgpath = os.path.join(
-                comparison_folder, f"comparison_{target_scenario}_{tech}.png"
-            )
-            plt.savefig(imgpath)
-            plt.close()
+            imgpath = template.save(imgpath, title)
+            manifest.record(imgpath, digest)
             print(f"Grouped bar plot comparison for {tech} saved in {imgpath}")
+    manifest.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,181 @@
+import os
+import sys
+import json
+import time
+import threading
+import contextlib
+
+from .tracing import span, tracing_enabled
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+_ENABLED = True
+
+# Stages currently running in each thread, innermost last, and finished
+# top-level stages of all threads
+_local = threading.local()
+_completed = []
+
+
+def _active_stages():
+    """Returns the stack of running stages of the current thread."""
+    if not hasattr(_local, "active"):
+        _local.active = []
+    return _local.active
+
+
+def set_instrumentation(enabled):
+    """
+    Enables or disables the recording of stages.
+
+    Parameters:
+    enabled (bool): Whether stages are recorded (default True).
+    """
+    global _ENABLED
+    _ENABLED = bool(enabled)
+
+
+def _peak_rss_mb():
+    """Returns the peak resident memory of the process so far, in MB."""
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 2**20 if sys.platform == "darwin" else 2**10
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+@contextlib.contextmanager
+def stage(name, rows=None):
+    """
+    Records the wall time, CPU time, peak RSS, rows processed and files
+    written of a block of code. Stages opened inside another stage are
+    recorded as its sub-stages. Stages are also traced as spans (see
+    `tracing.span`).
+
+    CPU time is that of the thread running the stage, so stages running
+    concurrently in other threads are not counted; work the stage hands to
+    other threads (background writes, multithreaded numpy) is not counted
+    either. Peak RSS is the high-water mark of the process at the end of the
+    stage, so a stage that raised it is one whose value exceeds its
+    predecessor's (among stages that did not overlap).
+
+    Parameters:
+    name (str): The stage name.
+    rows (int): Number of rows processed, if known upfront (see `add_rows`).
+
+    Yields:
+    dict: The stage record, or None when instrumentation is disabled.
+    """
+    with span(name, rows=rows):
+        if not _ENABLED:
+            yield None
+            return
+
+        record = {
+            "name": name,
+            "rows": rows,
+            "figures_written": 0,
+            "files_written": 0,
+            "stages": [],
+        }
+        active = _active_stages()
+        parent = active[-1] if active else None
+        active.append(record)
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield record
+        finally:
+            record["wall_s"] = time.perf_counter() - wall_start
+            record["cpu_s"] = time.thread_time() - cpu_start
+            record["peak_rss_mb"] = _peak_rss_mb()
+            active.remove(record)
+            if parent is not None:
+                parent["stages"].append(record)
+            else:
+                _completed.append(record)
+
+
+def iter_stages(items, label, key=None):
+    """
+    Yields the items of a loop, each iteration running in its own sub-stage
+    named "<label> <key>", without reindenting the loop body.
+
+    Parameters:
+    items (iterable): The loop items.
+    label (str): Prefix of the sub-stage names (e.g. "category").
+    key (callable): Returns the name of an item; the item itself, or its
+        first element for tuples, by default.
+    """
+    for item in items:
+        if not (_ENABLED or tracing_enabled()):
+            yield item
+            continue
+        if key is not None:
+            item_name = key(item)
+        else:
+            item_name = item[0] if isinstance(item, tuple) else item
+        with stage(f"{label} {item_name}"):
+            yield item
+
+
+def add_rows(rows):
+    """Adds processed rows to the innermost running stage."""
+    active = _active_stages()
+    if _ENABLED and active:
+        record = active[-1]
+        record["rows"] = (record["rows"] or 0) + int(rows)
+
+
+def record_output(path, kind="file"):
+    """
+    Counts a file written by every running stage of the current thread.
+
+    Parameters:
+    path (str): The written file.
+    kind (str): "figure" for images, "file" for data files.
+    """
+    if not _ENABLED:
+        return
+    field = "figures_written" if kind == "figure" else "files_written"
+    for record in _active_stages():
+        record[field] += 1
+
+
+def reset_stages():
+    """Forgets the finished stages."""
+    _completed.clear()
+
+
+def stage_summary():
+    """Returns the finished top-level stages, with their sub-stages."""
+    return list(_completed)
+
+
+def write_stage_summary(output_file, wall_s=None):
+    """
+    Writes the finished stages as a JSON summary.
+
+    Parameters:
+    output_file (str): Path of the JSON file.
+    wall_s (float): Elapsed time of the whole run. By default, the sum of the
+        stages' wall times, which overcounts stages that ran concurrently.
+    """
+    stages = stage_summary()
+    if wall_s is None:
+        wall_s = sum(record["wall_s"] for record in stages)
+    summary = {
+        "written_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "wall_s": wall_s,
+        "cpu_s": sum(record["cpu_s"] for record in stages),
+        "peak_rss_mb": _peak_rss_mb(),
+        "stages": stages,
+    }
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    with open(output_file, "w") as f:
+        json.dump(summary, f, indent=2, default=str)
+    print(f"Stage summary written to {output_file}")
@@ -0,0 +1,583 @@
+import os
+import numpy as np
+import pandas as pd
+
+from .instrumentation import record_output
+from .output_writer import write_excel
+from .precision import cast_value_columns, density_grid, get_compute_dtype
+from .run_catalog import run_catalog
+from .technology_stats import STATS_COLUMN_NAMES
+
+
+# Default amount of memory (in MB) a single chunk and its temporaries may use
+DEFAULT_MEMORY_BUDGET_MB = 512
+
+# Value and category columns streamed for each TRISK output
+DATASETS = {
+    "npv": {
+        "file": "npvs.csv",
+        "value_type": "net_present_value_change",
+        "category_column": "technology",
+        "columns": [
+            "run_id",
+            "company_id",
+            "technology",
+            "net_present_value_baseline",
+            "net_present_value_shock",
+        ],
+    },
+    "pd": {
+        "file": "pds.csv",
+        "value_type": "pd_difference",
+        "category_column": "sector",
+        "columns": ["run_id", "company_id", "sector", "term", "pd_baseline", "pd_shock"],
+    },
+}
+
+
+def estimate_chunk_size(
+    path, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB, usecols=None, sample_rows=10000
+):
+    """
+    Estimates how many CSV rows fit in the given memory budget.
+
+    A sample of the file is parsed to measure the in-memory size of a row. The
+    budget is divided by four times that size to leave room for derived columns,
+    groupby temporaries and the parser's own buffers.
+
+    Parameters:
+    path (str): Path to the CSV file.
+    memory_budget_mb (float): Memory budget for one chunk, in megabytes.
+    usecols (list): Columns that will actually be read.
+    sample_rows (int): Number of rows parsed to estimate the row size.
+
+    Returns:
+    int: Number of rows per chunk.
+    """
+    usecols = _present_columns(usecols)
+    sample = pd.read_csv(path, nrows=sample_rows, usecols=usecols)
+    if sample.empty:
+        return sample_rows
+    bytes_per_row = sample.memory_usage(deep=True).sum() / len(sample)
+    return max(1000, int(memory_budget_mb * 1024**2 / (bytes_per_row * 4)))
+
+
+def _present_columns(columns):
+    """Returns a usecols callable tolerating columns missing from the file."""
+    if columns is None:
+        return None
+    wanted = set(columns)
+    return lambda column: column in wanted
+
+
+def iter_dataset_chunks(source, dataset, chunksize, term=5):
+    """
+    Streams the NPV or PD results in chunks, adding the derived value column.
+
+    Parameters:
+    source (str): The directory containing the CSV files.
+    dataset (str): "npv" or "pd".
+    chunksize (int): Number of rows per chunk.
+    term (int): PD term to keep (PD dataset only).
+
+    Yields:
+    pd.DataFrame: A chunk with the value column of the dataset.
+    """
+    spec = DATASETS[dataset]
+    reader = pd.read_csv(
+        os.path.join(source, spec["file"]),
+        chunksize=chunksize,
+        usecols=_present_columns(spec["columns"]),
+    )
+    for chunk in reader:
+        if dataset == "npv":
+            chunk["net_present_value_change"] = (
+                chunk["net_present_value_shock"] - chunk["net_present_value_baseline"]
+            ) / chunk["net_present_value_baseline"]
+        else:
+            chunk = chunk.loc[chunk["term"] == term, :]
+            chunk["pd_difference"] = chunk["pd_shock"] - chunk["pd_baseline"]
+        # Non-finite changes (e.g. a zero NPV baseline) cannot be binned
+        value_type = spec["value_type"]
+        chunk = cast_value_columns(chunk[np.isfinite(chunk[value_type])].copy())
+        if not chunk.empty:
+            yield chunk
+
+
+class MomentAccumulator:
+    """
+    Mergeable count, mean, sum of squared deviations, min and max per group.
+
+    Partial results are combined with Chan's parallel update, so accumulators
+    built from different chunks (or different files) can be merged exactly.
+    """
+
+    COLUMNS = ["count", "mean", "m2", "min", "max"]
+
+    def __init__(self, keys):
+        self.keys = list(keys)
+        self.table = None
+
+    def update(self, chunk, value_type):
+        values = chunk[value_type].astype(np.float64)
+        grouped = values.groupby([chunk[key] for key in self.keys], sort=False)
+        part = pd.DataFrame(
+            {
+                "count": grouped.count(),
+                "mean": grouped.mean(),
+                "m2": grouped.var(ddof=0) * grouped.count(),
+                "min": grouped.min(),
+                "max": grouped.max(),
+            }
+        )
+        self._merge_table(part)
+
+    def merge(self, other):
+        if other.table is not None:
+            self._merge_table(other.table)
+        return self
+
+    def _merge_table(self, part):
+        if self.table is None:
+            self.table = part
+            return
+        index = self.table.index.union(part.index)
+        a = self.table.reindex(index)
+        b = part.reindex(index)
+        n_a = a["count"].fillna(0)
+        n_b = b["count"].fillna(0)
+        n = n_a + n_b
+        mean_a = a["mean"].fillna(0)
+        mean_b = b["mean"].fillna(0)
+        delta = mean_b - mean_a
+        self.table = pd.DataFrame(
+            {
+                "count": n,
+                "mean": mean_a + delta * (n_b / n),
+                "m2": a["m2"].fillna(0)
+                + b["m2"].fillna(0)
+                + delta**2 * (n_a * n_b / n),
+                "min": np.fmin(a["min"], b["min"]),
+                "max": np.fmax(a["max"], b["max"]),
+            },
+            index=index,
+        )
+
+
+class DistinctAccumulator:
+    """
+    Mergeable set of the distinct key rows seen (e.g. the companies of each
+    category and run).
+
+    Each update deduplicates the chunk's rows into the accumulated set, so
+    memory follows the number of distinct rows rather than the rows streamed.
+    """
+
+    def __init__(self, keys):
+        self.keys = list(keys)
+        self.table = None
+
+    def update(self, chunk):
+        self._merge_table(chunk[self.keys].drop_duplicates())
+
+    def merge(self, other):
+        if other.table is not None:
+            self._merge_table(other.table)
+        return self
+
+    def _merge_table(self, part):
+        if self.table is None:
+            self.table = part.reset_index(drop=True)
+            return
+        self.table = pd.concat(
+            [self.table, part], ignore_index=True
+        ).drop_duplicates(ignore_index=True)
+
+
+def collapse_moments(frame, by):
+    """
+    Reduces a moment table to coarser groups.
+
+    Parameters:
+    frame (pd.DataFrame): Moment columns plus the grouping columns in `by`.
+    by (list): Columns defining the coarser groups.
+
+    Returns:
+    pd.DataFrame: Moment table indexed by `by`.
+    """
+    keys = [frame[column] for column in by]
+    count = frame["count"].groupby(keys).sum()
+    mean = (frame["count"] * frame["mean"]).groupby(keys).sum() / count
+    grand_mean = frame[by].merge(
+        mean.rename("grand_mean").reset_index(), on=by, how="left"
+    )["grand_mean"].to_numpy()
+    spread = frame["count"] * (frame["mean"] - grand_mean) ** 2
+    return pd.DataFrame(
+        {
+            "count": count,
+            "mean": mean,
+            "m2": frame["m2"].groupby(keys).sum() + spread.groupby(keys).sum(),
+            "min": frame["min"].groupby(keys).min(),
+            "max": frame["max"].groupby(keys).max(),
+        }
+    )
+
+
+class HistogramAccumulator:
+    """
+    Mergeable binned counts per group, each group having its own bin range.
+
+    Counting follows `np.histogram`: values outside a group's range are ignored
+    and the last bin includes its right edge.
+    """
+
+    def __init__(self, limits, num_bins):
+        """
+        Parameters:
+        limits (dict): Maps a group key tuple to its (low, high) bin range.
+        num_bins (int): Number of bins per group.
+        """
+        self.groups = pd.MultiIndex.from_tuples(list(limits.keys()))
+        bounds = np.array(list(limits.values()), dtype=np.float64).reshape(-1, 2)
+        self.lows = bounds[:, 0]
+        self.highs = bounds[:, 1]
+        self.num_bins = num_bins
+        self.counts = np.zeros((len(self.groups), num_bins), dtype=np.int64)
+
+    def edges(self, key):
+        i = self.groups.get_loc(key)
+        return np.linspace(self.lows[i], self.highs[i], self.num_bins + 1)
+
+    def counts_for(self, key):
+        return self.counts[self.groups.get_loc(key)]
+
+    def update(self, key_arrays, values):
+        codes = self.groups.get_indexer(pd.MultiIndex.from_arrays(key_arrays))
+        values = np.asarray(values, dtype=np.float64)
+        known = codes >= 0
+        codes, values = codes[known], values[known]
+        lows, highs = self.lows[codes], self.highs[codes]
+        inside = (values >= lows) & (values <= highs)
+        codes, values = codes[inside], values[inside]
+        lows, highs = lows[inside], highs[inside]
+        width = highs - lows
+        with np.errstate(divide="ignore", invalid="ignore"):
+            bins = np.where(
+                width > 0,
+                np.floor((values - lows) / width * self.num_bins),
+                self.num_bins - 1,
+            ).astype(np.int64)
+        bins = np.clip(bins, 0, self.num_bins - 1)
+        flat = np.bincount(
+            codes * self.num_bins + bins, minlength=self.counts.size
+        )
+        self.counts += flat.reshape(self.counts.shape)
+
+    def merge(self, other):
+        self.counts += other.counts
+        return self
+
+
+def binned_density(counts, edges, x_grid, std):
+    """
+    Evaluates a Gaussian KDE from binned counts.
+
+    Each bin contributes a kernel centred on its midpoint, weighted by its
+    count. The bandwidth follows Scott's rule, like `scipy.stats.gaussian_kde`.
+
+    Parameters:
+    counts (np.ndarray): Counts per bin.
+    edges (np.ndarray): Bin edges.
+    x_grid (np.ndarray): The grid over which density is evaluated.
+    std (float): Standard deviation of the underlying values.
+
+    Returns:
+    np.ndarray: Density values corresponding to x_grid.
+    """
+    n = counts.sum()
+    if n < 2 or not std > 0:
+        return np.full(len(x_grid), np.nan, dtype=get_compute_dtype())
+    bandwidth = std * n ** (-1 / 5)
+    centers = (edges[:-1] + edges[1:]) / 2
+    occupied = counts > 0
+    centers, weights = centers[occupied], counts[occupied] / n
+    density = np.zeros(len(x_grid), dtype=np.float64)
+    # Evaluate in blocks of grid points to bound the kernel matrix size
+    for start in range(0, len(x_grid), 64):
+        block = x_grid[start : start + 64, None]
+        z = (block - centers[None, :]) / bandwidth
+        density[start : start + 64] = np.exp(-0.5 * z**2) @ weights
+    density /= bandwidth * np.sqrt(2 * np.pi)
+    return density.astype(get_compute_dtype())
+
+
+def _binned_order_statistic(cumulative, edges, k):
+    """
+    Approximates the k-th smallest value (from 0), spreading the values of
+    its bin evenly over the bin width.
+    """
+    i = int(np.searchsorted(cumulative, k, side="right"))
+    before = cumulative[i - 1] if i > 0 else 0
+    fraction = (k - before + 0.5) / (cumulative[i] - before)
+    return edges[i] + fraction * (edges[i + 1] - edges[i])
+
+
+def binned_quantile(counts, edges, q):
+    """
+    Approximates a quantile from binned counts, interpolating linearly
+    between the two order statistics around it like `pd.Series.quantile`.
+
+    Each order statistic is approximated within its own bin, so the quantile
+    is off by less than the width of the bins holding them.
+    """
+    cumulative = np.cumsum(counts)
+    n = cumulative[-1]
+    if n == 0:
+        return np.nan
+    position = q * (n - 1)
+    low = int(np.floor(position))
+    high = min(low + 1, n - 1)
+    below = _binned_order_statistic(cumulative, edges, low)
+    above = _binned_order_statistic(cumulative, edges, high)
+    return below + (position - low) * (above - below)
+
+
+def _padded(low, high):
+    margin = (high - low) * 0.1
+    return (low - margin, high + margin)
+
+
+def reduce_distributions(
+    source,
+    params_df,
+    dataset,
+    memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB,
+    num_bins=10,
+    num_points=500,
+    num_fine_bins=2048,
+    term=5,
+):
+    """
+    Streams one TRISK output file twice and reduces it to plot-ready results.
+
+    The first pass accumulates moments per category and run, giving the global
+    and per-category axis limits. The second pass bins the values, both into
+    the coarse histograms and into fine histograms from which densities and
+    quantiles are derived. Only one chunk is held in memory at a time.
+
+    Parameters:
+    source (str): The directory containing the CSV files.
+    params_df (pd.DataFrame): The dataframe with run parameters.
+    dataset (str): "npv" or "pd".
+    memory_budget_mb (float): Memory budget used to size the chunks.
+    num_bins (int): Number of bins of the histograms.
+    num_points (int): Number of points in the density grid.
+    num_fine_bins (int): Number of bins used to approximate densities and quantiles.
+    term (int): PD term to keep (PD dataset only).
+
+    Returns:
+    dict: Reduced results with keys "value_type", "category_column",
+    "global_xlim", "xlim_by_category", "xlim_by_run", "moments", "fine_histograms",
+    "companies", "density_by_category", "density_by_run",
+    "histogram_by_category" and "histogram_by_run". The density and histogram
+    entries use the layout of the extract_* functions.
+    """
+    spec = DATASETS[dataset]
+    value_type = spec["value_type"]
+    category_column = spec["category_column"]
+    path = os.path.join(source, spec["file"])
+    chunksize = estimate_chunk_size(path, memory_budget_mb, usecols=spec["columns"])
+    print(f"Streaming {path} in chunks of {chunksize} rows")
+
+    # Pass 1: moments per (category, run) and the company pairs seen
+    moments = MomentAccumulator([category_column, "run_id"])
+    companies = DistinctAccumulator([category_column, "run_id", "company_id"])
+    for chunk in iter_dataset_chunks(source, dataset, chunksize, term=term):
+        moments.update(chunk, value_type)
+        companies.update(chunk)
+    if moments.table is None:
+        print(f"Warning: No valid data found for column {value_type}")
+        return None
+
+    table = moments.table
+    global_limits = (table["min"].min(), table["max"].max())
+    category_limits = {
+        cat: (rows["min"].min(), rows["max"].max())
+        for cat, rows in table.groupby(level=0)
+    }
+    run_limits = {
+        run_id: (rows["min"].min(), rows["max"].max())
+        for run_id, rows in table.groupby(level=1)
+    }
+    categories = list(category_limits.keys())
+    run_ids = list(run_catalog(params_df).run_ids)
+
+    # Groups of the second pass: each category plus "All", for every run
+    by_category_limits = {}
+    for run_id in run_ids:
+        for cat in categories:
+            by_category_limits[(cat, run_id)] = category_limits[cat]
+        by_category_limits[("All", run_id)] = global_limits
+    by_run_limits = {
+        (run_id, cat): run_limits[run_id]
+        for run_id in run_ids
+        if run_id in run_limits
+        for cat in categories
+    }
+    coarse_by_category = HistogramAccumulator(by_category_limits, num_bins)
+    fine_by_category = HistogramAccumulator(by_category_limits, num_fine_bins)
+    coarse_by_run = HistogramAccumulator(by_run_limits, num_bins)
+
+    # Pass 2: bin every value
+    for chunk in iter_dataset_chunks(source, dataset, chunksize, term=term):
+        cats = chunk[category_column].to_numpy()
+        runs = chunk["run_id"].to_numpy()
+        everything = np.full(len(chunk), "All", dtype=object)
+        values = chunk[value_type].to_numpy()
+        for accumulator in (coarse_by_category, fine_by_category):
+            accumulator.update([cats, runs], values)
+            accumulator.update([everything, runs], values)
+        coarse_by_run.update([runs, cats], values)
+
+    # Moments of the "All" pseudo-category
+    flat = table.reset_index()
+    all_moments = collapse_moments(flat, ["run_id"])
+    all_moments.index = pd.MultiIndex.from_product([["All"], all_moments.index])
+    full_table = pd.concat([table, all_moments])
+
+    catalog = run_catalog(params_df)
+    global_xlim = _padded(*global_limits)
+    x_grid = density_grid(global_xlim[0], global_xlim[1], num_points)
+
+    density_by_category = {}
+    histogram_by_category = {}
+    curves = {}
+    for cat in categories + ["All"]:
+        density_columns = {"x": x_grid}
+        coarse_edges = coarse_by_category.edges((cat, run_ids[0]))
+        histogram_columns = {"bin_start": coarse_edges[:-1], "bin_end": coarse_edges[1:]}
+        for run_id in run_ids:
+            label = catalog.label(run_id)
+            if (cat, run_id) in full_table.index:
+                stats = full_table.loc[(cat, run_id)]
+                # Sample standard deviation, as gaussian_kde
+                count = stats["count"]
+                std = np.sqrt(stats["m2"] / (count - 1)) if count > 1 else np.nan
+                density = binned_density(
+                    fine_by_category.counts_for((cat, run_id)),
+                    fine_by_category.edges((cat, run_id)),
+                    x_grid,
+                    std,
+                )
+                counts = coarse_by_category.counts_for((cat, run_id))
+            else:
+                density = np.full(num_points, np.nan)
+                counts = np.full(num_bins, np.nan)
+            curves[(cat, run_id)] = density
+            density_columns[f"density_{label}"] = density
+            histogram_columns[f"count_{label}"] = counts
+        density_by_category[cat] = pd.DataFrame(density_columns)
+        histogram_by_category[cat] = pd.DataFrame(histogram_columns)
+
+    density_by_run = {}
+    histogram_by_run = {}
+    for run_id in run_ids:
+        if run_id not in run_limits:
+            continue
+        run_categories = [c for c in categories if (c, run_id) in table.index]
+        density_by_run[run_id] = pd.DataFrame(
+            {"x": x_grid, **{f"density_{c}": curves[(c, run_id)] for c in run_categories}}
+        )
+        edges = coarse_by_run.edges((run_id, run_categories[0]))
+        histogram_by_run[run_id] = pd.DataFrame(
+            {
+                "bin_start": edges[:-1],
+                "bin_end": edges[1:],
+                **{
+                    f"count_{c}": coarse_by_run.counts_for((run_id, c))
+                    for c in run_categories
+                },
+            }
+        )
+
+    return {
+        "value_type": value_type,
+        "category_column": category_column,
+        "global_xlim": global_xlim,
+        "xlim_by_category": {
+            **{cat: _padded(*limits) for cat, limits in category_limits.items()},
+            "All": global_xlim,
+        },
+        "xlim_by_run": {run_id: _padded(*limits) for run_id, limits in run_limits.items()},
+        "moments": full_table,
+        "fine_histograms": fine_by_category,
+        "companies": companies.table,
+        "density_by_category": density_by_category,
+        "density_by_run": density_by_run,
+        "histogram_by_category": histogram_by_category,
+        "histogram_by_run": histogram_by_run,
+    }
+
+
+def streamed_technology_stats(reduced, params_df, output_file):
+    """
+    Writes the technology statistics of `generate_technology_stats` from
+    streamed NPV results.
+
+    Counts, means, standard deviations and extremes are exact. The median and
+    quartiles interpolate between order statistics like the in-memory
+    statistics, but each order statistic is approximated within its fine
+    histogram bin, so they are off by less than the fine bin width of the
+    technology (its value range / num_fine_bins).
+
+    Parameters:
+    reduced (dict): Output of `reduce_distributions` for the NPV dataset.
+    params_df (pd.DataFrame): DataFrame containing parameter data.
+    output_file (str): The file path where the Excel file will be saved.
+    """
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+
+    keys = ["target_scenario", "shock_year"]
+    run_params = run_catalog(params_df).params_df[["run_id"] + keys]
+    moments = reduced["moments"].drop(index="All", level=0)
+    flat = moments.reset_index()
+    flat.columns = ["technology", "run_id"] + MomentAccumulator.COLUMNS
+    flat = flat.merge(run_params, on="run_id")
+    grouped_moments = collapse_moments(flat, ["technology"] + keys)
+
+    companies = reduced["companies"].merge(run_params, on="run_id")
+    unique_companies = companies.groupby(["technology"] + keys)["company_id"].nunique()
+
+    fine = reduced["fine_histograms"]
+    all_tech_stats = []
+    for (tech, target_scenario, shock_year), stats in grouped_moments.iterrows():
+        group_runs = flat[
+            (flat["technology"] == tech)
+            & (flat["target_scenario"] == target_scenario)
+            & (flat["shock_year"] == shock_year)
+        ]["run_id"]
+        counts = sum(fine.counts_for((tech, run_id)) for run_id in group_runs)
+        edges = fine.edges((tech, group_runs.iloc[0]))
+        count = stats["count"]
+        all_tech_stats.append(
+            {
+                "target_scenario": target_scenario,
+                "shock_year": shock_year,
+                "median_npv_change": binned_quantile(counts, edges, 0.5),
+                "mean_npv_change": stats["mean"],
+                "std_npv_change": (
+                    np.sqrt(stats["m2"] / (count - 1)) if count > 1 else np.nan
+                ),
+                "unique_company_count": unique_companies[(tech, target_scenario, shock_year)],
+                "min_npv_change": stats["min"],
+                "max_npv_change": stats["max"],
+                "q1_npv_change": binned_quantile(counts, edges, 0.25),
+                "q3_npv_change": binned_quantile(counts, edges, 0.75),
+                "count_observations": int(count),
+                "Technology": tech,
+            }
+        )
+
+    final_df = pd.DataFrame(all_tech_stats).round(4).rename(columns=STATS_COLUMN_NAMES)
+    write_excel(final_df, output_file, index=False)
+    record_output(output_file)
@@ -0,0 +1,250 @@
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from .tracing import span
+
+
+# Whether `background_writes` blocks queue their writes (see set_background_writes)
+_ENABLED = False
+
+# Writer of the `background_writes` block open on each thread
+_local = threading.local()
+
+# Image formats encoded in the background from a rasterized figure
+_RASTER_FORMATS = {".png": "PNG", ".jpg": "JPEG", ".jpeg": "JPEG"}
+
+
+def set_background_writes(enabled):
+    """
+    Enables or disables background writes.
+
+    When enabled, the output files of `write_csv`, `write_excel` and
+    `write_figure` called inside a `background_writes` block are written by
+    background threads while the computation goes on. When disabled (the
+    default), they are written immediately.
+
+    Parameters:
+    enabled (bool): Whether to write in the background.
+    """
+    global _ENABLED
+    _ENABLED = bool(enabled)
+
+
+def get_background_writes():
+    """Returns whether background writes are enabled."""
+    return _ENABLED
+
+
+class OutputWriter:
+    """
+    Writes output files from a pool of background threads.
+
+    Queued outputs hold their data (a DataFrame, or a rasterized figure) in
+    memory until written; `submit` blocks while the queued outputs exceed
+    `max_pending_mb`, which bounds that memory. Each file is written under a
+    temporary name then renamed, so a failed write never leaves a partial
+    file. Errors are raised by `close`, after the callbacks registered with
+    `after_writes` have been told which files failed.
+    """
+
+    def __init__(self, max_pending_mb=256, workers=2):
+        """
+        Parameters:
+        max_pending_mb (float): Memory cap of the queued outputs.
+        workers (int): Number of writing threads.
+        """
+        self.max_pending_bytes = max_pending_mb * 2**20
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="output-writer"
+        )
+        self._condition = threading.Condition()
+        self._pending_bytes = 0
+        self._futures = []
+        self._failed = set()
+        self._callbacks = []
+
+    def submit(self, path, write, nbytes):
+        """
+        Queues the write of one output file.
+
+        Parameters:
+        path (str): The output file.
+        write (callable): Function writing the file at the path it is given.
+        nbytes (int): Memory held by the queued output.
+        """
+        with self._condition:
+            # An output larger than the cap is still queued once nothing else is
+            while (
+                self._pending_bytes
+                and self._pending_bytes + nbytes > self.max_pending_bytes
+            ):
+                self._condition.wait()
+            self._pending_bytes += nbytes
+        self._futures.append(self._executor.submit(self._write, path, write, nbytes))
+
+    def _write(self, path, write, nbytes):
+        root, extension = os.path.splitext(path)
+        temporary = f"{root}.partial{extension}"
+        try:
+            with span("background_write", path=path):
+                write(temporary)
+                os.replace(temporary, path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            with self._condition:
+                self._failed.add(path)
+            raise
+        finally:
+            with self._condition:
+                self._pending_bytes -= nbytes
+                self._condition.notify_all()
+
+    def after_writes(self, callback):
+        """
+        Registers a function called by `close` once the queued writes are
+        done, with the set of the paths whose write failed.
+        """
+        self._callbacks.append(callback)
+
+    def close(self, raise_errors=True):
+        """
+        Waits for the queued writes and runs the `after_writes` callbacks,
+        then raises the first error, after printing the others.
+
+        Parameters:
+        raise_errors (bool): Whether to raise the first error.
+        """
+        errors = [error for error in (f.exception() for f in self._futures) if error]
+        self._executor.shutdown()
+        self._futures = []
+        callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(set(self._failed))
+        for error in errors[1:]:
+            print(f"Background write failed: {error}")
+        if errors and raise_errors:
+            raise errors[0]
+
+
+@contextmanager
+def background_writes(max_pending_mb=256, workers=2):
+    """
+    Writes the outputs of the block in the background when background writes
+    are enabled, waiting for them at the end of the block, where write errors
+    are raised.
+
+    Parameters:
+    max_pending_mb (float): Memory cap of the queued outputs.
+    workers (int): Number of writing threads.
+
+    Yields:
+    OutputWriter: The writer, or None when background writes are disabled.
+
+    Example:
+    with background_writes():
+        for category, df in density_data.items():
+            write_csv(df, f"density_{category}.csv", index=False)
+    """
+    if not _ENABLED:
+        yield None
+        return
+
+    writer = OutputWriter(max_pending_mb, workers)
+    previous = getattr(_local, "writer", None)
+    _local.writer = writer
+    try:
+        yield writer
+    except BaseException:
+        _local.writer = previous
+        # The block's own error takes precedence over the write errors
+        writer.close(raise_errors=False)
+        raise
+    _local.writer = previous
+    writer.close()
+
+
+def _current_writer():
+    return getattr(_local, "writer", None)
+
+
+def after_writes(callback):
+    """
+    Calls `callback(failed_paths)` once the outputs queued so far are written:
+    at the end of the open `background_writes` block, or right away (with no
+    failed path) when the writes are not in the background.
+    """
+    writer = _current_writer()
+    if writer is None:
+        callback(set())
+        return
+    writer.after_writes(callback)
+
+
+def write_csv(df, path, **kwargs):
+    """Writes a DataFrame with `to_csv`, in the background if a writer is open."""
+    writer = _current_writer()
+    if writer is None:
+        df.to_csv(path, **kwargs)
+        return
+    nbytes = int(df.memory_usage(index=True).sum())
+    writer.submit(path, lambda target: df.to_csv(target, **kwargs), nbytes)
+
+
+def write_excel(df, path, **kwargs):
+    """Writes a DataFrame with `to_excel`, in the background if a writer is open."""
+    writer = _current_writer()
+    if writer is None:
+        df.to_excel(path, **kwargs)
+        return
+    nbytes = int(df.memory_usage(index=True).sum())
+    writer.submit(path, lambda target: df.to_excel(target, **kwargs), nbytes)
+
+
+def write_figure(figure, path, **savefig_kwargs):
+    """
+    Writes a figure with `savefig`.
+
+    Within `background_writes`, PNG and JPEG figures are rasterized right away,
+    so that the figure can be cleared and drawn again, and only the image
+    encoding and writing happen in the background. Other formats are written
+    immediately.
+
+    Parameters:
+    figure (matplotlib.figure.Figure): The figure, on an Agg canvas.
+    path (str): The image path.
+    savefig_kwargs: Options of savefig (including pil_kwargs).
+    """
+    writer = _current_writer()
+    image_format = _RASTER_FORMATS.get(os.path.splitext(path)[1].lower())
+    if writer is None or image_format is None:
+        figure.savefig(path, **savefig_kwargs)
+        return
+
+    pil_kwargs = dict(savefig_kwargs.pop("pil_kwargs", None) or {})
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format="rgba", **savefig_kwargs)
+    rgba = buffer.getvalue()
+    # The canvas keeps the renderer of the last draw, sized like the image
+    # (including a tight bounding box)
+    renderer = getattr(figure.canvas, "renderer", None)
+    size = (int(renderer.width), int(renderer.height)) if renderer else (0, 0)
+    if size[0] * size[1] * 4 != len(rgba):
+        figure.savefig(path, pil_kwargs=pil_kwargs or None, **savefig_kwargs)
+        return
+    dpi = savefig_kwargs.get("dpi", figure.dpi)
+    if dpi == "figure":
+        dpi = figure.dpi
+
+    def encode(target):
+        from PIL import Image
+
+        image = Image.frombuffer("RGBA", size, rgba, "raw", "RGBA", 0, 1)
+        if image_format == "JPEG":
+            image = image.convert("RGB")
+        image.save(target, format=image_format, dpi=(dpi, dpi), **pil_kwargs)
+
+    writer.submit(path, encode, len(rgba))
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+
+from .result_cube import as_frame
+
+
+# PD term analysed when none is given
+DEFAULT_PD_TERM = 5
+
+
+class PDTermSet:
+    """
+    The PD results of every term, loaded once.
+
+    Rows are ordered by term, so the rows of one term are a contiguous range
+    and `view` slices them without copying or scanning the term column. The
+    sort is stable and keeps the original index, so the rows of one term come
+    in file order with their row labels in pds.csv, as with a boolean filter
+    on the term column.
+    """
+
+    def __init__(self, pd_df):
+        """
+        Parameters:
+        pd_df (pd.DataFrame): PD results of all terms, with a 'term' column.
+        """
+        order = np.argsort(pd_df["term"].to_numpy(), kind="stable")
+        self.frame = pd_df.iloc[order]
+        terms = self.frame["term"].to_numpy()
+        self.terms = pd.unique(terms).tolist()
+        starts = np.searchsorted(terms, self.terms, side="left")
+        stops = np.searchsorted(terms, self.terms, side="right")
+        self._bounds = dict(zip(self.terms, zip(starts, stops)))
+
+    def __repr__(self):
+        return f"<PDTermSet terms={self.terms}, {len(self.frame)} rows>"
+
+    def __len__(self):
+        return len(self.frame)
+
+    def __contains__(self, term):
+        return term in self._bounds
+
+    def view(self, term):
+        """Returns the rows of one term."""
+        if term not in self._bounds:
+            raise KeyError(f"No PD results for term {term} (terms: {self.terms})")
+        start, stop = self._bounds[term]
+        return self.frame.iloc[start:stop]
+
+    def select(self, terms):
+        """Returns the rows of several terms, with their 'term' column."""
+        return pd.concat([self.view(term) for term in terms])
+
+
+def pd_term_set(data):
+    """
+    Returns PD results as a PDTermSet, building it from a DataFrame (or
+    ResultCube) with a 'term' column when needed.
+    """
+    if isinstance(data, PDTermSet):
+        return data
+    return PDTermSet(as_frame(data))
+
+
+def map_terms(data, term, compute):
+    """
+    Applies a computation to the PD results of one term or of several terms.
+
+    Parameters:
+    data (PDTermSet or pd.DataFrame): PD results of all terms.
+    term (int or list): A term, a list of terms, or None for DEFAULT_PD_TERM.
+    compute (callable): Function of the PD DataFrame of a single term.
+
+    Returns:
+    The result of `compute` for a single term, or a dict term -> result for a
+    list of terms.
+    """
+    terms = pd_term_set(data)
+    if term is None:
+        return compute(terms.view(DEFAULT_PD_TERM))
+    if np.ndim(term) == 0:
+        return compute(terms.view(term))
+    return {single_term: compute(terms.view(single_term)) for single_term in term}
+
+
+def needs_term_selection(data, term):
+    """
+    Returns whether PD results still hold several terms (or a term was
+    requested), so that a function must go through `map_terms`.
+    """
+    return term is not None or isinstance(data, PDTermSet)
@@ -0,0 +1,768 @@
+import os
+import json
+import time
+import argparse
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import pandas as pd
+
+from .figure_manifest import set_skip_unchanged
+from .instrumentation import (
+    add_rows,
+    record_output,
+    set_instrumentation,
+    stage,
+    stage_summary,
+    write_stage_summary,
+)
+from .output_writer import background_writes, set_background_writes, write_csv
+from .precision import get_compute_dtype, set_compute_dtype
+from .render_profiles import get_render_profile, set_render_profile
+from .tracing import start_tracing, stop_tracing
+from .utils import load_data, load_pd_terms
+
+
+# Runs simulated by the R analysis and compared by the quadrant plots
+DEFAULT_RUN_PARAMS = [
+    {
+        "baseline_scenario": baseline_scenario,
+        "target_scenario": target_scenario,
+        "shock_year": shock_year,
+        "scenario_geography": geography,
+    }
+    for baseline_scenario, target_scenario, geography in [
+        ("NGFS2023GCAM_CP", "NGFS2023GCAM_B2DS", "India"),
+        ("NGFS2023GCAM_CP", "NGFS2023GCAM_NZ2050", "India"),
+        ("NGFS2023REMIND_CP", "NGFS2023REMIND_NZ2050", "India"),
+        ("NGFS2023REMIND_CP", "NGFS2023REMIND_B2DS", "India"),
+        ("NGFS2023REMIND_CP", "NGFS2023REMIND_NZ2050", "Global"),
+        ("NGFS2023REMIND_CP", "NGFS2023REMIND_B2DS", "Global"),
+    ]
+    for shock_year in [2025, 2030]
+]
+
+# TRISK outputs written by the R analysis and read by the "load" stage
+R_OUTPUT_FILES = ["npvs.csv", "pds.csv", "params.csv", "trajectories.csv"]
+
+# Folder where completed stages leave a stamp, relative to the data folder
+STAMP_FOLDER = ".pipeline"
+
+# Folder of the out_of_core stage's statistics and plots, relative to the
+# data folder
+OUT_OF_CORE_FOLDER = "out_of_core"
+
+
+class PipelineConfig:
+    """
+    Folders and settings shared by the pipeline stages.
+
+    Parameters:
+    data_folder (str): Folder of the TRISK outputs; plots are written under it.
+    trisk_input_path (str): Folder of the TRISK inputs of the R analysis.
+    run_params (list): Run parameters of the R analysis and quadrant plots.
+    country_iso2 (str): Country analysed by the R analysis.
+    sector (str): Sector analysed by the R analysis.
+    memory_budget_mb (int): Memory budget of the out-of-core stage and of the
+        bootstrap resampling.
+    n_bootstrap (int): Bootstrap replicates of the technology statistics
+        confidence intervals, 0 for none.
+    seed (int): Seed of the bootstrap resampling.
+    confidence (float): Confidence level of the bootstrap intervals.
+    portfolio_file (str): CSV file of portfolio holdings (portfolio_id,
+        company_id, exposure) of the portfolio aggregation.
+    slice_cache_path (str): Folder of the TRISK inputs sliced by the R
+        analysis, by default under the data folder.
+    """
+
+    def __init__(
+        self,
+        data_folder,
+        trisk_input_path=None,
+        run_params=None,
+        country_iso2="IN",
+        sector="Power",
+        memory_budget_mb=1024,
+        n_bootstrap=0,
+        seed=0,
+        confidence=0.95,
+        portfolio_file=None,
+        slice_cache_path=None,
+    ):
+        self.data_folder = data_folder
+        self.trisk_input_path = trisk_input_path
+        self.run_params = run_params or DEFAULT_RUN_PARAMS
+        self.country_iso2 = country_iso2
+        self.sector = sector
+        self.memory_budget_mb = memory_budget_mb
+        self.n_bootstrap = n_bootstrap
+        self.seed = seed
+        self.confidence = confidence
+        self.portfolio_file = portfolio_file
+        self.slice_cache_path = slice_cache_path
+
+    def path(self, *parts):
+        """Returns a path under the data folder."""
+        return os.path.join(self.data_folder, *parts)
+
+
+# Stage functions import their modules when they run, so that rpy2 and
+# matplotlib are only loaded by the stages using them.
+
+
+def _run_r_analysis(config, inputs):
+    from .generate_data import run_r_analysis
+
+    if config.trisk_input_path is None:
+        raise ValueError("The r_analysis stage needs a TRISK input folder")
+    run_r_analysis(
+        config.trisk_input_path,
+        config.data_folder,
+        config.run_params,
+        config.country_iso2,
+        config.sector,
+        slice_cache_path=config.slice_cache_path,
+    )
+
+
+def _load(config, inputs):
+    data = load_data(config.data_folder)
+    if data[0] is None:
+        raise FileNotFoundError(f"TRISK outputs missing in {config.data_folder}")
+    add_rows(sum(len(df) for df in data))
+    return data
+
+
+def _technology_stats(config, inputs):
+    from .technology_stats import generate_technology_stats
+
+    npv_df, pd_df, params_df, _ = inputs["load"]
+    generate_technology_stats(
+        npv_df,
+        params_df,
+        config.path("statdesc.xlsx"),
+        n_bootstrap=config.n_bootstrap,
+        seed=config.seed,
+        confidence=config.confidence,
+        max_memory_mb=config.memory_budget_mb,
+    )
+
+
+def _density_plots(config, inputs):
+    from .distribution_plots import plot_density_distributions
+
+    npv_df, pd_df, params_df, _ = inputs["load"]
+    plot_density_distributions(
+        npv_df, pd_df, params_df, config.path("plots_distributions")
+    )
+
+
+def _histogram_plots(config, inputs):
+    from .distribution_plots import plot_barplot_distributions
+
+    npv_df, pd_df, params_df, _ = inputs["load"]
+    plot_barplot_distributions(
+        npv_df, pd_df, params_df, config.path("plots_histograms")
+    )
+
+
+def _grouped_plots(config, inputs):
+    from .grouped_distrib_plots import plot_grouped_distributions
+
+    npv_df, pd_df, params_df, _ = inputs["load"]
+    plots_folder = config.path("plots_distributions_grouped")
+    plot_grouped_distributions(
+        npv_df, params_df, plots_folder, "net_present_value_change", "technology"
+    )
+    plot_grouped_distributions(
+        pd_df, params_df, plots_folder, "pd_difference", "sector"
+    )
+
+
+def _individual_densities(config, inputs):
+    from .extract_individual_distributions_data import (
+        extract_comparison_density,
+        extract_density_individual_distributions,
+    )
+
+    npv_df, pd_df, params_df, _ = inputs["load"]
+    return {
+        extract.__name__: extract(
+            npv_df,
+            params_df,
+            "net_present_value_change",
+            "technology",
+            config.path("individual_density_data"),
+        )
+        for extract in [
+            extract_density_individual_distributions,
+            extract_comparison_density,
+        ]
+    }
+
+
+def _individual_plots(config, inputs):
+    from .individual_distribution_plots import (
+        plot_comparison_between_shock_years,
+        plot_individual_distributions_by_technology,
+    )
+
+    npv_df, pd_df, params_df, _ = inputs["load"]
+    # The densities computed by individual_densities when it ran too. The
+    # saved CSVs are not read back: they leave out the single-value runs and
+    # incomplete comparisons, and may be left over from other parameters.
+    densities = inputs.get("individual_densities") or {}
+    plots_folder = config.path("plots_individual_comparisons")
+    plot_individual_distributions_by_technology(
+        npv_df,
+        params_df,
+        plots_folder,
+        "net_present_value_change",
+        "technology",
+        density_data=densities.get("extract_density_individual_distributions"),
+    )
+    plot_comparison_between_shock_years(
+        npv_df,
+        params_df,
+        plots_folder,
+        "net_present_value_change",
+        "technology",
+        density_data=densities.get("extract_comparison_density"),
+    )
+
+
+def _comparison_barplots(config, inputs):
+    from .individual_distribution_plots import (
+        plot_comparison_between_shock_years_barplot,
+    )
+
+    npv_df, pd_df, params_df, _ = inputs["load"]
+    plot_comparison_between_shock_years_barplot(
+        npv_df,
+        params_df,
+        config.path("plots_individual_comparisons_bar"),
+        "net_present_value_change",
+        "technology",
+    )
+
+
+def _pd_term_structure(config, inputs):
+    from .extract_histogram_data import (
+        extract_histogram_data_by_category,
+        save_histogram_data,
+    )
+    from .grouped_distrib_plots import plot_grouped_distributions
+
+    # Every term, from a single read of pds.csv
+    terms = load_pd_terms(config.data_folder)
+    params_df = pd.read_csv(config.path("params.csv"))
+    add_rows(len(terms))
+    folder = config.path("pd_term_structure")
+    plot_grouped_distributions(
+        terms, params_df, folder, "pd_difference", "sector", term=terms.terms
+    )
+    histograms = extract_histogram_data_by_category(
+        terms, params_df, "pd_difference", "sector", term=terms.terms
+    )
+    for term, histogram_data in histograms.items():
+        term_folder = os.path.join(folder, f"term_{term}", "histogram_data")
+        os.makedirs(term_folder, exist_ok=True)
+        save_histogram_data(histogram_data, term_folder)
+
+
+def _distribution_distances(config, inputs):
+    from .distribution_distances import extract_distribution_distances
+
+    npv_df, pd_df, params_df, _ = inputs["load"]
+    extract_distribution_distances(
+        npv_df,
+        params_df,
+        "net_present_value_change",
+        "technology",
+        config.path("distribution_distances", "npv.csv"),
+    )
+    extract_distribution_distances(
+        pd_df,
+        params_df,
+        "pd_difference",
+        "sector",
+        config.path("distribution_distances", "pd.csv"),
+    )
+
+
+def _trajectory_analytics(config, inputs):
+    from .trajectory_analytics import aggregate_trajectories, plot_cumulative_gaps
+
+    npv_df, pd_df, params_df, trajectories_df = inputs["load"]
+    panel = aggregate_trajectories(trajectories_df)
+    panel.save(config.path("trajectory_analytics", "run_technology_panel.npz"))
+    output_file = config.path("trajectory_analytics", "run_technology_summary.csv")
+    write_csv(panel.join_npv(npv_df), output_file, index=False)
+    record_output(output_file)
+    plot_cumulative_gaps(
+        panel, params_df, config.path("trajectory_analytics", "plots_cumulative_gap")
+    )
+
+
+def _portfolio_aggregation(config, inputs):
+    from .portfolio_aggregation import extract_portfolio_aggregation, load_portfolios
+
+    if config.portfolio_file is None:
+        raise ValueError("The portfolio_aggregation stage needs a portfolio file")
+    npv_df, pd_df, params_df, _ = inputs["load"]
+    extract_portfolio_aggregation(
+        load_portfolios(config.portfolio_file),
+        npv_df,
+        pd_df,
+        params_df,
+        config.path("portfolio_aggregation.csv"),
+    )
+
+
+def _quadrant_plots(config, inputs):
+    from .quadrant_plots import plot_bivariate_scenarios_quadrants
+
+    npv_df, pd_df, params_df, _ = inputs["load"]
+    plots_folder = config.path("plots_quadrants")
+    os.makedirs(plots_folder, exist_ok=True)
+    # Compare each pair of runs once
+    for i, params1 in enumerate(config.run_params):
+        for params2 in config.run_params[i + 1 :]:
+            plot_bivariate_scenarios_quadrants(
+                npv_df, pd_df, params_df, params1, params2, plots_folder
+            )
+
+
+def _out_of_core(config, inputs):
+    from .distribution_plots import plot_reduced_distributions
+    from .out_of_core import reduce_distributions, streamed_technology_stats
+
+    # Written apart from the outputs of technology_stats, density_plots and
+    # histogram_plots, which the binned streamed results must not replace
+    params_df = pd.read_csv(config.path("params.csv"))
+    for dataset in ["npv", "pd"]:
+        reduced = reduce_distributions(
+            config.data_folder,
+            params_df,
+            dataset,
+            memory_budget_mb=config.memory_budget_mb,
+        )
+        if reduced is None:
+            continue
+        if dataset == "npv":
+            streamed_technology_stats(
+                reduced, params_df, config.path(OUT_OF_CORE_FOLDER, "statdesc.xlsx")
+            )
+        plot_reduced_distributions(
+            reduced,
+            params_df,
+            config.path(OUT_OF_CORE_FOLDER, "plots_distributions", dataset),
+            config.path(OUT_OF_CORE_FOLDER, "plots_histograms", f"{dataset}_barplot"),
+        )
+
+
+# Stages of the pipeline: the stages they depend on, the function running
+# them, and the files they write (relative to the data folder). Stages
+# without "outputs" leave a stamp in STAMP_FOLDER when they complete, except
+# "in_memory" ones, which hand their result to the stages depending on them.
+# The stamp records the "settings" of the stage, PipelineConfig attributes
+# whose change makes it stale.
+PIPELINE_STAGES = {
+    "r_analysis": {
+        "depends": [],
+        "run": _run_r_analysis,
+        "outputs": R_OUTPUT_FILES,
+    },
+    "load": {"depends": ["r_analysis"], "run": _load, "in_memory": True},
+    "technology_stats": {
+        "depends": ["load"],
+        "run": _technology_stats,
+        "settings": ["n_bootstrap", "seed", "confidence", "memory_budget_mb"],
+    },
+    "density_plots": {"depends": ["load"], "run": _density_plots},
+    "histogram_plots": {"depends": ["load"], "run": _histogram_plots},
+    "grouped_plots": {"depends": ["load"], "run": _grouped_plots},
+    "individual_densities": {"depends": ["load"], "run": _individual_densities},
+    "individual_plots": {
+        "depends": ["load", "individual_densities"],
+        "run": _individual_plots,
+    },
+    "comparison_barplots": {"depends": ["load"], "run": _comparison_barplots},
+    "distribution_distances": {
+        "depends": ["load"],
+        "run": _distribution_distances,
+        "outputs": ["distribution_distances/npv.csv", "distribution_distances/pd.csv"],
+    },
+    "pd_term_structure": {"depends": ["r_analysis"], "run": _pd_term_structure},
+    "trajectory_analytics": {"depends": ["load"], "run": _trajectory_analytics},
+    "portfolio_aggregation": {
+        "depends": ["load"],
+        "run": _portfolio_aggregation,
+        "outputs": ["portfolio_aggregation.csv"],
+    },
+    "quadrant_plots": {"depends": ["load"], "run": _quadrant_plots},
+    "out_of_core": {"depends": ["r_analysis"], "run": _out_of_core},
+}
+
+# Stages run when no target is given: the outputs of the former scripts.
+# The later analyses (distribution_distances, trajectory_analytics, ...) are
+# run by naming them.
+DEFAULT_TARGETS = [
+    "technology_stats",
+    "density_plots",
+    "histogram_plots",
+    "grouped_plots",
+    "individual_plots",
+    "comparison_barplots",
+]
+
+
+def _in_memory(name):
+    return PIPELINE_STAGES[name].get("in_memory", False)
+
+
+def _stamp_path(config, name):
+    return config.path(STAMP_FOLDER, f"{name}.json")
+
+
+def _settings(config, name):
+    """
+    Returns the settings that change the outputs of a stage: those shared by
+    every stage and the stage's own "settings".
+    """
+    settings = {
+        "render_profile": get_render_profile(),
+        "compute_dtype": str(get_compute_dtype()),
+    }
+    for attribute in PIPELINE_STAGES[name].get("settings", []):
+        settings[attribute] = getattr(config, attribute)
+    return settings
+
+
+def _mtime(path):
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+
+def _input_files(config, name):
+    """Returns the files whose changes make a stage stale."""
+    if name == "r_analysis":
+        source = config.trisk_input_path
+        if source is None or not os.path.isdir(source):
+            return []
+        return [
+            os.path.join(folder, filename)
+            for folder, _, filenames in os.walk(source)
+            for filename in filenames
+        ]
+    files = []
+    if name == "portfolio_aggregation" and config.portfolio_file is not None:
+        files.append(config.portfolio_file)
+    for dependency in PIPELINE_STAGES[name]["depends"]:
+        if _in_memory(dependency):
+            files.extend(_input_files(config, dependency))
+        else:
+            files.extend(_output_files(config, dependency))
+    return files
+
+
+def _output_files(config, name):
+    """Returns the files showing that a stage has completed."""
+    outputs = PIPELINE_STAGES[name].get("outputs")
+    if outputs is not None:
+        return [config.path(output) for output in outputs]
+    return [_stamp_path(config, name)]
+
+
+def is_stale(config, name):
+    """
+    Returns whether a stage must run again: one of its outputs is missing,
+    older than one of its inputs, or was made with other settings.
+
+    Parameters:
+    config (PipelineConfig): The pipeline folders.
+    name (str): The stage name.
+    """
+    output_times = [_mtime(path) for path in _output_files(config, name)]
+    if not output_times or None in output_times:
+        return True
+    input_times = [_mtime(path) for path in _input_files(config, name)]
+    if max([t for t in input_times if t is not None], default=0) > min(output_times):
+        return True
+    if PIPELINE_STAGES[name].get("outputs") is None:
+        with open(_stamp_path(config, name)) as f:
+            return json.load(f).get("settings") != _settings(config, name)
+    return False
+
+
+def plan_stages(config, targets, force=False):
+    """
+    Returns the stages to run to bring the targets up to date: the targets and
+    dependencies that are stale, the stages downstream of them, and the
+    in-memory stages they need.
+
+    Parameters:
+    config (PipelineConfig): The pipeline folders.
+    targets (list): Names of the requested stages.
+    force (bool): Whether to run the targets even when they are up to date.
+
+    Returns:
+    list: The stage names, in dependency order.
+    """
+    unknown = [name for name in targets if name not in PIPELINE_STAGES]
+    if unknown:
+        raise ValueError(f"Unknown stages: {', '.join(unknown)}")
+
+    # Requested stages and their dependencies, dependencies first
+    ordered = []
+
+    def visit(name):
+        if name in ordered:
+            return
+        for dependency in PIPELINE_STAGES[name]["depends"]:
+            visit(dependency)
+        ordered.append(name)
+
+    for name in targets:
+        visit(name)
+
+    # Stages whose outputs will change, including in-memory ones
+    to_run = set()
+    changed = set()
+    for name in ordered:
+        upstream_changed = any(
+            dependency in changed for dependency in PIPELINE_STAGES[name]["depends"]
+        )
+        if _in_memory(name):
+            if upstream_changed:
+                changed.add(name)
+            if name in targets:
+                to_run.add(name)
+            continue
+        if upstream_changed or (force and name in targets) or is_stale(config, name):
+            to_run.add(name)
+            changed.add(name)
+
+    # In-memory stages run whenever a stage using them runs
+    for name in reversed(ordered):
+        if name in to_run:
+            for dependency in PIPELINE_STAGES[name]["depends"]:
+                if _in_memory(dependency):
+                    to_run.add(dependency)
+    return [name for name in ordered if name in to_run]
+
+
+def run_pipeline(config, targets=None, force=False, workers=4, dry_run=False):
+    """
+    Runs the requested stages and their stale dependencies, running stages
+    whose dependencies are complete concurrently in a pool of threads.
+
+    When a stage fails, running stages finish, no new stage starts and the
+    error is raised.
+
+    Parameters:
+    config (PipelineConfig): The pipeline folders.
+    targets (list): Names of the requested stages, DEFAULT_TARGETS by default.
+    force (bool): Whether to run the targets even when they are up to date.
+    workers (int): Number of stages run at the same time.
+    dry_run (bool): Whether to only print the stages that would run.
+
+    Returns:
+    list: The names of the stages that ran (or would run).
+    """
+    planned = plan_stages(config, targets or DEFAULT_TARGETS, force=force)
+    if not planned:
+        print("All stages are up to date.")
+        return planned
+    print(f"Stages to run: {', '.join(planned)}")
+    if dry_run:
+        return planned
+
+    results = {}
+    pending = list(planned)
+    running = {}
+    error = None
+
+    def run(name):
+        spec = PIPELINE_STAGES[name]
+        inputs = {dep: results[dep] for dep in spec["depends"] if dep in results}
+        # The stage ends once its queued outputs are written
+        with stage(name), background_writes():
+            result = spec["run"](config, inputs)
+        if not _in_memory(name) and spec.get("outputs") is None:
+            stamp = _stamp_path(config, name)
+            os.makedirs(os.path.dirname(stamp), exist_ok=True)
+            with open(stamp, "w") as f:
+                json.dump({"settings": _settings(config, name)}, f)
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        while pending or running:
+            if error is None:
+                for name in list(pending):
+                    if all(
+                        dep not in pending and dep not in running.values()
+                        for dep in PIPELINE_STAGES[name]["depends"]
+                    ):
+                        print(f"Starting stage {name}")
+                        running[executor.submit(run, name)] = name
+                        pending.remove(name)
+            else:
+                pending.clear()
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                    print(f"Stage {name} completed")
+                except Exception as e:
+                    print(f"Stage {name} failed: {e}")
+                    error = error or e
+    if error is not None:
+        raise error
+    return planned
+
+
+def main(argv=None):
+    """
+    Command-line entry point of the pipeline (`python -m variability_analysis`).
+
+    Parameters:
+    argv (list): Command-line arguments, sys.argv by default.
+    """
+    parser = argparse.ArgumentParser(
+        prog="variability_analysis",
+        description="Runs the stages of the TRISK variability analysis.",
+    )
+    parser.add_argument(
+        "targets",
+        nargs="*",
+        help=f"Stages to bring up to date (default: {' '.join(DEFAULT_TARGETS)}).",
+    )
+    parser.add_argument(
+        "--data-folder",
+        default=os.path.join("workspace", "india_variability_analysis_INDIA_geo_2"),
+        help="Folder of the TRISK outputs, where the plots are written.",
+    )
+    parser.add_argument(
+        "--trisk-input",
+        default=os.path.join("workspace", "ST_INPUTS_AI_COUNTRIES"),
+        help="Folder of the TRISK inputs of the r_analysis stage.",
+    )
+    parser.add_argument(
+        "--run-params",
+        help="JSON file with the list of run parameters of the R analysis.",
+    )
+    parser.add_argument(
+        "--slice-cache",
+        help="Folder of the sliced TRISK inputs (default: under the data folder).",
+    )
+    parser.add_argument("--country", default="IN", help="Country ISO2 code.")
+    parser.add_argument("--sector", default="Power", help="Sector to analyse.")
+    parser.add_argument(
+        "--workers", type=int, default=4, help="Number of concurrent stages."
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="Run the targets even if up to date."
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Only print the stages to run."
+    )
+    parser.add_argument("--list", action="store_true", help="List the stages.")
+    parser.add_argument(
+        "--profile", default="publication", help="Rendering profile of the plots."
+    )
+    parser.add_argument(
+        "--dtype", default="float64", help="Compute dtype (float64 or float32)."
+    )
+    parser.add_argument(
+        "--rerender",
+        action="store_true",
+        help="Render every figure, including unchanged ones.",
+    )
+    parser.add_argument(
+        "--memory-budget-mb",
+        type=int,
+        default=1024,
+        help="Memory budget of the out_of_core stage and the bootstrap.",
+    )
+    parser.add_argument(
+        "--bootstrap",
+        type=int,
+        default=0,
+        help="Bootstrap replicates of the technology_stats confidence intervals.",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="Seed of the bootstrap resampling."
+    )
+    parser.add_argument(
+        "--portfolios",
+        help="CSV file of portfolio holdings of the portfolio_aggregation stage.",
+    )
+    parser.add_argument(
+        "--sync-writes",
+        action="store_true",
+        help="Write the output files from the stages instead of background threads.",
+    )
+    parser.add_argument(
+        "--no-summary",
+        action="store_true",
+        help="Do not write stage_summary.json.",
+    )
+    parser.add_argument(
+        "--trace", action="store_true", help="Write a trace.json span timeline."
+    )
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for name, spec in PIPELINE_STAGES.items():
+            depends = ", ".join(spec["depends"]) or "-"
+            print(f"{name:22} depends on: {depends}")
+        return
+
+    run_params = None
+    if args.run_params:
+        with open(args.run_params) as f:
+            run_params = json.load(f)
+    config = PipelineConfig(
+        args.data_folder,
+        trisk_input_path=args.trisk_input,
+        run_params=run_params,
+        country_iso2=args.country,
+        sector=args.sector,
+        memory_budget_mb=args.memory_budget_mb,
+        n_bootstrap=args.bootstrap,
+        seed=args.seed,
+        portfolio_file=args.portfolios,
+        slice_cache_path=args.slice_cache,
+    )
+    set_render_profile(args.profile)
+    set_compute_dtype(args.dtype)
+    set_skip_unchanged(not args.rerender)
+    set_instrumentation(not args.no_summary)
+    set_background_writes(not args.sync_writes)
+    if args.trace:
+        start_tracing()
+    start = time.perf_counter()
+    try:
+        run_pipeline(
+            config,
+            targets=args.targets,
+            force=args.force,
+            workers=args.workers,
+            dry_run=args.dry_run,
+        )
+    finally:
+        if not args.dry_run:
+            # Keep the summary of the last run that did something
+            if not args.no_summary and stage_summary():
+                write_stage_summary(
+                    config.path("stage_summary.json"),
+                    wall_s=time.perf_counter() - start,
+                )
+            if args.trace:
+                stop_tracing(config.path("trace.json"))
+
+
+if __name__ == "__main__":
+    main()
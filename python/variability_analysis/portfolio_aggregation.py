@@ -0,0 +1,309 @@
+import os
+import numpy as np
+import pandas as pd
+
+from .instrumentation import add_rows, record_output
+from .output_writer import write_csv
+from .pd_terms import DEFAULT_PD_TERM, PDTermSet
+from .result_cube import as_frame
+from .run_catalog import PARAMETER_COLUMNS
+from .tracing import span
+
+
+class ExposureMatrix:
+    """
+    Exposures of many portfolios to companies (or assets), as a sparse
+    portfolio x entity matrix in compressed sparse row form: the exposures of
+    portfolio i are `data[indptr[i]:indptr[i + 1]]`, to the entities at the
+    same positions of `indices`.
+    """
+
+    def __init__(self, portfolios, entities, indptr, indices, data):
+        """
+        Parameters:
+        portfolios (pd.Index): Portfolio of each row.
+        entities (pd.Index): Entity (company_id or asset_id) of each column.
+        indptr (np.ndarray): Start of each row in indices and data, plus the end.
+        indices (np.ndarray): Column of each stored exposure.
+        data (np.ndarray): The stored exposures.
+        """
+        self.portfolios = portfolios
+        self.entities = entities
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+
+    @property
+    def shape(self):
+        return (len(self.portfolios), len(self.entities))
+
+    def __repr__(self):
+        return (
+            f"<ExposureMatrix {len(self.portfolios)} portfolios x "
+            f"{len(self.entities)} entities, {len(self.data)} exposures>"
+        )
+
+    def dot(self, values):
+        """
+        Multiplies the matrix by an (entities, columns) array.
+
+        Each stored exposure scales its entity's row, and the rows of each
+        portfolio are summed with one `np.add.reduceat` over the row segments.
+
+        Returns:
+        np.ndarray: The (portfolios, columns) product.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        products = self.data[:, None] * values[self.indices]
+        result = np.zeros((len(self.portfolios), values.shape[1]))
+        starts = self.indptr[:-1]
+        filled = self.indptr[1:] > starts
+        if filled.any():
+            result[filled] = np.add.reduceat(products, starts[filled], axis=0)
+        return result
+
+    def weighted_mean(self, values):
+        """
+        Exposure-weighted means of an (entities, columns) array, ignoring NaN
+        values: the exposures of entities without a value are left out of
+        both the numerator and the denominator.
+
+        Returns:
+        tuple: The (portfolios, columns) weighted means and the exposure
+        covered by values.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        present = ~np.isnan(values)
+        covered = self.dot(present)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = self.dot(np.where(present, values, 0.0)) / covered
+        return means, covered
+
+
+def load_portfolios(path, entity_column="company_id"):
+    """
+    Loads a portfolio file: a CSV with columns portfolio_id (optional),
+    company_id (or another entity column) and exposure.
+
+    Parameters:
+    path (str): The CSV file.
+    entity_column (str): The entity column of the file.
+
+    Returns:
+    pd.DataFrame: The holdings, with a single 'portfolio' when the file has
+    no portfolio_id column.
+    """
+    portfolios_df = pd.read_csv(path)
+    missing = {entity_column, "exposure"} - set(portfolios_df.columns)
+    if missing:
+        raise ValueError(f"Columns missing in {path}: {', '.join(sorted(missing))}")
+    if "portfolio_id" not in portfolios_df.columns:
+        portfolios_df["portfolio_id"] = "portfolio"
+    return portfolios_df
+
+
+def exposure_matrix(portfolios_df, entities, entity_column="company_id"):
+    """
+    Builds the sparse portfolio x entity exposure matrix of holdings.
+
+    Repeated holdings of an entity in a portfolio are summed. Holdings of
+    entities absent from `entities` are dropped, with a message; portfolios
+    left without holdings keep an empty row.
+
+    Parameters:
+    portfolios_df (pd.DataFrame): Holdings with portfolio_id, entity and
+        exposure columns.
+    entities (pd.Index): The entities of the matrix columns.
+    entity_column (str): The entity column.
+
+    Returns:
+    ExposureMatrix: The exposures.
+    """
+    columns = entities.get_indexer(portfolios_df[entity_column])
+    known = columns >= 0
+    if not known.all():
+        print(
+            f"Ignoring {int((~known).sum())} holdings of {entity_column} "
+            "without TRISK results"
+        )
+    holdings = pd.DataFrame(
+        {
+            "portfolio_id": portfolios_df["portfolio_id"].to_numpy()[known],
+            "column": columns[known],
+            "exposure": portfolios_df["exposure"].to_numpy(dtype=np.float64)[known],
+        }
+    )
+    # Sorted by portfolio, then by column, as compressed sparse rows
+    holdings = holdings.groupby(["portfolio_id", "column"], sort=True).sum()
+    portfolios = np.sort(portfolios_df["portfolio_id"].unique())
+    row_codes = pd.Index(portfolios).get_indexer(
+        holdings.index.get_level_values("portfolio_id")
+    )
+    indptr = np.zeros(len(portfolios) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(row_codes, minlength=len(portfolios)), out=indptr[1:])
+    return ExposureMatrix(
+        pd.Index(portfolios, name="portfolio_id"),
+        entities,
+        indptr,
+        holdings.index.get_level_values("column").to_numpy(),
+        holdings["exposure"].to_numpy(),
+    )
+
+
+def entity_run_matrix(data_df, value_columns, entity_column, run_ids, how="sum"):
+    """
+    Sums (or averages) value columns per entity and run into (entities, runs)
+    arrays.
+
+    Parameters:
+    data_df (pd.DataFrame): Results with run_id, entity and value columns.
+    value_columns (list): The reduced columns.
+    entity_column (str): The entity column.
+    run_ids (pd.Index): The runs of the matrix columns.
+    how (str): 'sum' for additive values (e.g. NPVs of the assets of a
+        company), 'mean' for the others (e.g. PDs of the sectors of a company).
+
+    Returns:
+    tuple: The entities (pd.Index) and a dict column -> (entities, runs)
+    array, NaN for the entities without rows in a run and for those with a
+    NaN value among their rows, whose sum would be partial.
+    """
+    if how not in ("sum", "mean"):
+        raise ValueError(f"Unknown reduction: {how}")
+    entity_codes, entities = pd.factorize(data_df[entity_column], sort=True)
+    run_codes = run_ids.get_indexer(data_df["run_id"])
+    known = run_codes >= 0
+    cells = entity_codes[known] * len(run_ids) + run_codes[known]
+    shape = (len(entities), len(run_ids))
+    n_cells = shape[0] * shape[1]
+    counts = np.bincount(cells, minlength=n_cells).reshape(shape)
+    matrices = {}
+    for column in value_columns:
+        values = data_df[column].to_numpy(dtype=np.float64)[known]
+        present = ~np.isnan(values)
+        sums = np.bincount(
+            cells[present], weights=values[present], minlength=n_cells
+        ).reshape(shape)
+        complete = (counts > 0) & (
+            np.bincount(cells[~present], minlength=n_cells).reshape(shape) == 0
+        )
+        if how == "mean":
+            sums = sums / np.maximum(counts, 1)
+        matrices[column] = np.where(complete, sums, np.nan)
+    return pd.Index(entities, name=entity_column), matrices
+
+
+def aggregate_portfolios(
+    portfolios_df, npv_df, pd_df, params_df, entity_column="company_id"
+):
+    """
+    Computes the exposure-weighted NPV change and PD difference of each
+    portfolio in each run.
+
+    The NPV change of an entity is that of the sum of its assets' NPVs, and
+    is missing in a run where one of its assets has no NPV; for company
+    holdings, the PD difference is the mean over the company's sectors. Both are
+    arranged as entity x run matrices and multiplied by the sparse portfolio x
+    entity exposure matrix, so all portfolios aggregate in one product.
+
+    Parameters:
+    portfolios_df (pd.DataFrame): Holdings with portfolio_id, entity and
+        exposure columns (see `load_portfolios`).
+    npv_df (pd.DataFrame): NPV results.
+    pd_df (pd.DataFrame or PDTermSet): PD results; DEFAULT_PD_TERM is used
+        for a PDTermSet. Ignored for asset holdings.
+    params_df (pd.DataFrame): The run parameters.
+    entity_column (str): 'company_id' or 'asset_id'.
+
+    Returns:
+    pd.DataFrame: One row per portfolio and run, with the run parameters,
+    the total exposure of the holdings, the exposure covered by NPV (and PD)
+    results, and the weighted_npv_change (and weighted_pd_difference)
+    columns.
+    """
+    npv_df = as_frame(npv_df)
+    run_ids = pd.Index(params_df["run_id"])
+    add_rows(len(portfolios_df))
+
+    n_portfolios = portfolios_df["portfolio_id"].nunique()
+    with span("portfolio_aggregation", portfolios=n_portfolios):
+        entities, npv = entity_run_matrix(
+            npv_df,
+            ["net_present_value_baseline", "net_present_value_shock"],
+            entity_column,
+            run_ids,
+        )
+        with np.errstate(invalid="ignore", divide="ignore"):
+            npv_change = (
+                npv["net_present_value_shock"] - npv["net_present_value_baseline"]
+            ) / npv["net_present_value_baseline"]
+        npv_change[~np.isfinite(npv_change)] = np.nan
+        exposures = exposure_matrix(portfolios_df, entities, entity_column)
+        weighted_npv_change, npv_covered = exposures.weighted_mean(npv_change)
+        # Total exposure, including the holdings without TRISK results
+        total = (
+            portfolios_df.groupby("portfolio_id")["exposure"]
+            .sum()
+            .reindex(exposures.portfolios)
+            .to_numpy()[:, None]
+        )
+
+        columns = {
+            "exposure": np.repeat(total, len(run_ids), axis=1),
+            "npv_covered_exposure": npv_covered,
+            "weighted_npv_change": weighted_npv_change,
+        }
+        if entity_column == "company_id" and pd_df is not None:
+            if isinstance(pd_df, PDTermSet):
+                pd_df = pd_df.view(DEFAULT_PD_TERM)
+            pd_df = as_frame(pd_df)
+            pd_entities, pd_matrix = entity_run_matrix(
+                pd_df, ["pd_difference"], entity_column, run_ids, how="mean"
+            )
+            # Align the PD companies with the NPV ones
+            positions = pd_entities.get_indexer(entities)
+            pd_difference = np.full((len(entities), len(run_ids)), np.nan)
+            found = positions >= 0
+            pd_difference[found] = pd_matrix["pd_difference"][positions[found]]
+            weighted_pd_difference, pd_covered = exposures.weighted_mean(pd_difference)
+            columns["pd_covered_exposure"] = pd_covered
+            columns["weighted_pd_difference"] = weighted_pd_difference
+
+    result = pd.DataFrame(
+        {
+            "portfolio_id": np.repeat(exposures.portfolios, len(run_ids)),
+            "run_id": np.tile(run_ids, len(exposures.portfolios)),
+        }
+    )
+    for column, values in columns.items():
+        result[column] = values.ravel()
+    params = params_df[["run_id"] + PARAMETER_COLUMNS]
+    return result.merge(params, on="run_id", how="left")
+
+
+def extract_portfolio_aggregation(
+    portfolios_df,
+    npv_df,
+    pd_df,
+    params_df,
+    output_file,
+    entity_column="company_id",
+):
+    """
+    Computes the portfolio aggregation of `aggregate_portfolios` and saves it
+    as a CSV table.
+
+    Returns:
+    pd.DataFrame: The aggregation table.
+    """
+    aggregation = aggregate_portfolios(
+        portfolios_df, npv_df, pd_df, params_df, entity_column
+    )
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    write_csv(aggregation, output_file, index=False)
+    record_output(output_file)
+    print(
+        f"Saved the aggregation of {aggregation['portfolio_id'].nunique()} "
+        f"portfolios to {output_file}"
+    )
+    return aggregation
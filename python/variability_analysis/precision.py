@@ -0,0 +1,223 @@
+import os
+import numpy as np
+import pandas as pd
+
+
+# Derived value columns whose precision follows the compute dtype
+VALUE_COLUMNS = ["net_present_value_change", "pd_difference"]
+
+_COMPUTE_DTYPE = np.dtype(np.float64)
+
+
+def set_compute_dtype(dtype):
+    """
+    Sets the floating point type used for value columns, density grids and kernels.
+
+    Parameters:
+    dtype (str or np.dtype): "float64" (default) or "float32".
+    """
+    global _COMPUTE_DTYPE
+    dtype = np.dtype(dtype)
+    if dtype not in (np.float32, np.float64):
+        raise ValueError(f"Unsupported compute dtype: {dtype}")
+    _COMPUTE_DTYPE = dtype
+
+
+def get_compute_dtype():
+    """Returns the floating point type used for value columns and density grids."""
+    return _COMPUTE_DTYPE
+
+
+def cast_value_columns(df):
+    """
+    Casts the derived value columns of a dataframe to the compute dtype, in place.
+
+    The columns are derived in float64 from the raw NPV/PD columns, which stay
+    untouched, so single precision only affects the values being analysed.
+    """
+    for column in VALUE_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype(_COMPUTE_DTYPE)
+    return df
+
+
+def density_grid(x_min, x_max, num_points):
+    """Returns an evaluation grid of `num_points` points in the compute dtype."""
+    return np.linspace(x_min, x_max, num_points, dtype=_COMPUTE_DTYPE)
+
+
+def gaussian_density(values, x_grid):
+    """
+    Evaluates a Gaussian KDE with Scott's bandwidth on the given grid.
+
+    In float64 mode this is `scipy.stats.gaussian_kde`. In float32 mode the
+    kernel matrix is built in single precision, while the bandwidth and the
+    sum over data points are computed in float64.
+
+    Parameters:
+    values (np.ndarray): The data points for which density is computed.
+    x_grid (np.ndarray): The grid over which density is evaluated.
+
+    Returns:
+    np.ndarray: Density values corresponding to x_grid, in the compute dtype.
+    """
+    if _COMPUTE_DTYPE == np.float64:
+        from scipy.stats import gaussian_kde
+
+        return gaussian_kde(values).evaluate(x_grid)
+
+    values = np.asarray(values, dtype=np.float32)
+    n = len(values)
+    std = values.std(dtype=np.float64, ddof=1)
+    if not std > 0:
+        # Same failure as scipy for a degenerate (zero spread) sample
+        raise np.linalg.LinAlgError("Data has zero variance, density is undefined")
+    bandwidth = np.float32(std * n ** (-1 / 5))
+    x_grid = np.asarray(x_grid, dtype=np.float32)
+    density = np.empty(len(x_grid), dtype=np.float64)
+    # Evaluate in blocks of grid points to bound the kernel matrix size
+    block_size = max(1, 2**22 // max(n, 1))
+    for start in range(0, len(x_grid), block_size):
+        z = (x_grid[start : start + block_size, None] - values[None, :]) / bandwidth
+        density[start : start + block_size] = np.exp(np.float32(-0.5) * z * z).sum(
+            axis=1, dtype=np.float64
+        )
+    density /= n * float(bandwidth) * np.sqrt(2 * np.pi)
+    return density.astype(np.float32)
+
+
+def _drift(reference, candidate):
+    """Returns the max absolute and peak-relative differences of two arrays."""
+    reference = np.asarray(reference, dtype=np.float64)
+    candidate = np.asarray(candidate, dtype=np.float64)
+    both = ~(np.isnan(reference) | np.isnan(candidate))
+    if not both.any():
+        return np.nan, np.nan
+    difference = np.abs(reference[both] - candidate[both]).max()
+    scale = np.abs(reference[both]).max()
+    return difference, difference / scale if scale > 0 else np.nan
+
+
+def precision_report(source, output_file):
+    """
+    Runs the density, histogram and statistics extractors in float64 and in
+    float32, and reports how far the single-precision results drift.
+
+    Parameters:
+    source (str): The directory containing the CSV files.
+    output_file (str): Path of the CSV report.
+
+    Returns:
+    pd.DataFrame: One row per compared output with the maximum absolute
+    difference, the difference relative to the output's peak and, for
+    histograms, the number of counts that moved to another bin.
+    """
+    from .utils import load_data
+    from .extract_distributions_data import extract_density_data_by_category
+    from .extract_histogram_data import extract_histogram_data_by_category
+
+    previous_dtype = _COMPUTE_DTYPE
+    results = {}
+    try:
+        for dtype in ("float64", "float32"):
+            set_compute_dtype(dtype)
+            npv_df, pd_df, params_df, _ = load_data(source)
+            results[dtype] = {}
+            for data_df, value_type, category_column in [
+                (npv_df, "net_present_value_change", "technology"),
+                (pd_df, "pd_difference", "sector"),
+            ]:
+                results[dtype][value_type] = {
+                    "density": extract_density_data_by_category(
+                        data_df, params_df, value_type, category_column
+                    ),
+                    "histogram": extract_histogram_data_by_category(
+                        data_df, params_df, value_type, category_column
+                    ),
+                    # Statistics accumulate in float64, as in technology_stats
+                    "stats": data_df[value_type]
+                    .astype(np.float64)
+                    .groupby(data_df[category_column])
+                    .agg(["mean", "std", "median", "min", "max"]),
+                }
+    finally:
+        set_compute_dtype(previous_dtype)
+
+    rows = []
+    for value_type, reference in results["float64"].items():
+        candidate = results["float32"][value_type]
+        for cat, density_df in reference["density"].items():
+            for column in density_df.columns:
+                absolute, relative = _drift(
+                    density_df[column], candidate["density"][cat][column]
+                )
+                rows.append(
+                    {
+                        "value_type": value_type,
+                        "output": "density_x" if column == "x" else "density",
+                        "category": cat,
+                        "series": column,
+                        "max_abs_diff": absolute,
+                        "max_rel_diff": relative,
+                        "moved_counts": np.nan,
+                    }
+                )
+        for cat, histogram_df in reference["histogram"].items():
+            for column in histogram_df.columns:
+                absolute, relative = _drift(
+                    histogram_df[column], candidate["histogram"][cat][column]
+                )
+                moved = np.nan
+                if column.startswith("count_"):
+                    moved = np.nansum(
+                        np.abs(histogram_df[column] - candidate["histogram"][cat][column])
+                    ) / 2
+                rows.append(
+                    {
+                        "value_type": value_type,
+                        "output": "histogram",
+                        "category": cat,
+                        "series": column,
+                        "max_abs_diff": absolute,
+                        "max_rel_diff": relative,
+                        "moved_counts": moved,
+                    }
+                )
+        for statistic in reference["stats"].columns:
+            for cat in reference["stats"].index:
+                absolute, relative = _drift(
+                    [reference["stats"].loc[cat, statistic]],
+                    [candidate["stats"].loc[cat, statistic]],
+                )
+                rows.append(
+                    {
+                        "value_type": value_type,
+                        "output": "stats",
+                        "category": cat,
+                        "series": statistic,
+                        "max_abs_diff": absolute,
+                        "max_rel_diff": relative,
+                        "moved_counts": np.nan,
+                    }
+                )
+
+    report = pd.DataFrame(rows)
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    report.to_csv(output_file, index=False)
+
+    summary = report.groupby(["value_type", "output"])[
+        ["max_abs_diff", "max_rel_diff", "moved_counts"]
+    ].max()
+    print("Float32 drift relative to float64:")
+    print(summary.to_string())
+    return report
+
+
+if __name__ == "__main__":
+    DATA_SOURCE_FOLDER = os.path.join(
+        "workspace", "india_variability_analysis_INDIA_geo_2"
+    )
+    precision_report(
+        DATA_SOURCE_FOLDER,
+        os.path.join(DATA_SOURCE_FOLDER, "precision_report.csv"),
+    )
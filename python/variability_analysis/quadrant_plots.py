@@ -1,12 +1,90 @@
 import os
 import numpy as np
 import pandas as pd
-import matplotlib as mpl
-import matplotlib.pyplot as plt
+from matplotlib.colors import LinearSegmentedColormap, LogNorm
 from matplotlib.patches import Polygon
+from .rendering import figure_template
 from .utils import load_data, filter_data
 
 
+# Above this number of points, quadrant plots shade a pixel-grid count of the
+# points instead of drawing one marker per company
+_AGGREGATE_THRESHOLD = 100_000
+
+# Marker size of the scatter mode, in points^2; also the bin size of the
+# aggregated mode, so both modes have the same resolution
+_MARKER_SIZE = 12
+
+# Grey (the scatter colour) for single points, darkening to black
+_DENSITY_CMAP = LinearSegmentedColormap.from_list("quadrant_density", ["grey", "black"])
+
+
+def set_quadrant_aggregation_threshold(threshold):
+    """
+    Sets the number of points above which quadrant plots are aggregated.
+
+    Parameters:
+    threshold (int): Point count threshold, or None to always draw markers.
+    """
+    global _AGGREGATE_THRESHOLD
+    _AGGREGATE_THRESHOLD = threshold
+
+
+def count_points_on_grid(x, y, extent, shape):
+    """
+    Counts the points falling in each cell of a regular grid.
+
+    Parameters:
+    x (np.ndarray): The x coordinates.
+    y (np.ndarray): The y coordinates.
+    extent (tuple): The grid bounds (x_min, x_max, y_min, y_max).
+    shape (tuple): The number of cells (rows along y, columns along x).
+
+    Returns:
+    np.ndarray: Counts of shape `shape`, row 0 at y_min.
+    """
+    x_min, x_max, y_min, y_max = extent
+    n_rows, n_cols = shape
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    keep = np.isfinite(x) & np.isfinite(y)
+    x, y = x[keep], y[keep]
+
+    cols = ((x - x_min) * (n_cols / (x_max - x_min))).astype(np.intp)
+    rows = ((y - y_min) * (n_rows / (y_max - y_min))).astype(np.intp)
+    # Points on the upper bounds belong to the last cell
+    np.clip(cols, 0, n_cols - 1, out=cols)
+    np.clip(rows, 0, n_rows - 1, out=rows)
+    counts = np.bincount(rows * n_cols + cols, minlength=n_rows * n_cols)
+    return counts.reshape(shape)
+
+
+def _draw_aggregated_points(ax, x, y, extent):
+    """
+    Shades the number of points per marker-sized pixel cell of the axes.
+    Empty cells are left transparent so the quadrants show through; the image
+    is drawn above the quadrants and below the axes lines and the diagonal.
+    """
+    fig = ax.figure
+    box = ax.get_window_extent()
+    cell_pixels = max(np.sqrt(_MARKER_SIZE) * fig.dpi / 72, 1)
+    shape = (
+        max(int(box.height / cell_pixels), 1),
+        max(int(box.width / cell_pixels), 1),
+    )
+    counts = count_points_on_grid(x, y, extent, shape)
+    ax.imshow(
+        np.ma.masked_equal(counts, 0),
+        extent=extent,
+        origin="lower",
+        aspect="auto",
+        interpolation="nearest",
+        cmap=_DENSITY_CMAP,
+        norm=LogNorm(vmin=1, vmax=max(counts.max(), 1)),
+        zorder=1.5,
+    )
+
+
 # Function to filter and merge data
 def filter_and_merge_data(npv_df, pd_df, params_df, filter_criteria1, filter_criteria2):
     # Filter both datasets
@@ -55,7 +133,36 @@ def filter_and_merge_data(npv_df, pd_df, params_df, filter_criteria1, filter_cri
 
 
 # Function to create a plot with quadrants
-def create_quadrant_plot(data, xlab_scenario, ylab_scenario, value_column, plot_title):
+def create_quadrant_plot(
+    data,
+    xlab_scenario,
+    ylab_scenario,
+    value_column,
+    plot_title,
+    profile=None,
+    aggregate=None,
+):
+    """
+    Draws the values of two scenarios against each other over coloured
+    quadrants and the diagonal.
+
+    Above the aggregation threshold (see `set_quadrant_aggregation_threshold`)
+    the points are counted on a grid of marker-sized pixel cells and shaded by
+    count on a log scale, instead of drawing one marker per point.
+
+    Parameters:
+    data (pd.DataFrame): Merged data with `<value_column>_x` and `_y` columns.
+    xlab_scenario (str): Label of the x-axis.
+    ylab_scenario (str): Label of the y-axis.
+    value_column (str): The plotted value.
+    plot_title (str): The plot title.
+    profile (str): Rendering profile name, or None for the default profile.
+    aggregate (bool): Force the aggregated (True) or scatter (False) mode;
+        None chooses from the number of points.
+
+    Returns:
+    tuple: The figure and axes of the quadrant template.
+    """
 
     # Calculate the min and max values for x and y axes
     x_min = min(data[value_column + "_x"].min(), -1)
@@ -63,13 +170,12 @@ def create_quadrant_plot(data, xlab_scenario, ylab_scenario, value_column, plot_
     y_min = min(data[value_column + "_y"].min(), -1)
     y_max = max(data[value_column + "_y"].max(), 1)
 
-    plt.figure(figsize=(10, 10), dpi=250)
-    plt.xlabel(xlab_scenario, fontsize=24)
-    plt.ylabel(ylab_scenario, fontsize=24)
-    plt.xlim(x_min, x_max)
-    plt.ylim(y_min, y_max)
-    plt.hlines(y=0, xmin=x_min, xmax=x_max, linewidth=1, color="grey")
-    plt.vlines(x=0, ymin=y_min, ymax=y_max, linewidth=1, color="grey")
+    template = figure_template("quadrant", profile)
+    ax = template.start(xlab_scenario, ylab_scenario)
+    ax.set_xlim(x_min, x_max)
+    ax.set_ylim(y_min, y_max)
+    ax.hlines(y=0, xmin=x_min, xmax=x_max, linewidth=1, color="grey")
+    ax.vlines(x=0, ymin=y_min, ymax=y_max, linewidth=1, color="grey")
 
     quadrants = [
         ([x_min, y_min], [x_min, 0], [0, 0], [0, y_min], "lightcoral"),
@@ -78,27 +184,42 @@ def create_quadrant_plot(data, xlab_scenario, ylab_scenario, value_column, plot_
         ([0, y_min], [0, 0], [x_max, 0], [x_max, y_min], "lightyellow"),
     ]
 
-    ax = plt.gca()
     for coords in quadrants:
         polygon = Polygon(coords[:4], facecolor=coords[4], alpha=0.3)
         ax.add_patch(polygon)
 
-    plt.scatter(data[value_column + "_x"], data[value_column + "_y"], s=12, c="grey")
-    plt.title(plot_title, fontsize=24)
-    plt.plot(
+    if aggregate is None:
+        aggregate = (
+            _AGGREGATE_THRESHOLD is not None and len(data) > _AGGREGATE_THRESHOLD
+        )
+    if aggregate:
+        _draw_aggregated_points(
+            ax,
+            data[value_column + "_x"].to_numpy(),
+            data[value_column + "_y"].to_numpy(),
+            (x_min, x_max, y_min, y_max),
+        )
+    else:
+        ax.scatter(
+            data[value_column + "_x"],
+            data[value_column + "_y"],
+            s=_MARKER_SIZE,
+            c="grey",
+        )
+    ax.plot(
         [min(x_min, y_min), max(x_max, y_max)],
         [min(x_min, y_min), max(x_max, y_max)],
         linestyle="dashed",
         color="black",
         linewidth=2.5,
     )
-    plt.tight_layout()
-    return plt.gcf(), plt.gca()
+    template.finish(plot_title)
+    return template.figure, ax
 
 
 # Main function to run the script
 def plot_bivariate_scenarios_quadrants(
-    npv_df, pd_df, params_df, params1, params2, save_folder_path
+    npv_df, pd_df, params_df, params1, params2, save_folder_path, profile=None
 ):
     filter_criteria1, filter_criteria2 = params1, params2
     # Filter and merge data
@@ -113,14 +234,14 @@ def plot_bivariate_scenarios_quadrants(
         params2["target_scenario"],
         "pd_difference",
         f"Company PD Difference ({params1['shock_year']} vs {params2['shock_year']})",
+        profile,
     )
-    fig.savefig(
+    figure_template("quadrant", profile).write(
         os.path.join(
             save_folder_path,
             f"pd_{params1['target_scenario']}___{params2['target_scenario']}_{params1['shock_year']}_vs_{params2['shock_year']}.jpg",
         )
     )
-    plt.close(fig)
 
     # Create and save quadrant plot for NPV
     fig, ax = create_quadrant_plot(
@@ -129,14 +250,14 @@ def plot_bivariate_scenarios_quadrants(
         params2["target_scenario"],
         "net_present_value_change",
         f"Company NPV Difference ({params1['shock_year']} vs {params2['shock_year']})",
+        profile,
     )
-    fig.savefig(
+    figure_template("quadrant", profile).write(
         os.path.join(
             save_folder_path,
             f"npv_{params1['target_scenario']}___{params2['target_scenario']}_{params1['shock_year']}_vs_{params2['shock_year']}.jpg",
         )
     )
-    plt.close(fig)
 
 
 if __name__ == "__main__":
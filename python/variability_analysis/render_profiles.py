@@ -0,0 +1,38 @@
+# Output settings of each rendering profile. A format of None keeps the image
+# extension chosen by the plotting function (PNG, or JPG for quadrant plots).
+RENDER_PROFILES = {
+    "publication": {
+        "dpi": 250,
+        "tight_layout": True,
+        "format": None,
+        "pil_kwargs": None,
+    },
+    "draft": {
+        "dpi": 72,
+        "tight_layout": False,
+        "format": None,
+        "pil_kwargs": {"compress_level": 1},
+    },
+    "svg": {"dpi": 250, "tight_layout": True, "format": "svg", "pil_kwargs": None},
+    "pdf": {"dpi": 250, "tight_layout": True, "format": "pdf", "pil_kwargs": None},
+}
+
+_RENDER_PROFILE = "publication"
+
+
+def set_render_profile(profile):
+    """
+    Sets the rendering profile used by plotting functions called without one.
+
+    Parameters:
+    profile (str): A key of RENDER_PROFILES, "publication" by default.
+    """
+    global _RENDER_PROFILE
+    if profile not in RENDER_PROFILES:
+        raise ValueError(f"Unknown render profile: {profile}")
+    _RENDER_PROFILE = profile
+
+
+def get_render_profile():
+    """Returns the name of the rendering profile used by default."""
+    return _RENDER_PROFILE
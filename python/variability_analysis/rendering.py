@@ -0,0 +1,315 @@
+import os
+import threading
+import matplotlib as mpl
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.ticker import FuncFormatter
+
+from .instrumentation import record_output
+from .output_writer import write_figure
+# Profiles live apart so that they can be set without importing matplotlib
+from .render_profiles import RENDER_PROFILES, get_render_profile
+from .tracing import span
+
+
+# Shared x-axis formatter of the percentage-valued plots
+PERCENT_FORMATTER = FuncFormatter(lambda x, _: f"{x:.0%}")
+
+
+class FigureTemplate:
+    """
+    A figure and its axes, reused for every render of one plot family.
+
+    The figure is attached to an Agg canvas directly, without going through
+    pyplot. Fonts, axis formatters and legend options are set up once. Each
+    render removes only the data artists (lines, patches, collections, images,
+    legend) before drawing the next plot, so the axes, ticks and labels are
+    not rebuilt. Resolution, layout and output format follow a render profile.
+
+    Templates returned by `figure_template` and `facet_figure` have a
+    `signature` string describing their family and profile, used to detect
+    re-rendering needs.
+
+    A template may hold a grid of panels (`axes`, with `ax` its first panel);
+    its axis labels and title then apply to the whole figure.
+    """
+
+    def __init__(
+        self,
+        figsize,
+        profile="publication",
+        title_fontsize=18,
+        label_fontsize=14,
+        percent_xaxis=True,
+        legend_kwargs=None,
+        savefig_kwargs=None,
+        shape=(1, 1),
+        subplot_kwargs=None,
+    ):
+        """
+        Parameters:
+        figsize (tuple): Figure size in inches.
+        profile (str): A key of RENDER_PROFILES.
+        title_fontsize (int): Font size of the title.
+        label_fontsize (int): Font size of the axis labels.
+        percent_xaxis (bool): Format the x-axis ticks as percentages.
+        legend_kwargs (dict): Default options of the legend, or None for no legend.
+        savefig_kwargs (dict): Extra options passed to savefig.
+        shape (tuple): Number of panel rows and columns.
+        subplot_kwargs (dict): Extra options of the panel grid (e.g. sharex).
+        """
+        self.profile = RENDER_PROFILES[profile]
+        self.figure = Figure(figsize=figsize, dpi=self.profile["dpi"])
+        FigureCanvasAgg(self.figure)
+        self.axes = self.figure.subplots(
+            *shape, squeeze=False, **(subplot_kwargs or {})
+        )
+        self.ax = self.axes[0, 0]
+        self.label_fontsize = label_fontsize
+        self.title_fontsize = title_fontsize
+        self.legend_kwargs = legend_kwargs
+        self.savefig_kwargs = savefig_kwargs or {}
+        if percent_xaxis:
+            for ax in self.axes.flat:
+                ax.xaxis.set_major_formatter(PERCENT_FORMATTER)
+        self._labels = (None, None)
+        # Subplot parameters of a fresh figure, restored before each render
+        params = self.figure.subplotpars
+        self._subplot_params = {
+            name: getattr(params, name)
+            for name in ("left", "right", "bottom", "top", "wspace", "hspace")
+        }
+
+    def start(self, xlabel, ylabel):
+        """
+        Clears the previous plot and returns the axes to draw on.
+
+        The layout of the previous plot is reset too: tight_layout starts from
+        the current subplot parameters, so a reused template would otherwise
+        lay out (and, with bbox_inches="tight", size) its images differently
+        from a fresh figure, depending on the plots drawn before.
+
+        Parameters:
+        xlabel (str): Label of the x-axis.
+        ylabel (str): Label of the y-axis.
+
+        Returns:
+        matplotlib.axes.Axes: The reusable axes.
+        """
+        for ax in self.axes.flat:
+            for container in list(ax.containers):
+                container.remove()
+            for artist in [
+                *ax.lines,
+                *ax.patches,
+                *ax.collections,
+                *ax.images,
+                *ax.texts,
+            ]:
+                artist.remove()
+            legend = ax.get_legend()
+            if legend is not None:
+                legend.remove()
+            ax.set_prop_cycle(None)
+            ax.relim()
+            ax.set_autoscale_on(True)
+        self.figure.subplots_adjust(**self._subplot_params)
+        if self._labels != (xlabel, ylabel):
+            if self.axes.size == 1:
+                self.ax.set_xlabel(xlabel, fontsize=self.label_fontsize)
+                self.ax.set_ylabel(ylabel, fontsize=self.label_fontsize)
+            else:
+                self.figure.supxlabel(xlabel, fontsize=self.label_fontsize)
+                self.figure.supylabel(ylabel, fontsize=self.label_fontsize)
+            self._labels = (xlabel, ylabel)
+        return self.ax
+
+    def finish(self, title, legend_title=None):
+        """
+        Titles the current plot, adds its legend and lays it out.
+
+        Parameters:
+        title (str): The plot title.
+        legend_title (str): Optional title of the legend.
+        """
+        if self.axes.size == 1:
+            self.ax.set_title(title, fontsize=self.title_fontsize)
+        else:
+            self.figure.suptitle(title, fontsize=self.title_fontsize)
+        if self.legend_kwargs is not None:
+            self.ax.legend(title=legend_title, **self.legend_kwargs)
+        if self.profile["tight_layout"]:
+            with span("layout"):
+                self.figure.tight_layout()
+
+    def output_path(self, path):
+        """Returns the image path with the extension of the profile's format."""
+        if self.profile["format"] is None:
+            return path
+        return f"{os.path.splitext(path)[0]}.{self.profile['format']}"
+
+    def write(self, path):
+        """
+        Writes the current plot.
+
+        Parameters:
+        path (str): The image path; its extension is replaced when the profile
+            sets an output format.
+
+        Returns:
+        str: The path of the written image.
+        """
+        path = self.output_path(path)
+        savefig_kwargs = dict(self.savefig_kwargs)
+        if self.profile["pil_kwargs"] and path.lower().endswith(".png"):
+            savefig_kwargs["pil_kwargs"] = self.profile["pil_kwargs"]
+        # Rasterizing and encoding both happen here, unless background writes
+        # are on, in which case the encoding is queued
+        with span("savefig", path=path):
+            write_figure(self.figure, path, **savefig_kwargs)
+        record_output(path, "figure")
+        return path
+
+    def save(self, path, title, legend_title=None):
+        """
+        Titles, lays out and writes the current plot.
+
+        Parameters:
+        path (str): The image path.
+        title (str): The plot title.
+        legend_title (str): Optional title of the legend.
+
+        Returns:
+        str: The path of the written image.
+        """
+        self.finish(title, legend_title)
+        return self.write(path)
+
+
+# Figure specification of each plot family
+FIGURE_FAMILIES = {
+    "density": {"figsize": (10, 6), "legend_kwargs": {"fontsize": 10}},
+    "barplot": {"figsize": (14, 8), "legend_kwargs": {"fontsize": 10}},
+    "grouped": {
+        "figsize": (12, 8),
+        "legend_kwargs": {
+            "fontsize": 10,
+            "bbox_to_anchor": (1.05, 1),
+            "loc": "upper left",
+        },
+        "savefig_kwargs": {"bbox_inches": "tight"},
+    },
+    "comparison_barplot": {
+        "figsize": (14, 8),
+        "percent_xaxis": False,
+        "legend_kwargs": {"fontsize": 10},
+    },
+    "trajectory": {
+        "figsize": (12, 8),
+        "percent_xaxis": False,
+        "legend_kwargs": {
+            "fontsize": 10,
+            "bbox_to_anchor": (1.05, 1),
+            "loc": "upper left",
+        },
+        "savefig_kwargs": {"bbox_inches": "tight"},
+    },
+    "quadrant": {
+        "figsize": (10, 10),
+        "title_fontsize": 24,
+        "label_fontsize": 24,
+        "percent_xaxis": False,
+        "legend_kwargs": None,
+    },
+}
+
+_templates = {}
+
+
+def figure_template(family, profile=None):
+    """
+    Returns the reusable FigureTemplate of a plot family.
+
+    Templates are created on first use under the current matplotlib rcParams
+    and kept for later renders; a change of font family creates a new one.
+    Each thread gets its own templates, so that stages can render
+    concurrently. The rcParams are global, so plotting functions must not
+    change them: a change would reach the stages rendering in other threads.
+
+    Parameters:
+    family (str): A key of FIGURE_FAMILIES.
+    profile (str): A key of RENDER_PROFILES, or None for the default profile.
+
+    Returns:
+    FigureTemplate: The family's template.
+    """
+    profile = profile or get_render_profile()
+    if profile not in RENDER_PROFILES:
+        raise ValueError(f"Unknown render profile: {profile}")
+    key = (family, profile, tuple(mpl.rcParams["font.family"]))
+    cache_key = key + (threading.get_ident(),)
+    template = _templates.get(cache_key)
+    if template is None:
+        template = FigureTemplate(profile=profile, **FIGURE_FAMILIES[family])
+        # Everything that changes the rendered image besides the plotted data
+        template.signature = repr(
+            key + (FIGURE_FAMILIES[family], RENDER_PROFILES[profile])
+        )
+        _templates[cache_key] = template
+    return template
+
+
+# Size of one panel of a small-multiples figure, in inches
+FACET_PANEL_SIZE = (3.5, 2.5)
+
+
+def facet_figure(family, n_rows, n_cols, profile=None, **subplot_kwargs):
+    """
+    Returns a new FigureTemplate holding a grid of small panels, drawn in the
+    style of a plot family.
+
+    Unlike `figure_template`, the template is not cached: its size depends on
+    the grid. Panels have small tick labels and no legend by default; the
+    family's title and label font sizes apply to the whole figure.
+
+    Parameters:
+    family (str): A key of FIGURE_FAMILIES.
+    n_rows (int): Number of panel rows.
+    n_cols (int): Number of panel columns.
+    profile (str): A key of RENDER_PROFILES, or None for the default profile.
+    subplot_kwargs: Extra options of the panel grid (e.g. sharex=True).
+
+    Returns:
+    FigureTemplate: The grid template, its panels in `axes`.
+    """
+    profile = profile or get_render_profile()
+    if profile not in RENDER_PROFILES:
+        raise ValueError(f"Unknown render profile: {profile}")
+    spec = dict(FIGURE_FAMILIES[family], legend_kwargs=None)
+    spec["figsize"] = (
+        FACET_PANEL_SIZE[0] * n_cols + 1,
+        FACET_PANEL_SIZE[1] * n_rows + 1,
+    )
+    template = FigureTemplate(
+        profile=profile,
+        shape=(n_rows, n_cols),
+        subplot_kwargs=subplot_kwargs,
+        **spec,
+    )
+    for ax in template.axes.flat:
+        ax.tick_params(labelsize=8)
+    template.signature = repr(
+        (
+            "facet",
+            family,
+            profile,
+            tuple(mpl.rcParams["font.family"]),
+            n_rows,
+            n_cols,
+            sorted(subplot_kwargs.items()),
+            FACET_PANEL_SIZE,
+            FIGURE_FAMILIES[family],
+            RENDER_PROFILES[profile],
+        )
+    )
+    return template
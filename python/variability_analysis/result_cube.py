@@ -0,0 +1,462 @@
+import warnings
+import numpy as np
+import pandas as pd
+
+from .run_catalog import PARAMETER_COLUMNS
+
+
+# Dense cubes with fewer filled cells than this fraction are stored sparse
+_SPARSE_DENSITY = 0.25
+
+# Reductions of `ResultCube.reduce`, as numpy functions ignoring NaNs
+_REDUCERS = {
+    "sum": np.nansum,
+    "mean": np.nanmean,
+    "median": np.nanmedian,
+    "min": np.nanmin,
+    "max": np.nanmax,
+    "std": lambda values, axis: np.nanstd(values, axis=axis, ddof=1),
+    "count": lambda values, axis: np.sum(~np.isnan(values), axis=axis),
+}
+
+
+def _parameter_dims(params_df):
+    """
+    Returns the run parameters used as cube dimensions: PARAMETER_COLUMNS,
+    the other columns of params.csv that vary between runs (e.g. the discount
+    rate of a sensitivity run) and, when runs still share all their
+    parameters, the run_id.
+
+    Parameters:
+    params_df (pd.DataFrame): The run parameters.
+
+    Returns:
+    list: The dimension names, which identify each run.
+    """
+    dims = list(PARAMETER_COLUMNS)
+    for column in params_df.columns:
+        if column == "run_id" or column in dims:
+            continue
+        if params_df[column].nunique(dropna=False) > 1:
+            dims.append(column)
+    if params_df.duplicated(subset=dims).any():
+        dims.append("run_id")
+    return dims
+
+
+class ResultCube:
+    """
+    TRISK results as a labelled N-d array, with one dimension per run
+    parameter of params.csv, one for the category (technology or sector) and
+    one for the entity (asset or company).
+
+    Values are held either dense, as an array with NaN for missing cells, or
+    sparse, as the integer coordinates of the filled cells and their values.
+    Results are very sparse along (category, entity), since an asset has a
+    single technology, so cubes built from TRISK outputs are usually sparse.
+
+    The run dimensions identify each run: besides PARAMETER_COLUMNS, they
+    include the other parameters that vary between runs, and the run_id
+    itself when two runs share every parameter (see `_parameter_dims`).
+
+    Dimensions selected with a single label are dropped and remembered in
+    `fixed`, so that `to_frame` can restore the long format with a run_id
+    column that the plotting and stats functions expect.
+    """
+
+    def __init__(
+        self,
+        coords,
+        value_name,
+        dense=None,
+        codes=None,
+        data=None,
+        fixed=None,
+        entity_attrs=None,
+        params_df=None,
+    ):
+        """
+        Parameters:
+        coords (dict): Dimension name -> pd.Index of its labels, in axis order.
+        value_name (str): Name of the value (e.g. 'net_present_value_change').
+        dense (np.ndarray): Dense values, of shape (len of each coord).
+        codes (np.ndarray): Sparse storage: (n, ndim) positions of the filled
+            cells along each dimension.
+        data (np.ndarray): Sparse storage: the n values of the filled cells.
+        fixed (dict): Dimensions selected with a single label -> that label.
+        entity_attrs (pd.DataFrame): Columns constant per entity (e.g.
+            company_id of an asset), indexed by entity label.
+        params_df (pd.DataFrame): Run parameters, to restore the run_id.
+        """
+        self.coords = {dim: pd.Index(labels) for dim, labels in coords.items()}
+        self.value_name = value_name
+        self.dense = dense
+        self.codes = codes
+        self.data = data
+        self.fixed = dict(fixed or {})
+        self.entity_attrs = entity_attrs
+        self.params_df = params_df
+
+    @classmethod
+    def from_frame(
+        cls,
+        data_df,
+        params_df,
+        value_type,
+        category_column="technology",
+        entity_column="asset_id",
+        agg="mean",
+        sparse=None,
+    ):
+        """
+        Builds a cube from long TRISK results (npv_df or pd_df).
+
+        Parameters:
+        data_df (pd.DataFrame): Results with run_id, category, entity and value
+            columns.
+        params_df (pd.DataFrame): The run parameters.
+        value_type (str): The value column.
+        category_column (str): The category column ('technology' or 'sector').
+        entity_column (str): The entity column ('asset_id' or 'company_id').
+        agg (str): Reduction of rows sharing the same cell, a key of
+            `_REDUCERS` (only used with several assets per company, for
+            instance).
+        sparse (bool): Whether to store the values sparse; by default, when
+            less than a quarter of the cells are filled.
+
+        Returns:
+        ResultCube: The cube, with dimensions the run parameters (see
+        `_parameter_dims`), category and entity.
+        """
+        run_dims = _parameter_dims(params_df)
+        dims = run_dims + [category_column, entity_column]
+        params = params_df[list(dict.fromkeys(["run_id"] + run_dims))]
+        frame = data_df[["run_id", category_column, entity_column, value_type]].merge(
+            params, on="run_id"
+        )
+
+        coords = {}
+        codes = np.empty((len(frame), len(dims)), dtype=np.int64)
+        for axis, dim in enumerate(dims):
+            codes[:, axis], coords[dim] = pd.factorize(frame[dim], sort=True)
+        values = frame[value_type].to_numpy(dtype=np.float64)
+
+        # Reduce rows falling in the same cell
+        shape = tuple(len(coords[dim]) for dim in dims)
+        flat = np.ravel_multi_index(codes.T, shape)
+        if len(np.unique(flat)) < len(flat):
+            reduced = pd.Series(values).groupby(flat).agg(agg)
+            flat = reduced.index.to_numpy()
+            values = reduced.to_numpy(dtype=np.float64)
+            codes = np.stack(np.unravel_index(flat, shape), axis=1)
+
+        # Columns of the results constant for each entity
+        other_columns = [
+            column
+            for column in data_df.columns
+            if column not in dims + ["run_id", value_type]
+        ]
+        entity_attrs = None
+        if other_columns:
+            grouped = data_df.groupby(entity_column, sort=False)
+            constant = grouped[other_columns].nunique(dropna=False).max() <= 1
+            kept = [column for column in other_columns if constant[column]]
+            if kept:
+                entity_attrs = grouped[kept].first()
+
+        cube = cls(
+            coords,
+            value_type,
+            codes=codes,
+            data=values,
+            entity_attrs=entity_attrs,
+            params_df=params_df,
+        )
+        if sparse is None:
+            sparse = cube.density < _SPARSE_DENSITY
+        return cube if sparse else cube.to_dense()
+
+    # --- Shape ---
+
+    @property
+    def dims(self):
+        return list(self.coords)
+
+    @property
+    def shape(self):
+        return tuple(len(labels) for labels in self.coords.values())
+
+    @property
+    def is_sparse(self):
+        return self.dense is None
+
+    @property
+    def size(self):
+        """Number of cells of the cube."""
+        return int(np.prod(self.shape, dtype=np.int64))
+
+    @property
+    def nnz(self):
+        """Number of filled cells."""
+        if self.is_sparse:
+            return len(self.data)
+        return int(np.count_nonzero(~np.isnan(self.dense)))
+
+    @property
+    def density(self):
+        """Fraction of filled cells."""
+        return self.nnz / self.size if self.size else 0.0
+
+    def __repr__(self):
+        dims = ", ".join(f"{dim}: {n}" for dim, n in zip(self.dims, self.shape))
+        storage = "sparse" if self.is_sparse else "dense"
+        return (
+            f"<ResultCube {self.value_name} ({dims}), {storage}, "
+            f"{self.nnz} filled cells>"
+        )
+
+    def _new(self, coords, dense=None, codes=None, data=None, fixed=None):
+        return ResultCube(
+            coords,
+            self.value_name,
+            dense=dense,
+            codes=codes,
+            data=data,
+            fixed=self.fixed if fixed is None else fixed,
+            entity_attrs=self.entity_attrs,
+            params_df=self.params_df,
+        )
+
+    # --- Storage ---
+
+    def to_dense(self):
+        """Returns the cube with dense values (NaN for missing cells)."""
+        if not self.is_sparse:
+            return self
+        dense = np.full(self.shape, np.nan)
+        if len(self.data) and self.dims:
+            dense[tuple(self.codes.T)] = self.data
+        elif len(self.data):
+            # A 0-d cube: its single cell
+            dense[()] = self.data[0]
+        return self._new(self.coords, dense=dense)
+
+    def to_sparse(self):
+        """Returns the cube with sparse values."""
+        if self.is_sparse:
+            return self
+        filled = ~np.isnan(self.dense)
+        # The boolean mask keeps argwhere's order, also for a 0-d cube
+        return self._new(
+            self.coords, codes=np.argwhere(filled), data=self.dense[filled]
+        )
+
+    # --- Selection ---
+
+    def sel(self, **labels):
+        """
+        Selects labels along dimensions.
+
+        A single label drops the dimension (and is remembered in `fixed`); a
+        list of labels keeps it, in the given order.
+
+        Example:
+        cube.sel(target_scenario="NGFS2023GCAM_B2DS", shock_year=[2025, 2030])
+        """
+        unknown = set(labels) - set(self.dims)
+        if unknown:
+            raise KeyError(f"Unknown dimensions: {', '.join(sorted(unknown))}")
+
+        coords = {}
+        fixed = dict(self.fixed)
+        positions = []
+        for dim, index in self.coords.items():
+            if dim not in labels:
+                coords[dim] = index
+                positions.append(None)
+                continue
+            selection = labels[dim]
+            scalar = np.ndim(selection) == 0
+            wanted = [selection] if scalar else list(selection)
+            position = index.get_indexer(wanted)
+            if (position < 0).any():
+                missing = [w for w, p in zip(wanted, position) if p < 0]
+                raise KeyError(f"Labels not found in {dim}: {missing}")
+            positions.append((position, scalar))
+            if scalar:
+                fixed[dim] = selection
+            else:
+                coords[dim] = index[position]
+
+        if not self.is_sparse:
+            dense = self.dense
+            index = tuple(
+                slice(None) if p is None else (p[0][0] if p[1] else p[0])
+                for p in positions
+            )
+            # Select one axis at a time, as numpy broadcasts several lists
+            for axis in reversed(range(len(index))):
+                if isinstance(index[axis], slice):
+                    continue
+                dense = np.take(dense, index[axis], axis=axis)
+            # A full selection takes a numpy scalar, kept as a 0-d array
+            return self._new(coords, dense=np.asarray(dense), fixed=fixed)
+
+        keep = np.ones(len(self.data), dtype=bool)
+        new_codes = []
+        for axis, p in enumerate(positions):
+            column = self.codes[:, axis]
+            if p is None:
+                new_codes.append(column)
+                continue
+            position, scalar = p
+            # Old position -> new position along the axis, -1 when dropped
+            remap = np.full(len(self.coords[self.dims[axis]]), -1)
+            remap[position] = np.arange(len(position))
+            column = remap[column]
+            keep &= column >= 0
+            if not scalar:
+                new_codes.append(column)
+        if new_codes:
+            codes = np.stack(new_codes, axis=1)
+        else:
+            codes = np.empty((len(self.data), 0), dtype=np.int64)
+        return self._new(coords, codes=codes[keep], data=self.data[keep], fixed=fixed)
+
+    # --- Reduction and broadcasting ---
+
+    def reduce(self, how, dims):
+        """
+        Reduces the cube along some dimensions, ignoring missing cells.
+
+        Parameters:
+        how (str): 'sum', 'mean', 'median', 'min', 'max', 'std' or 'count'.
+        dims (str or list): The reduced dimension(s).
+
+        Returns:
+        ResultCube: A dense cube over the remaining dimensions.
+        """
+        dims = [dims] if isinstance(dims, str) else list(dims)
+        axes = tuple(self.dims.index(dim) for dim in dims)
+        coords = {dim: index for dim, index in self.coords.items() if dim not in dims}
+        if self.is_sparse:
+            # Reduce the filled cells by group instead of densifying
+            kept_axes = [axis for axis in range(len(self.dims)) if axis not in axes]
+            shape = tuple(len(index) for index in coords.values())
+            if kept_axes:
+                groups = np.ravel_multi_index(self.codes[:, kept_axes].T, shape)
+            else:
+                groups = np.zeros(len(self.data), dtype=np.int64)
+            pandas_how = {"count": "count"}.get(how, how)
+            reduced = pd.Series(self.data).groupby(groups).agg(pandas_how)
+            dense = np.full(shape, 0.0 if how in ("count", "sum") else np.nan)
+            dense.flat[reduced.index.to_numpy()] = reduced.to_numpy()
+        else:
+            # All-missing cells reduce to NaN, without "empty slice" warnings
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)
+                dense = np.asarray(
+                    _REDUCERS[how](self.dense, axis=axes), dtype=np.float64
+                )
+        return self._new(coords, dense=dense)
+
+    def _aligned(self, other):
+        """Returns the dense values of another cube, broadcastable to self."""
+        missing = set(other.dims) - set(self.dims)
+        if missing:
+            raise ValueError(f"Dimensions not in the cube: {', '.join(missing)}")
+        values = other.to_dense().dense
+        for dim in other.dims:
+            if not other.coords[dim].equals(self.coords[dim]):
+                values = np.take(
+                    values,
+                    other.coords[dim].get_indexer(self.coords[dim]),
+                    axis=other.dims.index(dim),
+                    mode="clip",
+                )
+                absent = ~self.coords[dim].isin(other.coords[dim])
+                if absent.any():
+                    index = [slice(None)] * values.ndim
+                    index[other.dims.index(dim)] = absent
+                    values[tuple(index)] = np.nan
+        # Order the axes as in self, with length-1 axes for absent dimensions
+        order = [other.dims.index(dim) for dim in self.dims if dim in other.dims]
+        values = np.transpose(values, order)
+        return values.reshape(
+            [len(self.coords[dim]) if dim in other.dims else 1 for dim in self.dims]
+        )
+
+    def _binary(self, other, op):
+        if not isinstance(other, ResultCube):
+            if self.is_sparse:
+                data = op(self.data, other)
+                return self._new(self.coords, codes=self.codes, data=data)
+            return self._new(self.coords, dense=op(self.dense, other))
+        aligned = self._aligned(other)
+        if self.is_sparse:
+            # Gather the other values at the filled cells only
+            index = tuple(
+                self.codes[:, axis] if aligned.shape[axis] > 1 else 0
+                for axis in range(len(self.dims))
+            )
+            return self._new(
+                self.coords, codes=self.codes, data=op(self.data, aligned[index])
+            )
+        return self._new(self.coords, dense=op(self.dense, aligned))
+
+    def __add__(self, other):
+        return self._binary(other, np.add)
+
+    def __sub__(self, other):
+        return self._binary(other, np.subtract)
+
+    def __mul__(self, other):
+        return self._binary(other, np.multiply)
+
+    def __truediv__(self, other):
+        return self._binary(other, np.divide)
+
+    # --- Conversion ---
+
+    def to_frame(self):
+        """
+        Returns the filled cells in long format: one column per dimension and
+        selected dimension, the value column, the entity attributes and, when
+        every run parameter is known, the run_id.
+        """
+        cube = self.to_sparse()
+        columns = {
+            dim: cube.coords[dim].take(cube.codes[:, axis])
+            for axis, dim in enumerate(cube.dims)
+        }
+        frame = pd.DataFrame(columns, index=range(len(cube.data)))
+        for dim, label in self.fixed.items():
+            frame[dim] = label
+        frame[self.value_name] = cube.data
+
+        if self.entity_attrs is not None:
+            entity_column = self.entity_attrs.index.name
+            if entity_column in frame:
+                attrs = self.entity_attrs.drop(
+                    columns=[c for c in self.entity_attrs if c in frame]
+                )
+                frame = frame.join(attrs, on=entity_column)
+        if self.params_df is not None and "run_id" not in frame:
+            run_dims = _parameter_dims(self.params_df)
+            if all(c in frame for c in run_dims):
+                # The run dimensions identify each run, so each row gets one
+                frame = frame.merge(
+                    self.params_df[["run_id"] + run_dims], on=run_dims, how="left"
+                )
+        return frame
+
+
+def as_frame(data):
+    """
+    Returns long results as a DataFrame, converting a ResultCube with
+    `ResultCube.to_frame`, so that functions taking npv_df or pd_df also
+    accept cubes.
+    """
+    if isinstance(data, ResultCube):
+        return data.to_frame()
+    return data
@@ -0,0 +1,203 @@
+import weakref
+import numpy as np
+import pandas as pd
+
+
+# Colour cycle shared by every plot that draws one line per run or category
+COLORS = [
+    "blue",
+    "orange",
+    "red",
+    "magenta",
+    "gray",
+    "cyan",
+    "#8B4513",
+    "#006400",
+    "#4B0082",
+    "#FF1493",
+    "#00CED1",
+    "#FF4500",
+    "#2F4F4F",
+    "#9ACD32",
+    "#FF69B4",
+]
+
+# Columns of params.csv identifying a run besides its run_id
+PARAMETER_COLUMNS = [
+    "baseline_scenario",
+    "target_scenario",
+    "shock_year",
+    "scenario_geography",
+]
+
+
+def sanitize_label(label):
+    """Turns a run label into a file name stem, as the extract functions always did."""
+    return label.replace(" ", "_").replace("(", "").replace(")", "").replace(",", "_")
+
+
+class RunRecord:
+    """The parameters of one run with its precomputed label, file stem and colour."""
+
+    __slots__ = (
+        "index",
+        "run_id",
+        "baseline_scenario",
+        "target_scenario",
+        "shock_year",
+        "scenario_geography",
+        "label",
+        "stem",
+        "color",
+    )
+
+    def __init__(
+        self,
+        index,
+        run_id,
+        baseline_scenario,
+        target_scenario,
+        shock_year,
+        scenario_geography,
+    ):
+        self.index = index
+        self.run_id = run_id
+        self.baseline_scenario = baseline_scenario
+        self.target_scenario = target_scenario
+        self.shock_year = shock_year
+        self.scenario_geography = scenario_geography
+        self.label = f"{target_scenario} ({shock_year}, {scenario_geography})"
+        self.stem = sanitize_label(self.label)
+        self.color = COLORS[index % len(COLORS)]
+
+    @property
+    def params(self):
+        return (
+            self.baseline_scenario,
+            self.target_scenario,
+            self.shock_year,
+            self.scenario_geography,
+        )
+
+    def __repr__(self):
+        return f"RunRecord({self.run_id!r}, {self.label!r})"
+
+
+class RunCatalog:
+    """
+    The runs of params.csv, in file order, with O(1) lookup by run_id and by
+    parameter tuple (baseline_scenario, target_scenario, shock_year, scenario_geography).
+
+    Iterating yields RunRecord objects. Column arrays (`run_ids`,
+    `target_scenarios`, `shock_years`, ...) allow vectorised selections.
+    """
+
+    def __init__(self, params_df):
+        self.params_df = params_df
+        columns = {
+            column: (
+                params_df[column].to_numpy()
+                if column in params_df.columns
+                else np.full(len(params_df), None, dtype=object)
+            )
+            for column in ["run_id"] + PARAMETER_COLUMNS
+        }
+        self._columns = columns
+        self.run_ids = columns["run_id"]
+        self.baseline_scenarios = columns["baseline_scenario"]
+        self.target_scenarios = columns["target_scenario"]
+        self.shock_years = columns["shock_year"]
+        self.scenario_geographies = columns["scenario_geography"]
+        self.records = [
+            RunRecord(i, *values)
+            for i, values in enumerate(
+                zip(*(columns[column] for column in ["run_id"] + PARAMETER_COLUMNS))
+            )
+        ]
+        self._by_run_id = {record.run_id: record for record in self.records}
+        self._by_params = {record.params: record for record in self.records}
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, run_id):
+        return run_id in self._by_run_id
+
+    def get(self, run_id, default=None):
+        return self._by_run_id.get(run_id, default)
+
+    def find(self, baseline_scenario, target_scenario, shock_year, scenario_geography):
+        """Returns the run with the given parameters, or None."""
+        return self._by_params.get(
+            (baseline_scenario, target_scenario, shock_year, scenario_geography)
+        )
+
+    def label(self, run_id):
+        """Returns the legend label of a run, or 'Run_<run_id>' for unknown runs."""
+        record = self._by_run_id.get(run_id)
+        return record.label if record is not None else f"Run_{run_id}"
+
+    def select(self, **criteria):
+        """Returns the records whose parameters equal all the given values."""
+        mask = np.ones(len(self.records), dtype=bool)
+        for key, value in criteria.items():
+            mask &= self._column(key) == value
+        return [self.records[i] for i in np.flatnonzero(mask)]
+
+    def run_ids_where(self, **criteria):
+        """Returns the run_ids whose parameters equal all the given values."""
+        return [record.run_id for record in self.select(**criteria)]
+
+    def unique(self, key):
+        """Returns the distinct values of a parameter, in order of first appearance."""
+        return pd.unique(self._column(key))
+
+    def _column(self, key):
+        if key in self._columns:
+            return self._columns[key]
+        return self.params_df[key].to_numpy()
+
+
+_catalogs = {}
+
+
+def _fingerprint(params_df):
+    """
+    Cheap summary of the catalogued columns of a params dataframe, which
+    changes when the dataframe is modified in place.
+    """
+    columns = [c for c in ["run_id"] + PARAMETER_COLUMNS if c in params_df.columns]
+    hashes = pd.util.hash_pandas_object(params_df[columns], index=False)
+    return params_df.shape, tuple(columns), int(hashes.sum())
+
+
+def run_catalog(params):
+    """
+    Returns the RunCatalog of a params dataframe, building it only once per dataframe.
+
+    The cached catalog is rebuilt when the dataframe's run_ids or parameters
+    have changed in place since it was built.
+
+    Parameters:
+    params (pd.DataFrame or RunCatalog): The run parameters.
+
+    Returns:
+    RunCatalog: The shared catalog.
+    """
+    if isinstance(params, RunCatalog):
+        return params
+    fingerprint = _fingerprint(params)
+    cached = _catalogs.get(id(params))
+    if cached is not None and cached[0]() is params and cached[1] == fingerprint:
+        return cached[2]
+    catalog = RunCatalog(params)
+    key = id(params)
+    _catalogs[key] = (
+        weakref.ref(params, lambda _: _catalogs.pop(key, None)),
+        fingerprint,
+        catalog,
+    )
+    return catalog
@@ -0,0 +1,256 @@
+import os
+import uuid
+import numpy as np
+import pandas as pd
+
+
+# Technologies of each sector, as found in the TRISK inputs
+DEFAULT_TECHNOLOGIES = {
+    "Power": ["CoalCap", "GasCap", "OilCap", "HydroCap", "RenewablesCap"],
+    "Oil&Gas": ["Oil", "Gas"],
+    "Coal": ["Coal"],
+}
+
+# Target scenarios of the generated runs, with their baseline scenario.
+# Synthetic names are appended when more runs are requested.
+DEFAULT_SCENARIOS = [
+    ("NGFS2023GCAM_CP", "NGFS2023GCAM_B2DS"),
+    ("NGFS2023GCAM_CP", "NGFS2023GCAM_NZ2050"),
+    ("NGFS2023REMIND_CP", "NGFS2023REMIND_NZ2050"),
+    ("NGFS2023REMIND_CP", "NGFS2023REMIND_B2DS"),
+]
+
+# Mean NPV change of each technology under the shock; other technologies
+# get a small positive mean
+_NPV_CHANGE_MEAN = {
+    "CoalCap": -0.3,
+    "OilCap": -0.2,
+    "GasCap": -0.05,
+    "Oil": -0.25,
+    "Gas": -0.1,
+    "Coal": -0.4,
+}
+
+
+def synthetic_params(
+    n_runs, shock_years=(2025, 2030), geographies=("India", "Global"), rng=None
+):
+    """
+    Generates the run parameters of params.csv.
+
+    Runs cover every shock year and geography of each target scenario in turn,
+    so that every run has a distinct label.
+
+    Parameters:
+    n_runs (int): Number of runs.
+    shock_years (tuple): Shock years of each target scenario.
+    geographies (tuple): Scenario geographies of each target scenario.
+    rng (np.random.Generator): Random generator for the run ids.
+
+    Returns:
+    pd.DataFrame: The parameters, with the columns of params.csv.
+    """
+    rng = rng if rng is not None else np.random.default_rng(0)
+    runs_per_scenario = len(shock_years) * len(geographies)
+    n_scenarios = -(-n_runs // runs_per_scenario)
+    scenarios = list(DEFAULT_SCENARIOS[:n_scenarios])
+    for k in range(len(scenarios), n_scenarios):
+        scenarios.append(("SYNTHETIC_CP", f"SYNTHETIC_T{k}"))
+
+    rows = []
+    for baseline_scenario, target_scenario in scenarios:
+        for shock_year in shock_years:
+            for geography in geographies:
+                rows.append(
+                    {
+                        "baseline_scenario": baseline_scenario,
+                        "target_scenario": target_scenario,
+                        "scenario_geography": geography,
+                        "shock_year": shock_year,
+                    }
+                )
+    params_df = pd.DataFrame(rows[:n_runs])
+    params_df.insert(
+        0, "run_id", [str(uuid.UUID(bytes=rng.bytes(16))) for _ in range(n_runs)]
+    )
+    params_df["carbon_price_model"] = "no_carbon_tax"
+    params_df["risk_free_rate"] = 0.02
+    params_df["discount_rate"] = 0.07
+    params_df["growth_rate"] = 0.03
+    params_df["div_netprofit_prop_coef"] = 1
+    params_df["market_passthrough"] = 0
+    return params_df[
+        [
+            "run_id",
+            "baseline_scenario",
+            "target_scenario",
+            "scenario_geography",
+            "carbon_price_model",
+            "risk_free_rate",
+            "discount_rate",
+            "growth_rate",
+            "div_netprofit_prop_coef",
+            "shock_year",
+            "market_passthrough",
+        ]
+    ]
+
+
+def generate_synthetic_outputs(
+    output_path,
+    n_companies=300,
+    n_runs=12,
+    technologies=None,
+    terms=(1, 2, 3, 4, 5),
+    assets_per_company=2,
+    years=range(2025, 2031),
+    country_iso2="IN",
+    seed=0,
+):
+    """
+    Writes synthetic npvs.csv, pds.csv, params.csv and trajectories.csv with
+    the columns of the TRISK outputs written by `run_r_analysis`, to test and
+    benchmark the package without the confidential results.
+
+    Each company belongs to one sector and owns `assets_per_company` assets of
+    that sector's technologies. Values are drawn independently for every run,
+    with technology-dependent NPV changes and PDs growing with the term.
+
+    Parameters:
+    output_path (str): Directory where the CSV files are written.
+    n_companies (int): Number of companies.
+    n_runs (int): Number of runs (see `synthetic_params`).
+    technologies (dict): Sector -> list of technologies, DEFAULT_TECHNOLOGIES
+        by default.
+    terms (tuple): PD terms written to pds.csv.
+    assets_per_company (int): Number of assets of each company.
+    years (iterable): Years of the production trajectories.
+    country_iso2 (str): Country code of every asset.
+    seed (int): Seed of the random generator.
+
+    Returns:
+    dict: Number of rows written to each file.
+    """
+    rng = np.random.default_rng(seed)
+    technologies = technologies or DEFAULT_TECHNOLOGIES
+    os.makedirs(output_path, exist_ok=True)
+
+    params_df = synthetic_params(n_runs, rng=rng)
+    run_ids = params_df["run_id"].to_numpy()
+
+    # Companies and their assets, shared by every run
+    sectors = np.array(list(technologies))
+    company_ids = np.array([f"C{i}" for i in range(n_companies)])
+    company_sectors = sectors[rng.integers(len(sectors), size=n_companies)]
+    asset_company = np.repeat(np.arange(n_companies), assets_per_company)
+    asset_sectors = company_sectors[asset_company]
+    asset_technologies = np.empty(len(asset_company), dtype=object)
+    for sector, sector_technologies in technologies.items():
+        in_sector = asset_sectors == sector
+        asset_technologies[in_sector] = np.asarray(sector_technologies)[
+            rng.integers(len(sector_technologies), size=in_sector.sum())
+        ]
+    assets = pd.DataFrame(
+        {
+            "company_id": company_ids[asset_company],
+            "asset_id": [
+                f"{company_ids[c]}_A{a}"
+                for c, a in zip(
+                    asset_company, np.tile(np.arange(assets_per_company), n_companies)
+                )
+            ],
+            "technology": asset_technologies,
+            "sector": asset_sectors,
+            "country_iso2": country_iso2,
+        }
+    )
+    n_assets = len(assets)
+
+    # NPVs: one row per run and asset
+    npv_df = pd.concat([assets] * n_runs, ignore_index=True)
+    npv_df.insert(0, "run_id", np.repeat(run_ids, n_assets))
+    change_mean = assets["technology"].map(_NPV_CHANGE_MEAN).fillna(0.1).to_numpy()
+    baseline = rng.lognormal(10, 1, size=len(npv_df))
+    change = rng.normal(np.tile(change_mean, n_runs), 0.15)
+    npv_df["net_present_value_baseline"] = baseline
+    npv_df["net_present_value_shock"] = baseline * (1 + change)
+    npv_df = npv_df[
+        [
+            "run_id",
+            "company_id",
+            "asset_id",
+            "technology",
+            "sector",
+            "country_iso2",
+            "net_present_value_baseline",
+            "net_present_value_shock",
+        ]
+    ]
+
+    # PDs: one row per run, company and term
+    terms = np.asarray(terms)
+    n_pd_rows = n_runs * n_companies * len(terms)
+    pd_terms = np.tile(terms, n_runs * n_companies)
+    pd_baseline = rng.uniform(0, 0.05, size=n_pd_rows) * pd_terms
+    pd_df = pd.DataFrame(
+        {
+            "run_id": np.repeat(run_ids, n_companies * len(terms)),
+            "company_id": np.tile(np.repeat(company_ids, len(terms)), n_runs),
+            "sector": np.tile(np.repeat(company_sectors, len(terms)), n_runs),
+            "term": pd_terms,
+            "pd_baseline": pd_baseline,
+            "pd_shock": np.clip(
+                pd_baseline + rng.normal(0.01, 0.02, size=n_pd_rows), 0, 1
+            ),
+        }
+    )
+
+    # Trajectories: one row per run, asset and year
+    years = np.asarray(list(years))
+    n_years = len(years)
+    asset_rows = np.tile(np.repeat(np.arange(n_assets), n_years), n_runs)
+    trajectories_df = assets.loc[asset_rows].reset_index(drop=True)
+    trajectories_df.insert(0, "run_id", np.repeat(run_ids, n_assets * n_years))
+    trajectories_df["year"] = np.tile(years, n_runs * n_assets)
+    production = rng.uniform(50, 100, size=len(trajectories_df))
+    trajectories_df["production_baseline_scenario"] = production
+    trajectories_df["production_target_scenario"] = production * 0.9
+    trajectories_df["production_shock_scenario"] = production * rng.uniform(
+        0.7, 1.0, size=len(trajectories_df)
+    )
+    trajectories_df["production_plan_company_technology"] = production
+    trajectories_df = trajectories_df[
+        [
+            "run_id",
+            "asset_id",
+            "company_id",
+            "sector",
+            "technology",
+            "country_iso2",
+            "year",
+            "production_baseline_scenario",
+            "production_target_scenario",
+            "production_shock_scenario",
+            "production_plan_company_technology",
+        ]
+    ]
+
+    written = {}
+    for filename, df in [
+        ("npvs.csv", npv_df),
+        ("pds.csv", pd_df),
+        ("params.csv", params_df),
+        ("trajectories.csv", trajectories_df),
+    ]:
+        df.to_csv(os.path.join(output_path, filename), index=False)
+        written[filename] = len(df)
+        print(f"Wrote {len(df)} rows to {os.path.join(output_path, filename)}")
+    return written
+
+
+if __name__ == "__main__":
+    generate_synthetic_outputs(
+        os.path.join("workspace", "synthetic_variability_analysis"),
+        n_companies=300,
+        n_runs=12,
+    )
@@ -0,0 +1,131 @@
+import os
+import numpy as np
+import pandas as pd
+
+from .bootstrap import bootstrap_confidence_intervals
+from .instrumentation import add_rows, iter_stages, record_output
+from .output_writer import write_excel
+from .result_cube import as_frame
+
+
+# Display names of the statistics written to the Excel summary
+STATS_COLUMN_NAMES = {
+    "target_scenario": "Target Scenario",
+    "shock_year": "Shock Year",
+    "median_npv_change": "Median NPV Change",
+    "mean_npv_change": "Mean NPV Change",
+    "std_npv_change": "Standard Deviation NPV Change",
+    "unique_company_count": "Unique Company Count",
+    "min_npv_change": "Minimum NPV Change",
+    "max_npv_change": "Maximum NPV Change",
+    "q1_npv_change": "First Quartile NPV Change (Q1)",
+    "q3_npv_change": "Third Quartile NPV Change (Q3)",
+    "count_observations": "Number of Observations",
+    "median_npv_change_ci_low": "Median NPV Change CI Low",
+    "median_npv_change_ci_high": "Median NPV Change CI High",
+    "mean_npv_change_ci_low": "Mean NPV Change CI Low",
+    "mean_npv_change_ci_high": "Mean NPV Change CI High",
+    "q1_npv_change_ci_low": "First Quartile NPV Change (Q1) CI Low",
+    "q1_npv_change_ci_high": "First Quartile NPV Change (Q1) CI High",
+    "q3_npv_change_ci_low": "Third Quartile NPV Change (Q3) CI Low",
+    "q3_npv_change_ci_high": "Third Quartile NPV Change (Q3) CI High",
+}
+
+# Statistics given bootstrap confidence intervals
+INTERVAL_STATISTICS = ["median", "mean", "q1", "q3"]
+
+
+def generate_technology_stats(
+    npv_df,
+    params_df,
+    output_file,
+    n_bootstrap=0,
+    confidence=0.95,
+    seed=0,
+    max_memory_mb=256,
+):
+    """
+    Generates statistics for each technology and saves them into one Excel file.
+    Adds a "Technology" column to differentiate between the technologies.
+
+    With `n_bootstrap` replicates, adds percentile bootstrap confidence
+    intervals of the median, mean and quartiles, resampling the assets of every
+    technology, target scenario and shock year at once.
+
+    Parameters:
+    - npv_df: DataFrame containing the net present value (NPV) data.
+    - params_df: DataFrame containing parameter data.
+    - output_file: The file path where the Excel file will be saved.
+    - n_bootstrap: Number of bootstrap replicates, 0 for no confidence intervals.
+    - confidence: Confidence level of the intervals.
+    - seed: Seed of the bootstrap resampling.
+    - max_memory_mb: Memory cap of the bootstrap resampling matrices.
+    """
+    npv_df = as_frame(npv_df)
+    # Ensure the output folder exists
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+
+    # Get unique technologies in the npv_df
+    technologies = npv_df["technology"].unique()
+
+    intervals = None
+    if n_bootstrap > 0:
+        intervals = bootstrap_confidence_intervals(
+            npv_df.merge(params_df[["run_id", "target_scenario", "shock_year"]]),
+            "net_present_value_change",
+            ["technology", "target_scenario", "shock_year"],
+            statistics=INTERVAL_STATISTICS,
+            n_replicates=n_bootstrap,
+            confidence=confidence,
+            seed=seed,
+            max_memory_mb=max_memory_mb,
+        )
+        intervals.columns = [
+            column.replace("_ci_", "_npv_change_ci_") for column in intervals.columns
+        ]
+
+    # List to collect all DataFrames for concatenation
+    all_tech_stats = []
+
+    # Loop through each technology and collect their stats
+    for tech in iter_stages(technologies, "technology"):
+        tech_df = npv_df[npv_df["technology"] == tech].merge(params_df)
+        add_rows(len(tech_df))
+        # Accumulate in float64 even when values are held in float32
+        tech_df["net_present_value_change"] = tech_df[
+            "net_present_value_change"
+        ].astype(np.float64)
+
+        # Group by without 'run_id' and compute aggregations
+        stats_df = tech_df.groupby(["target_scenario", "shock_year"]).agg(
+            median_npv_change=("net_present_value_change", "median"),
+            mean_npv_change=("net_present_value_change", "mean"),
+            std_npv_change=("net_present_value_change", "std"),
+            unique_company_count=("company_id", "nunique"),
+            min_npv_change=("net_present_value_change", "min"),
+            max_npv_change=("net_present_value_change", "max"),
+            q1_npv_change=("net_present_value_change", lambda x: x.quantile(0.25)),
+            q3_npv_change=("net_present_value_change", lambda x: x.quantile(0.75)),
+            count_observations=("net_present_value_change", "count"),
+        )
+        if intervals is not None:
+            stats_df = stats_df.join(intervals.xs(tech, level="technology"))
+
+        # Prettify the numeric values by rounding them to 2 decimal places
+        stats_df = stats_df.round(4)
+
+        # Add a "Technology" column
+        stats_df["Technology"] = tech
+
+        # Reset index and rename columns
+        stats_df = stats_df.reset_index().rename(columns=STATS_COLUMN_NAMES)
+
+        # Append the dataframe to the list
+        all_tech_stats.append(stats_df)
+
+    # Concatenate all dataframes into one
+    final_df = pd.concat(all_tech_stats, ignore_index=True)
+
+    # Save the concatenated DataFrame to a single Excel file
+    write_excel(final_df, output_file, index=False)
+    record_output(output_file)
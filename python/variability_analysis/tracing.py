@@ -0,0 +1,112 @@
+import os
+import json
+import time
+import threading
+
+
+# Trace events recorded since `start_tracing`, or None when tracing is off
+_events = None
+_origin = 0.0
+
+
+class _Span:
+    """Context manager recording one complete trace event."""
+
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        end = time.perf_counter()
+        if _events is not None:
+            _events.append(
+                {
+                    "name": self.name,
+                    "ph": "X",
+                    "ts": (self.start - _origin) * 1e6,
+                    "dur": (end - self.start) * 1e6,
+                    "pid": os.getpid(),
+                    "tid": threading.get_ident(),
+                    "args": self.args,
+                }
+            )
+        return False
+
+
+class _NullSpan:
+    """Span returned while tracing is off; does nothing."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name, **args):
+    """
+    Returns a context manager tracing the time spent in a block of code.
+
+    When tracing is off, a shared no-op context manager is returned, so spans
+    can be left around hot loops.
+
+    Parameters:
+    name (str): The span name (e.g. "kde", "render").
+    args: Attributes shown with the span, such as category, run_id or rows.
+
+    Example:
+    with span("kde", category=cat, rows=len(values)):
+        density = gaussian_density(values, x_grid)
+    """
+    if _events is None:
+        return _NULL_SPAN
+    return _Span(name, args)
+
+
+def tracing_enabled():
+    """Returns whether spans are being recorded."""
+    return _events is not None
+
+
+def start_tracing():
+    """Starts recording spans, discarding those of a previous trace."""
+    global _events, _origin
+    _origin = time.perf_counter()
+    _events = []
+
+
+def stop_tracing(output_file=None):
+    """
+    Stops recording spans and optionally writes them as a Chrome trace-event
+    JSON file, which chrome://tracing or https://ui.perfetto.dev open as a
+    timeline.
+
+    Parameters:
+    output_file (str): Path of the JSON file, or None to only return the events.
+
+    Returns:
+    list: The recorded trace events.
+    """
+    global _events
+    events, _events = _events or [], None
+    if output_file is not None:
+        os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+        with open(output_file, "w") as f:
+            json.dump(
+                {"traceEvents": events, "displayTimeUnit": "ms"},
+                f,
+                default=str,
+            )
+        print(f"Trace of {len(events)} spans written to {output_file}")
+    return events
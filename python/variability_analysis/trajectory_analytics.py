@@ -0,0 +1,294 @@
+import os
+import numpy as np
+import pandas as pd
+
+from .figure_manifest import FigureManifest, data_digest
+from .instrumentation import add_rows, iter_stages, record_output
+from .run_catalog import run_catalog
+from .tracing import span
+
+
+# Production columns of trajectories.csv aggregated by `aggregate_trajectories`
+PRODUCTION_COLUMNS = {
+    "baseline": "production_baseline_scenario",
+    "target": "production_target_scenario",
+    "shock": "production_shock_scenario",
+}
+
+
+class TrajectoryPanel:
+    """
+    Production trajectories aggregated per key (run and technology by
+    default), with the years as an array axis: each production scenario is a
+    (keys, years) array rather than one row per year.
+
+    Gaps between the shock and baseline productions, and their cumulative
+    sums over the years, are computed on the arrays. `summary` gives one row
+    per key, to join to the NPV results.
+    """
+
+    def __init__(self, keys, years, production):
+        """
+        Parameters:
+        keys (pd.DataFrame): One row per panel row, with the key columns.
+        years (np.ndarray): The years, in increasing order.
+        production (dict): Scenario ('baseline', 'target', 'shock') -> array
+            of shape (keys, years); NaN where a key has no row for a year.
+        """
+        self.keys = keys.reset_index(drop=True)
+        self.years = np.asarray(years)
+        self.production = production
+
+    def __repr__(self):
+        by = ", ".join(self.keys.columns)
+        return (
+            f"<TrajectoryPanel {len(self.keys)} keys ({by}) x "
+            f"{len(self.years)} years>"
+        )
+
+    def __len__(self):
+        return len(self.keys)
+
+    # --- Metrics, as (keys, years) arrays ---
+
+    def gap(self):
+        """Shock minus baseline production."""
+        return self.production["shock"] - self.production["baseline"]
+
+    def relative_gap(self):
+        """Shock minus baseline production, relative to the baseline."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.gap() / self.production["baseline"]
+
+    def cumulative_gap(self):
+        """Shock minus baseline production, accumulated over the years."""
+        return np.nancumsum(self.gap(), axis=1)
+
+    def relative_cumulative_gap(self):
+        """Cumulative gap relative to the cumulative baseline production."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.cumulative_gap() / np.nancumsum(
+                self.production["baseline"], axis=1
+            )
+
+    METRICS = {
+        "gap": gap,
+        "relative_gap": relative_gap,
+        "cumulative_gap": cumulative_gap,
+        "relative_cumulative_gap": relative_cumulative_gap,
+    }
+
+    def metric(self, name):
+        """Returns a metric of `METRICS` by name, or a production scenario."""
+        if name in self.production:
+            return self.production[name]
+        return self.METRICS[name](self)
+
+    # --- Selection and conversion ---
+
+    def select(self, **criteria):
+        """Returns the panel rows whose key columns equal all the given values."""
+        mask = np.ones(len(self.keys), dtype=bool)
+        for column, value in criteria.items():
+            mask &= self.keys[column].to_numpy() == value
+        return TrajectoryPanel(
+            self.keys[mask],
+            self.years,
+            {name: values[mask] for name, values in self.production.items()},
+        )
+
+    def to_frame(self, name="gap"):
+        """Returns a metric as a wide DataFrame: key columns, then one per year."""
+        values = pd.DataFrame(self.metric(name), columns=self.years)
+        return pd.concat([self.keys, values], axis=1)
+
+    def summary(self):
+        """
+        Returns one row per key with its total baseline and shock productions,
+        its final cumulative gap (absolute and relative) and the year of its
+        largest production loss.
+        """
+        gap = self.gap()
+        summary = self.keys.copy()
+        summary["total_production_baseline"] = np.nansum(
+            self.production["baseline"], axis=1
+        )
+        summary["total_production_shock"] = np.nansum(
+            self.production["shock"], axis=1
+        )
+        summary["cumulative_gap"] = self.cumulative_gap()[:, -1]
+        summary["relative_cumulative_gap"] = self.relative_cumulative_gap()[:, -1]
+        # Years without rows never hold the largest loss
+        largest_loss = np.argmin(np.where(np.isnan(gap), np.inf, gap), axis=1)
+        summary["year_of_largest_loss"] = self.years[largest_loss]
+        return summary
+
+    def join_npv(self, npv_df):
+        """
+        Joins the trajectory summary of each key to the NPV results of the
+        same key: the NPV totals and the mean and median NPV change.
+
+        Parameters:
+        npv_df (pd.DataFrame): NPV results with the key columns.
+
+        Returns:
+        pd.DataFrame: The summary with the NPV columns.
+        """
+        by = list(self.keys.columns)
+        npv = npv_df.groupby(by, sort=False).agg(
+            net_present_value_baseline=("net_present_value_baseline", "sum"),
+            net_present_value_shock=("net_present_value_shock", "sum"),
+            mean_npv_change=("net_present_value_change", "mean"),
+            median_npv_change=("net_present_value_change", "median"),
+        )
+        return self.summary().join(npv, on=by)
+
+    # --- Storage ---
+
+    def save(self, path):
+        """
+        Saves the panel as a compressed .npz file, one array per production
+        scenario.
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        arrays = {f"key_{column}": self.keys[column].to_numpy() for column in self.keys}
+        for name, values in self.production.items():
+            arrays[f"production_{name}"] = values
+        np.savez_compressed(
+            path,
+            years=self.years,
+            key_columns=np.array(self.keys.columns, dtype=str),
+            **arrays,
+        )
+        record_output(path)
+        print(f"Trajectory panel {self} saved to {path}")
+
+    @classmethod
+    def load(cls, path):
+        """Loads a panel saved by `save`."""
+        with np.load(path, allow_pickle=True) as arrays:
+            keys = pd.DataFrame(
+                {column: arrays[f"key_{column}"] for column in arrays["key_columns"]}
+            )
+            production = {
+                name[len("production_") :]: arrays[name]
+                for name in arrays.files
+                if name.startswith("production_")
+            }
+            return cls(keys, arrays["years"], production)
+
+
+def aggregate_trajectories(trajectories_df, by=("run_id", "technology")):
+    """
+    Sums the production trajectories of the assets of each key and year.
+
+    Key columns and years are factorized in sorted order into integer codes,
+    so that each row falls in one cell of a (keys, years) grid; each
+    production column is then summed per cell in a single `np.bincount` pass.
+
+    Parameters:
+    trajectories_df (pd.DataFrame): trajectories.csv, one row per run, asset
+        and year.
+    by (tuple): The key columns.
+
+    Returns:
+    TrajectoryPanel: The production of each key and year, NaN for the years
+    without rows.
+    """
+    by = list(by)
+    add_rows(len(trajectories_df))
+    with span("aggregate_trajectories", rows=len(trajectories_df)):
+        # Combine the sorted codes of each key column into one integer key
+        column_codes, column_labels = zip(
+            *(pd.factorize(trajectories_df[column], sort=True) for column in by)
+        )
+        combined = np.ravel_multi_index(
+            column_codes, [len(labels) for labels in column_labels]
+        )
+        unique_keys, key_codes = np.unique(combined, return_inverse=True)
+        key_positions = np.unravel_index(
+            unique_keys, [len(labels) for labels in column_labels]
+        )
+        years, year_codes = np.unique(
+            trajectories_df["year"].to_numpy(), return_inverse=True
+        )
+        cells = key_codes * len(years) + year_codes
+        shape = (len(unique_keys), len(years))
+        n_cells = shape[0] * shape[1]
+        observed = np.bincount(cells, minlength=n_cells).reshape(shape) > 0
+
+        production = {}
+        for name, column in PRODUCTION_COLUMNS.items():
+            values = trajectories_df[column].to_numpy(dtype=np.float64)
+            missing = np.isnan(values)
+            sums = np.bincount(
+                cells[~missing], weights=values[~missing], minlength=n_cells
+            ).reshape(shape)
+            production[name] = np.where(observed, sums, np.nan)
+
+    keys = pd.DataFrame(
+        {
+            column: labels[positions]
+            for column, labels, positions in zip(by, column_labels, key_positions)
+        }
+    )
+    return TrajectoryPanel(keys, years, production)
+
+
+def plot_cumulative_gaps(panel, params_df, plots_folder, profile=None):
+    """
+    Plots, for each technology, the relative cumulative production gap of
+    each run over the years.
+
+    Parameters:
+    panel (TrajectoryPanel): Trajectories aggregated by run and technology.
+    params_df (pd.DataFrame): The dataframe with run parameters.
+    plots_folder (str): The directory where plots will be saved.
+    profile (str): Rendering profile name, or None for the default profile.
+    """
+    from .rendering import PERCENT_FORMATTER, figure_template
+
+    os.makedirs(plots_folder, exist_ok=True)
+    catalog = run_catalog(params_df)
+    template = figure_template("trajectory", profile)
+    template.ax.yaxis.set_major_formatter(PERCENT_FORMATTER)
+    relative_cumulative_gap = panel.relative_cumulative_gap()
+    technologies = panel.keys["technology"].to_numpy()
+    run_ids = panel.keys["run_id"].to_numpy()
+
+    manifest = FigureManifest(plots_folder)
+    for tech in iter_stages(pd.unique(technologies), "technology"):
+        rows = np.flatnonzero(technologies == tech)
+        rows = [row for row in rows if run_ids[row] in catalog]
+        title = f"Cumulative Production Gap - {tech}"
+        imgpath = template.output_path(
+            os.path.join(plots_folder, f"cumulative_gap_{tech.replace(' ', '_')}.png")
+        )
+        digest = data_digest(
+            run_ids[rows],
+            relative_cumulative_gap[rows].ravel(),
+            panel.years,
+            catalog.params_df,
+            title,
+            template.signature,
+        )
+        if manifest.is_current(imgpath, digest):
+            print(f"Unchanged, skipping cumulative gap plot for {tech}")
+            continue
+
+        ax = template.start("Year", "Cumulative Production Gap (Shock vs Baseline)")
+        with span("draw", technology=tech, runs=len(rows)):
+            for row in rows:
+                run = catalog.get(run_ids[row])
+                ax.plot(
+                    panel.years,
+                    relative_cumulative_gap[row],
+                    label=run.label,
+                    color=run.color,
+                    marker="o",
+                )
+            ax.axhline(0, color="black", linewidth=0.8)
+        template.save(imgpath, title, legend_title="Run")
+        manifest.record(imgpath, digest)
+        print(f"Cumulative gap plot saved to {imgpath}")
+    manifest.close()
@@ -1,14 +1,39 @@
 import os
 import pandas as pd
 
+from .pd_terms import DEFAULT_PD_TERM, PDTermSet
+from .precision import cast_value_columns
+from .run_catalog import run_catalog
+
+
+def load_pd_terms(source):
+    """
+    Loads the PD results of every term from pds.csv, with their asset_id and
+    pd_difference columns.
+
+    Parameters:
+    source (str): The directory containing the CSV files.
+
+    Returns:
+    PDTermSet: The PD results, viewable term by term.
+    """
+    pd_df = pd.read_csv(os.path.join(source, "pds.csv"))
+    pd_df["asset_id"] = pd_df["company_id"]
+    # Calculate pd_difference
+    pd_df["pd_difference"] = pd_df["pd_shock"] - pd_df["pd_baseline"]
+    cast_value_columns(pd_df)
+    return PDTermSet(pd_df)
+
 
 # Function to load and return the dataset
-def load_data(source):
+def load_data(source, term=DEFAULT_PD_TERM):
     """
     Loads the NPV, PD, and parameters datasets from the specified source directory.
 
     Parameters:
     source (str): The directory containing the CSV files.
+    term (int): The PD term kept in the PD dataframe, or None to keep every
+        term as a PDTermSet (see `load_pd_terms`).
 
     Returns:
     tuple: A tuple containing the NPV dataframe, PD dataframe, and parameters dataframe.
@@ -20,11 +45,13 @@ def load_data(source):
             npv_df["net_present_value_shock"] - npv_df["net_present_value_baseline"]
         ) / npv_df["net_present_value_baseline"]
 
-        pd_df = pd.read_csv(os.path.join(source, "pds.csv"))
-        pd_df["asset_id"] = pd_df["company_id"]
-        # Calculate pd_difference
-        pd_df["pd_difference"] = pd_df["pd_shock"] - pd_df["pd_baseline"]
-        pd_df = pd_df.loc[pd_df["term"] == 5, :]
+        pd_df = load_pd_terms(source)
+        if term is not None:
+            # A copy, so the other terms are freed
+            pd_df = pd_df.view(term).copy()
+
+        # Analysed values follow the compute dtype (float32 halves their size)
+        cast_value_columns(npv_df)
 
         params_df = pd.read_csv(os.path.join(source, "params.csv"))
 
@@ -49,15 +76,11 @@ def filter_data(df, params_df, filter_criteria):
     Returns:
     pd.DataFrame: The filtered dataframe.
     """
-    # Start with the full params_df
-    filtered_params_df = params_df.copy()
-
-    # Apply each filtering criterion
-    for key, value in filter_criteria.items():
-        filtered_params_df = filtered_params_df[filtered_params_df[key] == value]
+    # Look up the matching runs in the run catalog
+    run_ids = run_catalog(params_df).run_ids_where(**filter_criteria)
 
-    # Merge the filtered params_df with the main dataframe
-    filtered_df = df.merge(filtered_params_df[["run_id"]], on="run_id", how="inner")
+    # Keep the rows of the matching runs, renumbered as the former merge did
+    filtered_df = df[df["run_id"].isin(run_ids)].reset_index(drop=True)
 
     return filtered_df
 